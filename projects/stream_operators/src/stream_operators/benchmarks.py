@@ -0,0 +1,712 @@
+import itertools
+import json
+import random
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+import typer
+
+from cache import ResultCache, config_hash
+from codegen import generate_first_valid
+from downlinks import DownlinkPool, open_status_downlink
+from last_values import LastValueCache
+from live_config import LiveConfig
+from llm_gateway import TierPolicy, call_cost, evaluate_policy, load_records, prompt_hash
+from operators import CountMinSketch, KLLSketch, P2Quantile, SpaceSaving
+from patterns import compile_pattern
+from plans import PlanError, operation_config_for, parse_plan
+from registry import resolve_operator
+from state_store import ColumnarStateStore, TickBatcher, kernel_for
+from predicates import compile_columnar_predicate, compile_predicate
+from ticks import TickColumns, decode_tick, synthetic_records
+
+app = typer.Typer()
+
+
+@app.callback()
+def main():
+    """Micro-benchmarks for the stream operator hot paths"""
+
+
+class _AbsentStandIn:
+    """Stands in for swimos' `_Absent` so benchmarks run without a feed."""
+
+
+def _per_call_ns(func, items) -> float:
+    start = time.perf_counter_ns()
+    for item in items:
+        func(item)
+    return (time.perf_counter_ns() - start) / len(items)
+
+
+@app.command()
+def decode(ticks: int = 100_000, batch_size: int = 1000):
+    """Benchmark per-tick decoding and columnar appends"""
+    records = synthetic_records(ticks, absent=_AbsentStandIn())
+
+    dict_ns = _per_call_ns(lambda r: (r['timestamp'], r['price'], r['volume'], r['bid'],
+                                      r['ask'], r['movement']), records)
+    decode_ns = _per_call_ns(decode_tick, records)
+    print(f"dict field lookups:   {dict_ns:8.1f} ns/tick")
+    print(f"decode_tick:          {decode_ns:8.1f} ns/tick")
+
+    columns = TickColumns(capacity=ticks)
+    append_ns = _per_call_ns(columns.append_record, records)
+    print(f"append_record:        {append_ns:8.1f} ns/tick")
+
+    columns = TickColumns(capacity=ticks)
+    start = time.perf_counter_ns()
+    for i in range(0, ticks, batch_size):
+        columns.extend_records(records[i:i + batch_size])
+    extend_ns = (time.perf_counter_ns() - start) / ticks
+    print(f"extend_records({batch_size}): {extend_ns:8.1f} ns/tick")
+
+
+@app.command()
+def cache(ticks: int = 10_000, tick_size: float = 0.0, llm_latency_ms: float = 0.0):
+    """Replay a synthetic feed through the direct-mode result cache"""
+    records = synthetic_records(ticks)
+    config_key = config_hash({"description": "apply exchange rate", "parameters": {"exchange_rate": 1.2}})
+    result_cache = ResultCache(tick_size=tick_size)
+    calls = 0
+
+    def fake_llm(price):
+        nonlocal calls
+        calls += 1
+        if llm_latency_ms:
+            time.sleep(llm_latency_ms / 1000)
+        return price * 1.2
+
+    for record in records:
+        price = record["price"]
+        result_cache.get_or_compute(config_key, price, lambda: fake_llm(price))
+    print(f"{ticks} ticks -> {calls} LLM calls")
+    print(result_cache.format_stats())
+
+
+@app.command()
+def predicate(ticks: int = 100_000):
+    """Benchmark local predicate evaluation per tick and over columns"""
+    spec = {"all": [
+        {"cmp": "<", "left": {"field": "price"}, "right": {"param": "threshold"}},
+        {"cmp": ">", "left": {"op": "-", "args": [{"field": "ask"}, {"field": "bid"}]}, "right": 1.0},
+    ]}
+    params = {"threshold": 45}
+    records = synthetic_records(ticks, absent=_AbsentStandIn())
+    decoded = [decode_tick(record) for record in records]
+
+    per_tick = compile_predicate(spec, params)
+    print(f"per tick:  {_per_call_ns(per_tick, decoded):8.1f} ns/tick")
+
+    columns = TickColumns(capacity=ticks)
+    columns.extend_records(records)
+    columnar = compile_columnar_predicate(spec, params)
+    start = time.perf_counter_ns()
+    matches = columnar(columns.columns())
+    print(f"columnar:  {(time.perf_counter_ns() - start) / ticks:8.1f} ns/tick "
+          f"({int(matches.sum())} of {ticks} matched)")
+
+
+@app.command()
+def sketches(values: int = 200_000, k: int = 200, capacity: int = 100, shards: int = 4, seed: int = 7):
+    """Check quantile and heavy-hitter sketches against exact computation"""
+    rng = random.Random(seed)
+    prices = [rng.lognormvariate(3.5, 0.4) for _ in range(values)]
+    exact = np.sort(np.array(prices))
+    failures = []
+
+    def rank_error(estimate, q):
+        return abs(np.searchsorted(exact, estimate, side="right") / values - q)
+
+    # KLL: one sketch over the whole stream, and `shards` sketches merged
+    whole = KLLSketch(k, seed=seed)
+    start = time.perf_counter_ns()
+    for x in prices:
+        whole.update(x)
+    kll_ns = (time.perf_counter_ns() - start) / values
+    parts = [KLLSketch(k, seed=seed + i) for i in range(shards)]
+    for i, x in enumerate(prices):
+        parts[i % shards].update(x)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    kll_bound = 2.3 / k ** 0.97
+    print(f"KLL k={k}: {kll_ns:.0f} ns/value, {whole._size()} items kept "
+          f"(rank error bound {kll_bound:.4f})")
+    for q in (0.01, 0.25, 0.5, 0.75, 0.95, 0.99):
+        whole_error, merged_error = rank_error(whole.quantile(q), q), rank_error(merged.quantile(q), q)
+        print(f"  q={q:<5} rank error {whole_error:.4f}, merged {merged_error:.4f}")
+        if max(whole_error, merged_error) > kll_bound:
+            failures.append(f"KLL rank error at q={q}")
+
+    # P-squared: one estimator per quantile, compared by value
+    for q in (0.5, 0.95, 0.99):
+        estimator = P2Quantile(q)
+        start = time.perf_counter_ns()
+        for x in prices:
+            estimator.update(x)
+        p2_ns = (time.perf_counter_ns() - start) / values
+        truth = exact[min(int(q * values), values - 1)]
+        relative = abs(estimator.value() - truth) / truth
+        print(f"P2 q={q:<5} {p2_ns:.0f} ns/value, value {estimator.value():.3f} vs exact "
+              f"{truth:.3f} (relative error {relative:.4f}, rank error {rank_error(estimator.value(), q):.4f})")
+        if rank_error(estimator.value(), q) > 0.01:
+            failures.append(f"P2 rank error at q={q}")
+
+    # Heavy hitters: Zipf-distributed symbols weighted by traded volume
+    symbols = [f"S{i:04d}" for i in range(5000)]
+    zipf_weights = [1.0 / (rank + 1) ** 1.2 for rank in range(len(symbols))]
+    keys = rng.choices(symbols, weights=zipf_weights, k=values)
+    volumes = [rng.randint(1, 100) for _ in range(values)]
+    true_totals = {}
+    for key, volume in zip(keys, volumes):
+        true_totals[key] = true_totals.get(key, 0) + volume
+    total = sum(volumes)
+
+    summaries = [SpaceSaving(capacity) for _ in range(shards)]
+    count_min = CountMinSketch(epsilon=0.001, delta=0.01)
+    start = time.perf_counter_ns()
+    for i, (key, volume) in enumerate(zip(keys, volumes)):
+        summaries[i % shards].update(key, volume)
+    space_saving_ns = (time.perf_counter_ns() - start) / values
+    start = time.perf_counter_ns()
+    for key, volume in zip(keys, volumes):
+        count_min.update(key, volume)
+    count_min_ns = (time.perf_counter_ns() - start) / values
+    space_saving = summaries[0]
+    for summary in summaries[1:]:
+        space_saving.merge(summary)
+
+    bound = total / capacity
+    print(f"Space-Saving capacity={capacity} ({shards} shards merged): {space_saving_ns:.0f} ns/value, "
+          f"overestimate bound {bound:.0f} of {total}")
+    for key, count, error in space_saving.top(5):
+        print(f"  {key}: estimated {count:.0f} (+{error:.0f} at most), true {true_totals[key]}")
+    for key, count, error in space_saving.top(capacity):
+        if not count - error <= true_totals[key] <= count or error > bound:
+            failures.append(f"Space-Saving bound for {key}")
+    missing = [key for key, weight in true_totals.items() if weight > bound and key not in space_saving.counts]
+    if missing:
+        failures.append(f"Space-Saving missed heavy hitters {missing}")
+
+    overshoot = [count_min.estimate(key) - weight for key, weight in true_totals.items()]
+    outside = sum(1 for e in overshoot if e < 0 or e > 0.001 * total)
+    print(f"Count-min {count_min.depth}x{count_min.width}: {count_min_ns:.0f} ns/value, "
+          f"max overestimate {max(overshoot):.0f} (bound {0.001 * total:.0f}), "
+          f"{outside} of {len(overshoot)} keys outside the bound")
+    if outside > 0.01 * len(overshoot):
+        failures.append("Count-min bound")
+
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        raise typer.Exit(code=1)
+    print("All sketch error bounds hold")
+
+
+class _SimulatedDownlink:
+    """Value downlink that syncs after `sync_ms` and then ticks every `tick_ms`."""
+
+    def __init__(self, sync_ms: float, tick_ms: float):
+        self.sync_ms, self.tick_ms = sync_ms, tick_ms
+        self._did_set, self._did_sync = None, None
+        self._closed = threading.Event()
+
+    def set_host_uri(self, host_uri):
+        pass
+
+    def set_node_uri(self, node_uri):
+        pass
+
+    def set_lane_uri(self, lane_uri):
+        pass
+
+    def did_set(self, callback):
+        self._did_set = callback
+
+    def did_sync(self, callback):
+        self._did_sync = callback
+
+    def open(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        records = itertools.cycle(synthetic_records(64))
+        previous = None
+        if self._closed.wait(self.sync_ms / 1000):
+            return
+        while True:
+            record = next(records)
+            self._did_set(record, previous)
+            if self._did_sync is not None:
+                self._did_sync()
+                self._did_sync = None
+            previous = record
+            if self._closed.wait(self.tick_ms / 1000):
+                return
+
+    def close(self):
+        self._closed.set()
+
+
+class _SimulatedSwimClient:
+    def __init__(self, sync_ms: float, tick_ms: float):
+        self.sync_ms, self.tick_ms = sync_ms, tick_ms
+
+    def downlink_value(self):
+        return _SimulatedDownlink(self.sync_ms, self.tick_ms)
+
+
+@app.command()
+def startup(llm_ms: float = 1500, sync_ms: float = 400, tick_ms: float = 1000, runs: int = 3):
+    """Time to first result for execute-style startup, sequential vs speculative"""
+    swim_client = _SimulatedSwimClient(sync_ms, tick_ms)
+    for speculative in (False, True):
+        timings = []
+        for _ in range(runs):
+            first_result = threading.Event()
+            pool = DownlinkPool(swim_client, "ws://simulated", on_first_result=first_result.set)
+            started = time.perf_counter()
+            if speculative:
+                pool.open("/stock/AAAA")
+                pool.open("/stock/USD")
+            time.sleep(llm_ms / 1000)  # routing (and codegen) round trip
+            pool.acquire("/stock/AAAA", lambda new_value, old_value: None)
+            pool.discard_unused()
+            first_result.wait()
+            timings.append((time.perf_counter() - started) * 1000)
+            pool.close()
+        mode = "speculative" if speculative else "sequential"
+        print(f"{mode:>11}: time to first result {sum(timings) / runs:7.0f} ms "
+              f"(LLM {llm_ms:.0f} ms, sync {sync_ms:.0f} ms)")
+
+
+@app.command()
+def reconfigure(sync_ms: float = 400, tick_ms: float = 50, window_size: int = 20, new_window_size: int = 5,
+                runs: int = 5):
+    """Changing a running accumulator's window: hot reconfiguration vs restarting the operator"""
+    native_operator = resolve_operator("sma")
+    swim_client = _SimulatedSwimClient(sync_ms, tick_ms)
+
+    def start(operation_config: dict):
+        """A native sma operator on a simulated downlink, as accumulate_native builds it."""
+        live = LiveConfig(operation_config, lambda config, previous: native_operator.bind(config))
+        ticks = []  # (arrival, window size in params, values in the window)
+        acc = None
+
+        def callback(new_value, _old_value):
+            nonlocal acc
+            params = live.current[1]
+            acc, _ = native_operator.step(acc, decode_tick(new_value).price, params)
+            ticks.append((time.perf_counter(), params["window_size"], len(acc[0])))
+
+        downlink = open_status_downlink(swim_client, "ws://simulated", "/stock/AAAA", callback, wait_for_sync=False)
+        return live, ticks, downlink
+
+    def first_tick_after(ticks: list, started: float):
+        while not ticks or ticks[-1][0] < started:
+            time.sleep(0.001)
+        return next(tick for tick in ticks if tick[0] >= started)
+
+    for mode in ("restart", "hot"):
+        latencies, call_us, values = [], [], []
+        for _ in range(runs):
+            live, ticks, downlink = start({"window_size": window_size})
+            while len(ticks) < window_size:
+                time.sleep(tick_ms / 1000)
+            time.sleep(random.uniform(0, tick_ms) / 1000)  # change at a random point between ticks
+            started = time.perf_counter()
+            if mode == "hot":
+                live.reconfigure({"window_size": new_window_size})
+                call_us.append((time.perf_counter() - started) * 1e6)
+            else:
+                downlink.close()
+                live, ticks, downlink = start({"window_size": new_window_size})
+            arrival, applied_window, in_window = first_tick_after(ticks, started)
+            if applied_window != new_window_size:
+                print(f"  {mode}: first tick after the change used window {applied_window}")
+                raise typer.Exit(code=1)
+            latencies.append((arrival - started) * 1000)
+            values.append(in_window)
+            downlink.close()
+        detail = f", reconfigure call {sum(call_us) / runs:.0f} us" if call_us else ""
+        print(f"{mode:>8}: new window applies after {sum(latencies) / runs:6.0f} ms, first result over "
+              f"{sum(values) / runs:.0f}/{new_window_size} values (sync {sync_ms:.0f} ms, tick {tick_ms:.0f} ms"
+              f"{detail})")
+
+
+def _synthetic_llm_records(prompts: int, seed: int = 0) -> list:
+    """Recorded direct-mode traffic where the cheap model errs more when unsure."""
+    rng = random.Random(seed)
+    records = []
+    for price in synthetic_records(prompts, symbol_seed=seed):
+        prompt = f"Apply an exchange rate of 1.2 to the stock price {price['price']}. Return JSON."
+        truth = round(price["price"] * 1.2, 4)
+        confidence = rng.uniform(0.6, 1.0)
+        cheap = truth if rng.random() < confidence ** 0.5 else round(truth * rng.uniform(0.5, 1.5), 4)
+        for model, answer, latency_ms, answer_confidence in (("gpt-4o-mini", cheap, 350.0, confidence),
+                                                             ("gpt-4", truth, 1400.0, 0.99)):
+            records.append({"task": "direct", "model": model, "prompt_hash": prompt_hash(prompt),
+                            "prompt": prompt, "response": json.dumps({"result": answer}),
+                            "latency_ms": latency_ms * rng.uniform(0.8, 1.2), "prompt_tokens": 120,
+                            "completion_tokens": 12, "cost": call_cost(model, 120, 12),
+                            "confidence": answer_confidence, "parser": "parse_json_result"})
+    return records
+
+
+@app.command()
+def tiers(recordings: str = typer.Option(None, help="JSONL call log (LLM_CALL_LOG); synthetic traffic if omitted"),
+          task: str = "direct", cheap: str = "gpt-4o-mini", strong: str = "gpt-4",
+          thresholds: str = "0.0,0.7,0.8,0.85,0.9,0.95", prompts: int = 500):
+    """Tune the escalation threshold by replaying recorded LLM traffic against a fake model"""
+    records = load_records(recordings) if recordings else _synthetic_llm_records(prompts)
+    records = [r for r in records if r.get("task") == task]
+    policies = [("strong only", TierPolicy({task: (strong,)}))]
+    policies += [(f"{cheap} -> {strong} @ {float(t):.2f}", TierPolicy({task: (cheap, strong)}, float(t)))
+                 for t in thresholds.split(",")]
+    print(f"{'policy':<36} {'prompts':>7} {'cost $':>9} {'mean ms':>8} {'escalated':>9} {'accuracy':>9}")
+    for name, policy in policies:
+        totals = evaluate_policy(records, policy)
+        accuracy = f"{totals['accuracy']:.1%}" if totals["accuracy"] is not None else "-"
+        mean_ms = f"{totals['mean_latency_ms']:.0f}" if totals["mean_latency_ms"] is not None else "-"
+        print(f"{name:<36} {totals['prompts']:>7} {totals['cost']:>9.4f} {mean_ms:>8} "
+              f"{totals['escalated']:>9} {accuracy:>9}")
+
+
+@app.command()
+def reads(symbols: int = 200, repeat: int = 1000, sync_ms: float = 300, tick_ms: float = 1000):
+    """Ad-hoc status reads through the last-value cache: first (cold) vs repeated reads"""
+    cache = LastValueCache(_SimulatedSwimClient(sync_ms, tick_ms), "ws://simulated")
+    names = [f"S{i:04d}" for i in range(symbols)]
+    start = time.perf_counter()
+    cold = cache.read_many(names)
+    print(f"cold batch of {symbols}: {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({sum(v is not None for v in cold.values())} synced; one downlink lifecycle is ~{sync_ms:.0f} ms)")
+    start = time.perf_counter_ns()
+    for i in range(repeat):
+        cache.read(names[i % symbols])
+    print(f"repeated read:  {(time.perf_counter_ns() - start) / repeat / 1000:.2f} us/read")
+    start = time.perf_counter_ns()
+    for _ in range(10):
+        cache.read_many(names)
+    print(f"repeated batch: {(time.perf_counter_ns() - start) / 10 / 1000:.0f} us per {symbols} symbols")
+    print(cache.format_stats())
+    cache.close()
+
+
+@app.command()
+def state(symbols: int = 5000, ticks: int = 200_000, batch_size: int = 2000, operator: str = "sma",
+          window_size: int = 20, max_symbols: int = 0, spill_path: str = None):
+    """Columnar state store vs one Python accumulator per symbol: memory, throughput, agreement"""
+    import tracemalloc
+
+    rng = np.random.default_rng(0)
+    keys = [f"S{i:05d}" for i in rng.integers(0, symbols, ticks)]
+    values = rng.normal(50.0, 5.0, ticks)
+    config = {"window_size": window_size}
+    native_operator = resolve_operator(operator)
+    params = native_operator.bind(config)
+
+    def run_scalar():
+        accumulators = {}
+        for i, (key, x) in enumerate(zip(keys, values.tolist())):
+            accumulators[key], result = native_operator.step(accumulators.get(key), x, params)
+            expected[i] = np.nan if result is None else result
+        return accumulators
+
+    expected = np.empty(ticks)
+    start = time.perf_counter()
+    run_scalar()
+    scalar_s = time.perf_counter() - start
+    tracemalloc.start()
+    accumulators = run_scalar()
+    scalar_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del accumulators
+
+    def run_store():
+        store = ColumnarStateStore(kernel_for(operator, config), capacity=1024,
+                                   max_symbols=max_symbols or None, spill_path=spill_path)
+        for i in range(0, ticks, batch_size):
+            results[i:i + batch_size] = store.update(keys[i:i + batch_size], values[i:i + batch_size])
+        return store
+
+    results = np.empty(ticks)
+    if spill_path:
+        shutil.rmtree(spill_path, ignore_errors=True)
+    start = time.perf_counter()
+    store = run_store()
+    store_s = time.perf_counter() - start
+    if spill_path:
+        shutil.rmtree(spill_path, ignore_errors=True)
+    # Traced separately (tracing slows the run); includes the symbol -> slot map
+    tracemalloc.start()
+    traced_store = run_store()
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced_store
+
+    agree = np.allclose(results, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+    stats = store.stats()
+    print(f"{operator} over {symbols} symbols, {ticks} ticks")
+    print(f"  dict per symbol:  {ticks / scalar_s:12,.0f} ticks/s, {scalar_bytes / symbols:8.0f} B/symbol")
+    print(f"  columnar store:   {ticks / store_s:12,.0f} ticks/s, {store_bytes / symbols:8.0f} B/symbol "
+          f"(batches of {batch_size}; {stats['bytes'] / max(stats['symbols'], 1):.0f} B/symbol in columns)")
+    print(f"  evictions {stats['evictions']}, restores {stats['restores']}, spilled {stats['spilled']}")
+
+    # Per-tick callbacks: one store update per tick vs ticks batched in the background
+    per_tick = min(ticks, 20_000)
+    one_store = ColumnarStateStore(kernel_for(operator, config), capacity=1024)
+    start = time.perf_counter()
+    for key, x in zip(keys[:per_tick], values[:per_tick].tolist()):
+        one_store.update_one(key, x)
+    one_us = (time.perf_counter() - start) / per_tick * 1e6
+    delivered = []
+    batcher = TickBatcher(ColumnarStateStore(kernel_for(operator, config), capacity=1024),
+                          lambda items, batch_results: delivered.append(len(items)))
+    start = time.perf_counter()
+    for key, x in zip(keys[:per_tick], values[:per_tick].tolist()):
+        batcher.add(key, x)
+    batcher.close()
+    batched_us = (time.perf_counter() - start) / per_tick * 1e6
+    print(f"  per-tick callback: update_one {one_us:6.2f} us/tick, batched {batched_us:6.2f} us/tick "
+          f"({sum(delivered)} ticks in {batcher.batches} batches)")
+    if stats["evictions"] and not spill_path:
+        # Evicted symbols restart empty, so only the spilling store must agree
+        print(f"  results {'match' if agree else 'differ from'} the scalar operator (evicted state is dropped)")
+        return
+    print(f"  results {'match' if agree else 'DIFFER FROM'} the scalar operator")
+    if not agree:
+        raise typer.Exit(code=1)
+
+_ROUTED_PLANS = (
+    {"function": "read_adhoc", "symbol": "AAAA", "streaming_operator": None, "description": None, "parameters": {}},
+    {"function": "map_direct", "symbol": "BBBB", "streaming_operator": None, "description": "apply exchange rate",
+     "parameters": {"exchange_rate": 1.2}},
+    {"function": "filter_generate", "symbol": "CCCC", "streaming_operator": None,
+     "description": "alert me if the price goes below 35", "parameters": {"threshold": 35}},
+    {"function": "accumulate_direct", "symbol": "DDDD", "streaming_operator": "average", "description": None,
+     "parameters": {"window_size": 5}},
+)
+
+
+def _legacy_answer(plan: dict, **changes) -> dict:
+    """
+    A plan in the shapes the old examples taught: nested under `parameters`
+    for accumulate_*, top-level otherwise. `changes` override plan fields
+    first (None drops one).
+    """
+    plan = {**plan, **changes}
+    fields = {key: plan[key] for key in ("function", "symbol") if plan.get(key) is not None}
+    if plan["function"].startswith("accumulate"):
+        nested = {key: value for key, value in fields.items() if key != "function"}
+        return {"function": plan["function"], "parameters": {
+            **nested, "streaming_operator": plan["streaming_operator"], "operation_config": plan["parameters"]}}
+    if plan["description"] is not None:
+        fields["operation_config"] = {"description": plan["description"], "parameters": plan["parameters"]}
+    return fields
+
+
+def _config_as_string(plan: dict) -> dict:
+    answer = _legacy_answer(plan)
+    container = answer["parameters"] if "parameters" in answer else answer
+    if "operation_config" in container:
+        container["operation_config"] = json.dumps(container["operation_config"])
+    return answer
+
+
+# Answers seen from prompt-only routing; an unknown function cannot be repaired
+_ANSWER_VARIANTS = {
+    "as in the examples": lambda plan: json.dumps(_legacy_answer(plan)),
+    "prose around JSON": lambda plan: f"Here is the plan:\n```json\n{json.dumps(_legacy_answer(plan))}\n```",
+    "JSON then an example": lambda plan: (f"{json.dumps(_legacy_answer(plan))}\nFor example: "
+                                          f"{json.dumps({'function': 'read_adhoc', 'symbol': 'AAAA'})}"),
+    "config as string": lambda plan: json.dumps(_config_as_string(plan)),
+    "hyphenated function": lambda plan: json.dumps(_legacy_answer(plan, function=plan["function"].replace("_", "-"))),
+    "lower-case symbol": lambda plan: json.dumps(_legacy_answer(plan, symbol=plan["symbol"].lower())),
+    "numbers as strings": lambda plan: json.dumps(_legacy_answer(plan, parameters={
+        key: str(value) for key, value in plan["parameters"].items()})),
+    "missing symbol": lambda plan: json.dumps(_legacy_answer(plan, symbol=None)),
+    "unknown function": lambda plan: json.dumps(_legacy_answer(plan, function="stream_prices")),
+}
+
+
+def _legacy_route(content: str) -> tuple:
+    """The routing chain `execute` used before plans.py, reduced to what it dispatched."""
+    json_response = json.loads(re.search(r'\{.*\}', content, re.DOTALL).group(0))
+    function_name = json_response.get("function", "map_generate")
+    parameters = json_response.get("parameters")
+    if parameters is not None:
+        operation_config = parameters.pop("operation_config", None)
+    else:
+        operation_config = json_response.get("operation_config")
+    if operation_config and not parameters:
+        parameters = operation_config.get("parameters")
+    if parameters is None and 'symbol' in json_response:
+        parameters = {'symbol': json_response.get('symbol')}
+    if not function_name or not parameters:
+        raise ValueError("Invalid response from LLM")
+    symbol = parameters.get('symbol', json_response.get('symbol'))
+    return function_name, symbol, parameters.get("streaming_operator"), operation_config
+
+
+@app.command()
+def routing(trials: int = 4000, seed: int = 7):
+    """Prompt-only routing answers that need another LLM round trip: legacy regex chain vs plan repair"""
+    rng = random.Random(seed)
+    results = {name: [0, 0, 0] for name in _ANSWER_VARIANTS}  # answers, legacy ok, repaired ok
+    repair_us = 0.0
+    for _ in range(trials):
+        plan = rng.choice(_ROUTED_PLANS)
+        name = rng.choice(list(_ANSWER_VARIANTS))
+        content = _ANSWER_VARIANTS[name](plan)
+        expected = (plan["function"], plan["symbol"], plan["streaming_operator"], operation_config_for(plan))
+        results[name][0] += 1
+        try:
+            legacy = _legacy_route(content)
+            # The legacy chain passed no operation_config to the read functions
+            results[name][1] += int(legacy == (*expected[:3], None if plan["function"].startswith("read")
+                                               else expected[3]))
+        except Exception:
+            pass
+        start = time.perf_counter()
+        try:
+            repaired = parse_plan(content, f"a command about {plan['symbol']}")
+            results[name][2] += int((repaired["function"], repaired["symbol"], repaired["streaming_operator"],
+                                     operation_config_for(repaired)) == expected)
+        except PlanError:
+            pass
+        repair_us += (time.perf_counter() - start) * 1e6
+
+    print(f"{'answer variant':24} {'answers':>8} {'legacy ok':>10} {'repaired ok':>12}")
+    for name, (count, legacy_ok, repaired_ok) in results.items():
+        print(f"{name:24} {count:8} {legacy_ok / count:10.0%} {repaired_ok / count:12.0%}")
+    for label, column in (("legacy chain", 1), ("plan repair", 2)):
+        ok = sum(result[column] for result in results.values()) / trials
+        # A failed answer costs another full routing round trip (geometric retries)
+        print(f"{label}: {ok:.1%} routed on the first answer, "
+              f"{(1 - ok) / ok if ok else float('inf'):.2f} expected retries per command")
+    print(f"plan repair: {repair_us / trials:.1f} us per answer")
+
+
+_VALID_MAP = "def func(new_value, operation_config):\n    return new_value * float(operation_config['exchange_rate'])"
+_INVALID_MAPS = (
+    "def func(new_value, operation_config):\n    throw ValueError('unsupported')\n    return new_value *",
+    "def func(new_value, operation_config):\n    return str(new_value * operation_config['exchange_rate'])",
+    "def func(new_value, operation_config):\n    return new_value * operation_config['rate']",
+)
+
+
+@app.command()
+def codegen(trials: int = 40, candidates: int = 3, median_ms: float = 300, sigma: float = 0.7,
+            invalid_rate: float = 0.3, profile: bool = False, seed: int = 1):
+    """Operator creation latency and LLM calls: one candidate at a time vs first valid of several"""
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    calls = [0]
+
+    def fake_generate(prompt):
+        with rng_lock:
+            calls[0] += 1
+            latency = median_ms * rng.lognormvariate(0.0, sigma)
+            code = rng.choice(_INVALID_MAPS) if rng.random() < invalid_rate else _VALID_MAP
+        time.sleep(latency / 1000)
+        return code
+
+    # Same LLM call budget: `candidates` sequential rounds vs one round at
+    # increasing concurrency; queued candidates are cancelled on adoption
+    for n, rounds, concurrency in ((1, candidates, 1), (candidates, 1, 2), (candidates, 1, candidates)):
+        timings, failures = [], 0
+        calls[0] = 0
+        for _ in range(trials):
+            start = time.perf_counter()
+            try:
+                generate_first_valid("prompt", "map", {"exchange_rate": 1.2}, fake_generate,
+                                     candidates=n, rounds=rounds, profile=profile, concurrency=concurrency)
+            except ValueError:
+                failures += 1
+            timings.append((time.perf_counter() - start) * 1000)
+        # Abandoned requests still in flight count once they finish
+        time.sleep(median_ms * 10 / 1000)
+        timings.sort()
+        print(f"{n} candidate(s), {concurrency} at a time: p50 {timings[len(timings) // 2]:6.0f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95) - 1]:6.0f} ms, max {timings[-1]:6.0f} ms, "
+              f"{calls[0] / trials:.2f} LLM calls per operator, {failures}/{trials} failed")
+
+
+def _falls_then_jump(falls: int) -> dict:
+    return {
+        "steps": [
+            {"name": "fall", "times": falls,
+             "where": {"cmp": "<", "left": {"field": "price"}, "right": {"field": "prev.price"}}},
+            {"name": "jump",
+             "where": {"cmp": ">=", "left": {"field": "price"},
+                       "right": {"op": "*", "args": [{"field": "fall.price"}, {"param": "jump"}]}}},
+        ],
+        "contiguity": "strict",
+    }
+
+
+_DIP_THEN_RECOVERY = {
+    "steps": [
+        {"name": "dip", "where": {"cmp": "<=", "left": {"field": "price"},
+                                  "right": {"op": "*", "args": [{"field": "prev.price"}, {"param": "dip"}]}}},
+        {"name": "recovery", "where": {"cmp": ">=", "left": {"field": "price"},
+                                       "right": {"op": "*", "args": [{"field": "dip.price"}, {"param": "rise"}]}}},
+    ],
+    "contiguity": "relaxed",
+    "within": 50,
+}
+
+
+def _reference_falls_then_jump(prices: list, falls: int, jump: float) -> list:
+    """(start, end) indices of the same pattern found by rescanning each window."""
+    matches, last_end = [], -1
+    for end in range(len(prices)):
+        start = end - falls
+        # The first fall compares with the tick before the match; matches do not overlap
+        if start < 1 or start <= last_end:
+            continue
+        if all(prices[i] < prices[i - 1] for i in range(start, end)) and prices[end] >= prices[end - 1] * jump:
+            matches.append((start, end))
+            last_end = end
+    return matches
+
+
+@app.command()
+def patterns(ticks: int = 500_000, falls: int = 3, jump: float = 1.05, max_partials: int = 32):
+    """Event pattern matching: agreement with a rescan, per-tick cost vs stream length, partial-match state"""
+    decoded = [decode_tick(record) for record in synthetic_records(ticks)]
+    prices = [tick.price for tick in decoded]
+    index = {tick.timestamp: i for i, tick in enumerate(decoded)}
+
+    pattern = compile_pattern(_falls_then_jump(falls), {"jump": jump}, max_partials)
+    matcher = pattern.matcher()
+    found = []
+    for tick in decoded:
+        match = matcher.update(tick)
+        if match is not None:
+            found.append((index[match["start"]], index[match["end"]]))
+    expected = _reference_falls_then_jump(prices, falls, jump)
+    print(f"{falls} falls then a {jump - 1:.0%} jump: {len(found)} matches, reference {len(expected)}, "
+          f"{'agree' if found == expected else 'DISAGREE'}")
+
+    for name, spec, params in (("strict", _falls_then_jump(falls), {"jump": jump}),
+                               ("relaxed", _DIP_THEN_RECOVERY, {"dip": 0.98, "rise": 1.03})):
+        print(f"{name}: {'ticks':>9} {'us/tick':>8} {'matches':>8} {'peak partials':>14} {'dropped':>8}")
+        pattern = compile_pattern(spec, params, max_partials)
+        for n in (ticks // 100, ticks // 10, ticks):
+            matcher = pattern.matcher()
+            start = time.perf_counter()
+            for tick in decoded[:n]:
+                matcher.update(tick)
+            elapsed = time.perf_counter() - start
+            stats = matcher.stats()
+            print(f"{'':8}{n:9} {elapsed / n * 1e6:8.2f} {stats['matches']:8} {stats['peak_partials']:14} "
+                  f"{stats['dropped']:8}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def config_hash(operation_config: dict) -> str:
+    """Stable hash of an operation_config, independent of key order."""
+    encoded = json.dumps(operation_config, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def quantize(price: float, tick_size: float) -> float:
+    """Snap `price` to the nearest multiple of `tick_size` (no-op if tick_size <= 0)."""
+    if not tick_size or tick_size <= 0:
+        return price
+    return round(round(price / tick_size) * tick_size, 10)
+
+
+class ResultCache:
+    """
+    LRU cache of direct-mode LLM results keyed by (config hash, price).
+
+    Prices are quantized to `tick_size` before lookup, so near-identical
+    inputs share an entry. Hit/miss counters and the time spent computing
+    misses are kept for `stats()`.
+    """
+
+    def __init__(self, max_size: int = 4096, tick_size: float = 0.0):
+        self.max_size = max_size
+        self.tick_size = tick_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.miss_seconds = 0.0
+        self.hit_seconds = 0.0
+
+    def key(self, config_key: str, price: float) -> tuple:
+        return config_key, quantize(price, self.tick_size)
+
+    def get_or_compute(self, config_key: str, price: float, compute):
+        """
+        Return the cached result for (config_key, price), calling
+        `compute()` and caching its result on a miss.
+        """
+        start = time.perf_counter()
+        key = self.key(config_key, price)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                result = self._entries[key]
+                self.hits += 1
+                self.hit_seconds += time.perf_counter() - start
+                return result
+
+        # Compute outside the lock so slow LLM calls do not serialize hits
+        result = compute()
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += elapsed
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_hit_us": self.hit_seconds / self.hits * 1e6 if self.hits else 0.0,
+                "avg_miss_ms": self.miss_seconds / self.misses * 1e3 if self.misses else 0.0,
+            }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"cache: {stats['hits']} hits / {stats['misses']} misses "
+                f"(hit rate {stats['hit_rate']:.1%}), avg hit {stats['avg_hit_us']:.1f} us, "
+                f"avg miss {stats['avg_miss_ms']:.0f} ms, {stats['evictions']} evictions")
@@ -0,0 +1,198 @@
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from profiler import profile_operator, rejection_feedback
+from ticks import synthetic_records
+
+DEFAULT_CANDIDATES = 3
+# LLM requests in flight per round; later candidates queue and are cancelled once one is adopted
+DEFAULT_CONCURRENCY = 2
+VALIDATION_TICKS = 200
+
+# Function-calling tool for code generation: the source arrives as the
+# `result` argument, so no JSON has to be dug out of prose
+OPERATOR_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "submit_operator",
+        "description": "Submit the Python source of the requested operator function",
+        "parameters": {
+            "type": "object",
+            "properties": {"result": {"type": "string", "description": "Python source of the function"}},
+            "required": ["result"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# tracemalloc is process-wide and timings are skewed by concurrent work,
+# so candidates are profiled one at a time
+_profile_lock = threading.Lock()
+
+
+class CandidateRejected(ValueError):
+    """A generated operator failed to load, violated an invariant or the budget."""
+
+    def __init__(self, message: str, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+def load_generated_function(function_code_str: str):
+    # One namespace, so imports in the generated code are visible to the function
+    namespace = {}
+    exec(function_code_str, namespace)
+    func_match = re.search(r'def\s+(\w+)\s*\(', function_code_str)
+    if func_match is None:
+        raise ValueError("No function definition found in generated code")
+    return namespace[func_match.group(1)]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def check_invariants(func, kind: str, params: dict, ticks: int = VALIDATION_TICKS):
+    """
+    Run `func` on sample ticks and check what the operator callbacks rely on:
+    - map: returns a finite number for every price.
+    - filter: returns 'true' or 'false' (the callback lower-cases it).
+    - accumulate: returns an (acc, result) pair whose result is a finite
+      number (None is allowed while a window fills up).
+
+    Raises CandidateRejected with the first violation.
+    """
+    prices = [record["price"] for record in synthetic_records(ticks)]
+    acc = {}
+    result = None
+    for price in prices:
+        try:
+            if kind == "accumulate":
+                returned = func(acc, price, params)
+                if not isinstance(returned, tuple) or len(returned) != 2:
+                    raise CandidateRejected(f"returned {returned!r} instead of an (acc, result) tuple")
+                acc, result = returned
+                if result is not None and not _is_number(result):
+                    raise CandidateRejected(f"returned non-numeric result {result!r} for price {price}")
+            else:
+                result = func(price, params)
+                if kind == "map" and not _is_number(result):
+                    raise CandidateRejected(f"returned non-numeric {result!r} for price {price}")
+                if kind == "filter" and (not isinstance(result, str) or result.lower() not in ("true", "false")):
+                    raise CandidateRejected(f"returned {result!r} instead of 'true' or 'false' for price {price}")
+        except CandidateRejected:
+            raise
+        except Exception as e:
+            raise CandidateRejected(f"raised {type(e).__name__} on price {price}: {e}") from e
+    if kind == "accumulate" and not _is_number(result):
+        raise CandidateRejected(f"produced no numeric result after {ticks} ticks")
+
+
+def validate_candidate(function_code_str: str, kind: str, params: dict, profile: bool = True,
+                       fix_throw: bool = False, abandoned: threading.Event = None):
+    """
+    Compile, exercise and (optionally) profile one generated operator.
+
+    Returns:
+    - tuple: The function and its ProfileReport (None when not profiled).
+    """
+    if not isinstance(function_code_str, str):
+        raise CandidateRejected(f"expected code as a string, got {type(function_code_str).__name__}")
+    if fix_throw:
+        function_code_str = function_code_str.replace("throw", "raise")  # Correct the syntax error
+    try:
+        func = load_generated_function(function_code_str)
+    except Exception as e:
+        raise CandidateRejected(f"does not load: {type(e).__name__}: {e}") from e
+    check_invariants(func, kind, params)
+    if not profile:
+        return func, None
+    with _profile_lock:
+        if abandoned is not None and abandoned.is_set():
+            # Another candidate was adopted while this one waited to be profiled
+            raise CandidateRejected("abandoned")
+        report = profile_operator(func, kind, params)
+    if not report.accepted:
+        raise CandidateRejected("; ".join(report.reasons), report)
+    return func, report
+
+
+def generate_first_valid(prompt: str, kind: str, params: dict, generate, candidates: int = DEFAULT_CANDIDATES,
+                         rounds: int = 1, profile: bool = True, fix_throw: bool = False,
+                         concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    Request up to `candidates` operators, `concurrency` at a time, and adopt
+    the first one that validates. Queued requests are cancelled once a
+    candidate is adopted and never reach the LLM; requests already in
+    flight cannot be cancelled, so they complete (and are billed) with
+    their results ignored. `concurrency` trades that cost against latency.
+    If every candidate in a round fails, the next round's prompt carries
+    the rejection reasons.
+
+    Args:
+    - prompt (str): Code generation prompt.
+    - kind (str): "map", "filter" or "accumulate".
+    - params (dict): Parameters passed to the operator.
+    - generate: Callable returning generated code for a prompt.
+
+    Returns:
+    - tuple: The function and its ProfileReport (None when not profiled).
+    """
+    round_prompt = prompt
+    for round_number in range(1, rounds + 1):
+        started = time.perf_counter()
+        adopted = threading.Event()
+
+        def attempt(index: int):
+            if adopted.is_set():
+                return None
+            code = generate(round_prompt)
+            if adopted.is_set():
+                return None
+            result = validate_candidate(code, kind, params, profile, fix_throw, adopted)
+            # Set before the worker picks up a queued candidate, so it is skipped
+            adopted.set()
+            return result
+
+        executor = ThreadPoolExecutor(max_workers=max(min(concurrency, candidates), 1),
+                                      thread_name_prefix=f"codegen-{kind}")
+        futures = {executor.submit(attempt, index): index for index in range(1, candidates + 1)}
+        failures = []
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failures.append((futures[future], e))
+                    print(f"Rejected {kind} candidate {futures[future]}: {e}")
+                    continue
+                if result is None:
+                    # Abandoned: another candidate validated first
+                    continue
+                func, report = result
+                adopted.set()
+                print(f"Adopted {kind} candidate {futures[future]} of {candidates} after "
+                      f"{time.perf_counter() - started:.1f} s ({len(failures)} rejected)")
+                if report is not None:
+                    print(report.format())
+                return func, report
+        finally:
+            adopted.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        reports = [e.report for _, e in failures if getattr(e, "report", None) is not None]
+        feedback = rejection_feedback(reports[0]) if reports else ""
+        errors = "; ".join(str(e) for _, e in failures if getattr(e, "report", None) is None)
+        if errors:
+            feedback += f"""
+    Previous implementations were rejected: {errors}.
+    Return only the function source, following the requested signature and return type.
+    """
+        round_prompt = prompt + feedback
+        if round_number < rounds:
+            print(f"Regenerating {kind} operator ({round_number}/{rounds})")
+
+    raise ValueError(f"No valid {kind} operator after {rounds} round(s) of {candidates} candidates")
@@ -0,0 +1,142 @@
+import threading
+
+
+def open_status_downlink(swim_client, host_uri: str, node_uri: str, callback=None,
+                         lane_uri: str = "status", wait_for_sync: bool = True,
+                         sync_timeout: float = None):
+    """
+    Open a value downlink on `lane_uri` of `node_uri`.
+
+    Each downlink gets its own sync event, so several downlinks can be
+    opened concurrently on one SwimClient. With `wait_for_sync` the call
+    blocks until the lane has synced (or `sync_timeout` seconds pass).
+    """
+    synced = threading.Event()
+    value_downlink = swim_client.downlink_value()
+    value_downlink.set_host_uri(host_uri)
+    value_downlink.set_node_uri(node_uri)
+    value_downlink.set_lane_uri(lane_uri)
+    if callback is not None:
+        value_downlink.did_set(callback)
+    value_downlink.did_sync(synced.set)
+    value_downlink.open()
+    if wait_for_sync:
+        synced.wait(sync_timeout)
+    return value_downlink
+
+
+class _Subscription:
+    """A pooled downlink whose callback can be attached after it opened."""
+
+    def __init__(self, node_uri: str, lane_uri: str):
+        self.node_uri = node_uri
+        self.lane_uri = lane_uri
+        self.downlink = None
+        self.synced = threading.Event()
+        self.callback = None
+        self.acquired = False
+        self.latest = None
+        # Serializes delivery, so a live tick never overtakes (or races) the
+        # replay of the one before it: stateful operators see each tick once, in order
+        self._delivery = threading.Lock()
+
+    def did_set(self, new_value, old_value):
+        with self._delivery:
+            self.latest = (new_value, old_value)
+            if self.callback is not None:
+                self.callback(new_value, old_value)
+
+    def attach(self, callback):
+        # Replay the value that arrived before the callback did, then go live
+        with self._delivery:
+            self.callback = callback
+            if callback is not None and self.latest is not None:
+                callback(*self.latest)
+
+
+class DownlinkPool:
+    """
+    Status downlinks that can be opened before anyone needs them.
+
+    `open` starts a downlink (and its sync) without a callback, e.g. for a
+    symbol guessed from the command text while the LLM is still planning.
+    `acquire` attaches the real callback, replaying the latest synced value
+    so nothing is lost, and opens the downlink on demand if it was not
+    pre-opened. `discard_unused` closes speculative downlinks nobody acquired.
+    """
+
+    def __init__(self, swim_client, host_uri: str, on_first_result=None):
+        self.swim_client = swim_client
+        self.host_uri = host_uri
+        self.on_first_result = on_first_result
+        self.subscriptions = {}
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+        self._lock = threading.Lock()
+        self._first_result_reported = False
+
+    def open(self, node_uri: str, lane_uri: str = "status") -> _Subscription:
+        with self._lock:
+            key = (node_uri, lane_uri)
+            subscription = self.subscriptions.get(key)
+            if subscription is not None:
+                return subscription
+            subscription = self.subscriptions[key] = _Subscription(node_uri, lane_uri)
+        downlink = self.swim_client.downlink_value()
+        downlink.set_host_uri(self.host_uri)
+        downlink.set_node_uri(node_uri)
+        downlink.set_lane_uri(lane_uri)
+        downlink.did_set(subscription.did_set)
+        downlink.did_sync(subscription.synced.set)
+        downlink.open()
+        subscription.downlink = downlink
+        self.opened += 1
+        return subscription
+
+    def _first_result(self):
+        if self.on_first_result is not None and not self._first_result_reported:
+            self._first_result_reported = True
+            self.on_first_result()
+
+    def acquire(self, node_uri: str, callback=None, lane_uri: str = "status", wait_for_sync: bool = True,
+                sync_timeout: float = None):
+        """Return an open downlink on `node_uri` delivering ticks to `callback`."""
+        if (node_uri, lane_uri) in self.subscriptions:
+            self.reused += 1
+        subscription = self.open(node_uri, lane_uri)
+        subscription.acquired = True
+        if wait_for_sync:
+            subscription.synced.wait(sync_timeout)
+        if callback is None:
+            self._first_result()
+        else:
+            def timed_callback(new_value, old_value):
+                callback(new_value, old_value)
+                self._first_result()
+            subscription.attach(timed_callback)
+        return subscription.downlink
+
+    def release(self, node_uri: str, lane_uri: str = "status"):
+        """Hand the subscription on `node_uri` over to the caller (who closes it), or None."""
+        with self._lock:
+            subscription = self.subscriptions.pop((node_uri, lane_uri), None)
+        if subscription is not None:
+            subscription.acquired = True
+            self.reused += 1
+        return subscription
+
+    def discard_unused(self):
+        with self._lock:
+            unused = [key for key, s in self.subscriptions.items() if not s.acquired]
+            subscriptions = [self.subscriptions.pop(key) for key in unused]
+        for subscription in subscriptions:
+            subscription.downlink.close()
+            self.discarded += 1
+
+    def close(self):
+        with self._lock:
+            subscriptions = list(self.subscriptions.values())
+            self.subscriptions.clear()
+        for subscription in subscriptions:
+            subscription.downlink.close()
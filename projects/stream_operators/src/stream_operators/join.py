@@ -0,0 +1,272 @@
+import ast
+import threading
+from collections import deque
+
+from predicates import PredicateError
+from ticks import MISSING_TIMESTAMP, TICK_FIELDS, decode_tick
+
+
+def parse_join_input(spec: str) -> tuple:
+    """
+    Parse one join input into (name, node_uri, lane_uri).
+
+    Accepted forms: "AAAA" (the status lane of /stock/AAAA), "AAAA#lane",
+    and "name=/node/uri#lane" for arbitrary nodes.
+    """
+    spec = spec.strip()
+    name, _, target = spec.rpartition("=")
+    target, _, lane_uri = target.partition("#")
+    lane_uri = lane_uri or "status"
+    if target.startswith("/"):
+        node_uri = target
+        name = name or target.rstrip("/").rsplit("/", 1)[-1]
+    else:
+        node_uri = f"/stock/{target}"
+        name = name or (target if lane_uri == "status" else f"{target}_{lane_uri}")
+    if not name.isidentifier():
+        raise ValueError(f"Join input name '{name}' must be an identifier (use name=/node#lane)")
+    return name, node_uri, lane_uri
+
+
+_BINARY_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+
+
+def _field_name(node) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return f"{_field_name(node.value)}.{node.attr}"
+    raise PredicateError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+def _expression_spec(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _expression_spec(node.operand)
+        return operand if isinstance(node.op, ast.UAdd) else {"op": "-", "args": [0, operand]}
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        return {"op": _BINARY_OPERATORS[type(node.op)],
+                "args": [_expression_spec(node.left), _expression_spec(node.right)]}
+    return {"field": _field_name(node)}
+
+
+def parse_expression(text: str):
+    """
+    Translate arithmetic over joined fields, e.g. "AAAA.price / BBBB.price",
+    into an operand spec for `predicates.compile_expression`.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise PredicateError(f"Invalid expression '{text}': {e.msg}") from e
+    return _expression_spec(tree.body)
+
+
+def joined_field_names(names) -> tuple:
+    """Flattened field names of a joined record for the given input names."""
+    return ("timestamp",) + tuple(f"{name}.{field}" for name in names for field in TICK_FIELDS)
+
+
+class _JoinBuffer:
+    """Ticks of one input in timestamp order, pruned behind the watermark."""
+
+    def __init__(self, name: str, max_buffer: int):
+        self.name = name
+        self.ticks = deque()
+        self.max_buffer = max_buffer
+        self.latest = None
+        self.received = 0
+        self.out_of_order = 0
+        self.overflow = 0
+
+    def append(self, timestamp: int, tick):
+        self.ticks.append((timestamp, tick))
+        self.latest = timestamp
+        self.received += 1
+        if len(self.ticks) > self.max_buffer:
+            self.ticks.popleft()
+            self.overflow += 1
+
+    def as_of(self, timestamp: int):
+        """Latest (timestamp, tick) at or before `timestamp`, or None."""
+        found = None
+        for entry in self.ticks:
+            if entry[0] > timestamp:
+                break
+            found = entry
+        return found
+
+    def prune(self, watermark: int):
+        # Keep the last tick at or before the watermark: later events join against it
+        ticks = self.ticks
+        while len(ticks) > 1 and ticks[1][0] <= watermark:
+            ticks.popleft()
+
+
+# Why an event could not be joined
+_EARLY = "early"
+_STALE = "stale"
+
+
+class AsOfJoin:
+    """
+    Event-time as-of join over several inputs with bounded staleness.
+
+    Each tick is an event. Once every live input has advanced past an
+    event's timestamp (the watermark), the event is joined with the latest
+    tick at or before that timestamp from every other input and emitted as
+    one flat record: {"timestamp", "source", "AAAA.price", "BBBB.price", ...}.
+    Events whose partner ticks are older than `max_staleness_ms` are
+    counted as stale and not emitted.
+
+    The watermark only starts once every input has ticked; until then
+    events stay buffered and are reported as pending. Events older than
+    some input's first tick have nothing to join against and are counted
+    as early, not stale. A tick at or behind the watermark (e.g. from an
+    input that stalled and caught up) is counted as late: it is kept as a
+    join partner but never emitted as an event itself.
+
+    An input whose latest tick lags the newest input by more than
+    `max_staleness_ms` is treated as stalled and ignored by the watermark,
+    so join latency stays within `max_staleness_ms` of event time. Buffers
+    are pruned behind the watermark and hard-capped at `max_buffer` ticks.
+
+    Args:
+    - names: Input names, used as field prefixes in joined records.
+    - on_joined: Called with each joined record.
+    - max_staleness_ms (int): Staleness bound in event-time milliseconds.
+    - max_buffer (int): Max ticks kept per input.
+    - emit_on: Input names whose ticks trigger joined records (default all).
+    """
+
+    def __init__(self, names, on_joined, max_staleness_ms: int = 5000, max_buffer: int = 1024,
+                 emit_on=None):
+        self.names = tuple(names)
+        if len(set(self.names)) != len(self.names):
+            raise ValueError(f"Duplicate join input names: {', '.join(self.names)}")
+        self.on_joined = on_joined
+        self.max_staleness_ms = max_staleness_ms
+        self.buffers = {name: _JoinBuffer(name, max_buffer) for name in self.names}
+        self.emit_on = set(emit_on or self.names)
+        self.emitted_through = None
+        self.joined = 0
+        self.stale = 0
+        self.early = 0
+        self.late = 0
+        self._lock = threading.Lock()
+
+    def callback_for(self, name: str):
+        """Downlink callback feeding input `name`."""
+        buffer = self.buffers[name]
+
+        def join_callback(new_value: dict, _old_value: dict):
+            tick = decode_tick(new_value)
+            if tick.timestamp == MISSING_TIMESTAMP:
+                return
+            with self._lock:
+                if buffer.latest is not None and tick.timestamp <= buffer.latest:
+                    buffer.out_of_order += 1
+                    return
+                buffer.append(tick.timestamp, tick)
+                if self.emitted_through is not None and tick.timestamp <= self.emitted_through \
+                        and name in self.emit_on:
+                    # The watermark has passed it: it can only be a partner now
+                    self.late += 1
+                records = self._advance()
+            for record in records:
+                self.on_joined(record)
+
+        return join_callback
+
+    def watermark(self):
+        latest = [buffer.latest for buffer in self.buffers.values()]
+        if None in latest:
+            # Some input has not ticked yet: nothing can be joined
+            return None
+        newest = max(latest)
+        # Stalled inputs do not hold the watermark back
+        return min(t for t in latest if newest - t <= self.max_staleness_ms)
+
+    def _advance(self) -> list:
+        watermark = self.watermark()
+        if watermark is None or (self.emitted_through is not None and watermark <= self.emitted_through):
+            return []
+        events = []
+        for index, name in enumerate(self.names):
+            if name not in self.emit_on:
+                continue
+            for timestamp, tick in self.buffers[name].ticks:
+                if timestamp > watermark:
+                    break
+                if self.emitted_through is None or timestamp > self.emitted_through:
+                    events.append((timestamp, index, name, tick))
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        records = []
+        for timestamp, _, source, tick in events:
+            record = self._join(timestamp, source, tick)
+            if record is _EARLY:
+                self.early += 1
+            elif record is _STALE:
+                self.stale += 1
+            else:
+                self.joined += 1
+                records.append(record)
+
+        self.emitted_through = watermark
+        for buffer in self.buffers.values():
+            buffer.prune(watermark)
+        return records
+
+    def _join(self, timestamp: int, source: str, tick):
+        record = {"timestamp": timestamp, "source": source}
+        for name in self.names:
+            if name == source:
+                partner = tick
+            else:
+                entry = self.buffers[name].as_of(timestamp)
+                if entry is None:
+                    return _EARLY
+                if timestamp - entry[0] > self.max_staleness_ms:
+                    return _STALE
+                partner = entry[1]
+            for field, value in zip(TICK_FIELDS, partner.as_tuple()):
+                record[f"{name}.{field}"] = value
+        return record
+
+    def stats(self) -> dict:
+        with self._lock:
+            watermark = self.watermark()
+            newest = max((b.latest for b in self.buffers.values() if b.latest is not None), default=None)
+            pending = sum(1 for name in self.emit_on for timestamp, _ in self.buffers[name].ticks
+                          if self.emitted_through is None or timestamp > self.emitted_through)
+            return {
+                "joined": self.joined,
+                "stale": self.stale,
+                "early": self.early,
+                "late": self.late,
+                "pending": pending,
+                "watermark": watermark,
+                "watermark_lag_ms": newest - watermark if watermark is not None else None,
+                "inputs": {
+                    name: {"buffered": len(b.ticks), "latest": b.latest, "received": b.received,
+                           "out_of_order": b.out_of_order, "overflow": b.overflow,
+                           "waiting": b.latest is None,
+                           "stalled": b.latest is not None and newest - b.latest > self.max_staleness_ms}
+                    for name, b in self.buffers.items()
+                },
+            }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        lines = [f"Join: {stats['joined']} records, {stats['stale']} stale, {stats['early']} early, "
+                 f"{stats['late']} late, {stats['pending']} pending, "
+                 f"watermark lag {stats['watermark_lag_ms']} ms"]
+        for name, s in stats["inputs"].items():
+            lines.append(f"  {name}: {s['received']} ticks, {s['buffered']} buffered, "
+                         f"{s['out_of_order']} out of order, {s['overflow']} overflowed"
+                         f"{', waiting for its first tick' if s['waiting'] else ''}"
+                         f"{', stalled' if s['stalled'] else ''}")
+        return "\n".join(lines)
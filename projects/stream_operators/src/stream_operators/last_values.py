@@ -0,0 +1,188 @@
+import threading
+import time
+
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_SYNC_TIMEOUT = 10.0
+
+
+class _LastValue:
+    """One subscribed status lane and the latest value it delivered."""
+
+    def __init__(self, node_uri: str):
+        self.node_uri = node_uri
+        self.downlink = None
+        self.synced = threading.Event()
+        self.value = None
+        self.closed = False
+        self.last_read = time.monotonic()
+
+    def did_set(self, new_value, _old_value):
+        self.value = new_value
+
+    def did_sync(self):
+        self.synced.set()
+
+    def did_close(self):
+        # The link dropped: the last value may be out of date
+        self.closed = True
+
+    @property
+    def live(self) -> bool:
+        """Synced and still linked, so `value` is the lane's current value."""
+        return self.synced.is_set() and not self.closed
+
+
+class LastValueCache:
+    """
+    Latest status of many symbols, served from memory.
+
+    The first read of a symbol opens a value downlink that then stays open
+    and subscribed, so later reads are a dictionary lookup. A value is
+    served for as long as its downlink stays linked, however long the lane
+    goes without changing: a subscribed lane pushes every change. Only a
+    closed link makes a value stale, and the next read reopens the downlink
+    to force a fresh sync. Downlinks not read for `idle_timeout` seconds
+    are closed by a background sweep.
+    """
+
+    def __init__(self, swim_client, host_uri: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 sync_timeout: float = DEFAULT_SYNC_TIMEOUT, lane_uri: str = "status"):
+        self.swim_client = swim_client
+        self.host_uri = host_uri
+        self.idle_timeout = idle_timeout
+        self.sync_timeout = sync_timeout
+        self.lane_uri = lane_uri
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._sweeper = None
+
+    def _open(self, entry: _LastValue):
+        downlink = self.swim_client.downlink_value()
+        downlink.set_host_uri(self.host_uri)
+        downlink.set_node_uri(entry.node_uri)
+        downlink.set_lane_uri(self.lane_uri)
+        downlink.did_set(entry.did_set)
+        downlink.did_sync(entry.did_sync)
+        self._watch_close(downlink, entry)
+        downlink.open()
+        entry.downlink = downlink
+
+    @staticmethod
+    def _watch_close(downlink, entry: _LastValue):
+        # Client versions without a close hook only lose links the cache closes itself
+        if hasattr(downlink, "did_close"):
+            downlink.did_close(entry.did_close)
+
+    def _entry(self, symbol: str) -> tuple:
+        """The entry for `symbol` and whether it must be (re)synced before reading."""
+        node_uri = f"/stock/{symbol}"
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(node_uri)
+            if entry is None:
+                entry = self.entries[node_uri] = _LastValue(node_uri)
+                self.misses += 1
+                self._open(entry)
+                self._start_sweeper()
+                return entry, True
+            entry.last_read = now
+            if entry.closed:
+                self.refreshes += 1
+                entry.downlink.close()
+                entry.synced = threading.Event()
+                entry.closed = False
+                self._open(entry)
+                return entry, True
+            if not entry.live:
+                self.misses += 1
+                return entry, True
+            self.hits += 1
+            return entry, False
+
+    def read(self, symbol: str):
+        """Latest status record of `symbol`, or None if it did not sync in time."""
+        entry, pending = self._entry(symbol)
+        if pending and not entry.synced.wait(self.sync_timeout):
+            return None
+        return entry.value
+
+    def read_many(self, symbols) -> dict:
+        """Latest status of every symbol; downlinks for missing ones open concurrently."""
+        pending = {symbol: self._entry(symbol) for symbol in symbols}
+        deadline = time.monotonic() + self.sync_timeout
+        results = {}
+        for symbol, (entry, needs_sync) in pending.items():
+            if needs_sync and not entry.synced.wait(max(deadline - time.monotonic(), 0.0)):
+                results[symbol] = None
+            else:
+                results[symbol] = entry.value
+        return results
+
+    def adopt(self, symbol: str, subscription) -> bool:
+        """
+        Serve `symbol` from a downlink already opened by a DownlinkPool
+        (see DownlinkPool.release) instead of opening a second one. Returns
+        False, leaving the subscription to the caller, if `symbol` is
+        already subscribed.
+        """
+        node_uri = f"/stock/{symbol}"
+        with self._lock:
+            if node_uri in self.entries:
+                return False
+            entry = self.entries[node_uri] = _LastValue(node_uri)
+            entry.downlink = subscription.downlink
+            entry.synced = subscription.synced
+            self._watch_close(subscription.downlink, entry)
+            self._start_sweeper()
+        subscription.attach(entry.did_set)
+        return True
+
+    def prefetch(self, symbols):
+        """Start subscribing to `symbols` without waiting for them to sync."""
+        for symbol in symbols:
+            self._entry(symbol)
+
+    def _start_sweeper(self):
+        if self._sweeper is None and self.idle_timeout:
+            self._sweeper = threading.Thread(target=self._sweep, name="last-value-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep(self):
+        while not self._closed.wait(max(self.idle_timeout / 4, 0.05)):
+            self.evict_idle()
+
+    def evict_idle(self) -> int:
+        """Close downlinks that have not been read for `idle_timeout` seconds."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [node_uri for node_uri, entry in self.entries.items() if entry.last_read < cutoff]
+            evicted = [self.entries.pop(node_uri) for node_uri in idle]
+        for entry in evicted:
+            entry.downlink.close()
+        self.evictions += len(evicted)
+        return len(evicted)
+
+    def stats(self) -> dict:
+        reads = self.hits + self.misses + self.refreshes
+        return {"subscribed": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "refreshes": self.refreshes, "evictions": self.evictions,
+                "hit_rate": self.hits / reads if reads else 0.0}
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"Last-value cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['refreshes']} refreshes ({stats['hit_rate']:.1%} hit rate), "
+                f"{stats['subscribed']} subscribed, {stats['evictions']} evicted")
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            entries = list(self.entries.values())
+            self.entries.clear()
+        for entry in entries:
+            entry.downlink.close()
@@ -0,0 +1,138 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOCAL_OPERATOR_ID = "local"
+
+
+def merge_config(operation_config: dict, changes: dict) -> dict:
+    """
+    `operation_config` with `changes` applied: nested objects (such as
+    `parameters`) are merged key by key and a None value removes a key, so
+    {"parameters": {"threshold": 30}} changes one parameter only.
+    """
+    merged = dict(operation_config or {})
+    for key, value in (changes or {}).items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def description_changed(previous, operation_config: dict) -> bool:
+    """Whether the description differs from the previous (config, derived) version."""
+    return previous is None or previous[0].get("description") != operation_config.get("description")
+
+
+class LiveConfig:
+    """
+    The operation_config of a running operator together with what is derived
+    from it (bound parameters, a compiled predicate, generated code).
+
+    Both are replaced as one reference, so a callback that reads `current`
+    once per tick sees either the old or the new version, never a mix, and
+    the change applies from the next tick on. `derive(operation_config,
+    previous)` builds the derived part; `previous` is the (config, derived)
+    pair being replaced (None at build time), so derivations can reuse
+    what is unaffected, e.g. keep generated code when only parameters change.
+    It runs before the swap, so ticks keep flowing on the old version while
+    the LLM regenerates code. Reconfigurations are serialized.
+    """
+
+    def __init__(self, operation_config: dict, derive=None):
+        self.derive = derive or (lambda config, previous: None)
+        self.current = (operation_config, self.derive(operation_config, None))
+        self.version = 1
+        self._lock = threading.Lock()
+
+    @property
+    def operation_config(self) -> dict:
+        return self.current[0]
+
+    def reconfigure(self, changes: dict) -> dict:
+        """Apply `changes` (see merge_config); returns the new operation_config."""
+        with self._lock:
+            previous = self.current
+            operation_config = merge_config(previous[0], changes)
+            self.current = (operation_config, self.derive(operation_config, previous))
+            self.version += 1
+        return operation_config
+
+    def describe(self) -> dict:
+        return {"operation_config": self.operation_config, "config_version": self.version}
+
+
+def attach(callback, live: LiveConfig, on_change=None):
+    """Expose `live` on an operator callback as `callback.reconfigure(changes)`."""
+    def reconfigure(changes: dict) -> dict:
+        operation_config = live.reconfigure(changes)
+        if on_change is not None:
+            on_change(live.current[1])
+        return operation_config
+
+    callback.live_config = live
+    callback.reconfigure = reconfigure
+    return callback
+
+
+class _LocalControlHandler(BaseHTTPRequestHandler):
+    callback = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str):
+        if self.path.rstrip("/") != f"/operators/{LOCAL_OPERATOR_ID}":
+            return self._send(404, {"error": f"No route for {self.path}"})
+        try:
+            if method == "PATCH":
+                length = int(self.headers.get("Content-Length") or 0)
+                changes = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(changes, dict) or set(changes) - {"operation_config"}:
+                    raise ValueError("Only operation_config can change while the operator runs")
+                operation_config = changes.get("operation_config") or {}
+                if isinstance(operation_config, str):
+                    operation_config = json.loads(operation_config)
+                self.callback.reconfigure(operation_config)
+            return self._send(200, {"id": LOCAL_OPERATOR_ID, "status": "running",
+                                    **self.callback.live_config.describe()})
+        except (ValueError, TypeError) as e:
+            return self._send(400, {"error": str(e)})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+
+class ControlListener:
+    """
+    Local control endpoint for the operator of a standalone command (such as
+    `filter-direct`), with the same shape as the operator server's API:
+
+        GET    /operators/local   current operation_config and version
+        PATCH  /operators/local   {"operation_config": {...changes}}
+    """
+
+    def __init__(self, callback, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundLocalControlHandler", (_LocalControlHandler,), {"callback": callback})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.host, self.port = self.httpd.server_address[:2]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="operator-control", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,470 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from plans import parse_plan, plan_parser
+
+# LLM work falls into three tasks with different latency/quality needs:
+# - routing: classify a command into a plan (once per command)
+# - direct: answer a map/filter/accumulate question (once per tick)
+# - codegen: write an operator or a predicate (once per operator)
+TASKS = ("routing", "direct", "codegen")
+
+# Escalation chains, cheapest first; override with LLM_<TASK>_MODELS=a,b
+DEFAULT_MODELS = {
+    "routing": ("gpt-4o-mini", "gpt-4"),
+    "direct": ("gpt-4o-mini", "gpt-4"),
+    "codegen": ("gpt-4",),
+}
+
+# USD per million (input, output) tokens; unknown models are recorded at 0
+MODEL_PRICES = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+DEFAULT_MIN_CONFIDENCE = 0.85
+# Local schema repairs a routing plan may need before it counts as a weak answer
+DEFAULT_MAX_REPAIRS = 1
+
+
+def parse_json_result(content: str):
+    """Parse a JSON answer, unwrapping the `result` key the prompts ask for."""
+    try:
+        result = json.loads(content)
+        if isinstance(result, dict):
+            return result['result'] if 'result' in result else result
+    except json.JSONDecodeError:
+        pass
+
+    # Use regex to extract JSON object with non-greedy match
+    json_match = re.search(r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}', content, re.DOTALL)
+    if not json_match:
+        raise ValueError("No valid JSON found in LLM response")
+    try:
+        result = json.loads(json_match.group(0))
+        return result['result'] if 'result' in result else result
+    except (json.JSONDecodeError, KeyError) as e:
+        raise ValueError("Failed to decode JSON from LLM response") from e
+
+
+def parse_json_object(content: str) -> dict:
+    """Parse the outermost JSON object in a response (routing plans)."""
+    json_match = re.search(r'\{.*\}', content, re.DOTALL)
+    if not json_match:
+        raise ValueError("No valid JSON found in LLM response")
+    try:
+        return json.loads(json_match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError("Failed to decode JSON from LLM response") from e
+
+
+PARSERS = {
+    None: None,
+    "parse_json_result": parse_json_result,
+    "parse_json_object": parse_json_object,
+    "parse_plan": parse_plan,
+}
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def same_answer(a, b, rel_tol: float = 1e-3) -> bool:
+    """Whether two parsed answers agree (numbers within `rel_tol`)."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=1e-9)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same_answer(a[k], b[k], rel_tol) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same_answer(x, y, rel_tol) for x, y in zip(a, b))
+    return a == b
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+
+
+class TierPolicy:
+    """
+    Which models serve each task, and when to escalate.
+
+    A task's models form a chain: a response from an earlier (cheaper)
+    model is used unless the call fails, the response fails to parse, or
+    its confidence (geometric mean token probability) is below
+    `min_confidence`. Logprobs are only requested where that confidence
+    is used (see `uses_confidence`). `shadow_rate` is the fraction of
+    accepted cheap answers also sent to the last model in the background,
+    to measure the cheap tier's accuracy.
+
+    Forced tool calls (routing and codegen) return no logprobs for their
+    arguments, so they have no confidence. Routing escalates instead when
+    its plan needed more than `max_repairs` local schema repairs (see
+    plans.repair_plan). Codegen never escalates on confidence: every
+    candidate is compiled, checked and profiled, and a rejected one is
+    regenerated (see codegen.generate_first_valid).
+    """
+
+    def __init__(self, models: dict = None, min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 shadow_rate: float = 0.0, max_repairs: int = DEFAULT_MAX_REPAIRS):
+        self.models = {task: tuple(chain) for task, chain in {**DEFAULT_MODELS, **(models or {})}.items()}
+        self.min_confidence = min_confidence
+        self.shadow_rate = shadow_rate
+        self.max_repairs = max_repairs
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "TierPolicy":
+        models = {}
+        for task in TASKS:
+            value = environ.get(f"LLM_{task.upper()}_MODELS")
+            if value:
+                models[task] = tuple(m.strip() for m in value.split(",") if m.strip())
+        return cls(models,
+                   min_confidence=float(environ.get("LLM_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE)),
+                   shadow_rate=float(environ.get("LLM_SHADOW_RATE", 0.0)),
+                   max_repairs=int(environ.get("LLM_MAX_REPAIRS", DEFAULT_MAX_REPAIRS)))
+
+    def chain(self, task: str) -> tuple:
+        if task not in self.models:
+            raise ValueError(f"Unknown LLM task '{task}'. Expected one of: {', '.join(self.models)}")
+        return self.models[task]
+
+    def describe(self) -> str:
+        chains = "; ".join(f"{task}: {' -> '.join(chain)}" for task, chain in self.models.items())
+        return (f"{chains} (escalate below confidence {self.min_confidence}, "
+                f"or routing plans with more than {self.max_repairs} repair(s))")
+
+    def uses_confidence(self, task: str, tier: int, tool: dict = None) -> bool:
+        """Whether `tier` of the task's chain escalates on confidence, and so needs logprobs."""
+        if task == "codegen" or tool is not None or self.min_confidence <= 0:
+            return False
+        return tier < len(self.chain(task)) - 1
+
+    def weak(self, response, repairs) -> bool:
+        """Whether a parsed response should be escalated to the next tier."""
+        if response.confidence is not None:
+            return response.confidence < self.min_confidence
+        # No logprobs (not requested, or a tool call): fall back to the parser's repair count, if it keeps one
+        return repairs is not None and len(repairs) > self.max_repairs
+
+
+class LLMCallRecorder:
+    """
+    Per-tier latency, cost and accuracy, optionally appended to a JSONL
+    log. Every call is one line; agreement checks between a cheap tier and
+    the reference (last) tier are lines with "kind": "comparison".
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def _tier(self, task: str, model: str) -> dict:
+        return self.stats.setdefault((task, model), {
+            "calls": 0, "latency_ms": 0.0, "cost": 0.0, "call_errors": 0, "parse_failures": 0,
+            "escalations": 0, "comparisons": 0, "agreements": 0})
+
+    def record(self, entry: dict):
+        with self._lock:
+            tier = self._tier(entry["task"], entry["model"])
+            if entry.get("kind") == "comparison":
+                tier["comparisons"] += 1
+                tier["agreements"] += int(entry["agree"])
+            else:
+                tier["calls"] += 1
+                tier["latency_ms"] += entry["latency_ms"]
+                tier["cost"] += entry["cost"]
+                tier["call_errors"] += int(entry.get("call_error") is not None)
+                tier["parse_failures"] += int(entry.get("parse_error") is not None)
+                tier["escalations"] += int(entry.get("escalated", False))
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"time": time.time(), **entry}, default=str) + "\n")
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {f"{task}/{model}": {
+                **tier,
+                "mean_latency_ms": tier["latency_ms"] / tier["calls"] if tier["calls"] else None,
+                "accuracy": tier["agreements"] / tier["comparisons"] if tier["comparisons"] else None,
+            } for (task, model), tier in self.stats.items()}
+
+    def format_summary(self) -> str:
+        lines = ["LLM calls by tier:"]
+        for name, tier in self.summary().items():
+            latency = f"{tier['mean_latency_ms']:.0f} ms" if tier["mean_latency_ms"] is not None else "-"
+            accuracy = f"{tier['accuracy']:.1%} of {tier['comparisons']}" if tier["accuracy"] is not None else "-"
+            lines.append(f"  {name}: {tier['calls']} calls, mean {latency}, ${tier['cost']:.4f}, "
+                         f"{tier['call_errors']} call errors, {tier['parse_failures']} parse failures, "
+                         f"{tier['escalations']} escalated, "
+                         f"accuracy {accuracy}")
+        return "\n".join(lines)
+
+
+def load_records(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LLMGateway:
+    """Runs each LLM request on its task's model chain and records every call."""
+
+    def __init__(self, client, policy: TierPolicy = None, recorder: LLMCallRecorder = None):
+        self.client = client
+        self.policy = policy or TierPolicy()
+        self.recorder = recorder or LLMCallRecorder()
+        self._shadow = None
+
+    def _call(self, model: str, prompt: str, max_tokens: int, tool: dict = None,
+              logprobs: bool = False) -> SimpleNamespace:
+        start = time.perf_counter()
+        options = {}
+        if tool is not None:
+            # Schema-constrained output: the model must call `tool` with matching arguments
+            options = {"tools": [tool],
+                       "tool_choice": {"type": "function", "function": {"name": tool["function"]["name"]}}}
+        if logprobs:
+            options["logprobs"] = True
+        response = self.client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            max_tokens=max_tokens,
+            **options,
+        )
+        # A replayed response reports the latency it was recorded with
+        latency_ms = getattr(response, "recorded_latency_ms", None) or (time.perf_counter() - start) * 1000
+        choice = response.choices[0]
+        confidence = None
+        token_logprobs = getattr(getattr(choice, "logprobs", None), "content", None)
+        if token_logprobs:
+            confidence = math.exp(sum(t.logprob for t in token_logprobs) / len(token_logprobs))
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        tool_calls = getattr(choice.message, "tool_calls", None)
+        content = tool_calls[0].function.arguments if tool_calls else (choice.message.content or "")
+        return SimpleNamespace(content=content.strip(), latency_ms=latency_ms,
+                               confidence=confidence, prompt_tokens=prompt_tokens,
+                               completion_tokens=completion_tokens,
+                               cost=call_cost(model, prompt_tokens, completion_tokens))
+
+    def _entry(self, task: str, model: str, tier: int, prompt: str, response, parse) -> dict:
+        return {"task": task, "model": model, "tier": tier, "prompt_hash": prompt_hash(prompt),
+                "prompt": prompt, "response": response.content, "latency_ms": response.latency_ms,
+                "prompt_tokens": response.prompt_tokens, "completion_tokens": response.completion_tokens,
+                "cost": response.cost, "confidence": response.confidence,
+                "parser": getattr(parse, "__name__", None), "call_error": None, "parse_error": None,
+                "repairs": None, "escalated": False}
+
+    def _error_entry(self, task: str, model: str, tier: int, prompt: str, parse, error, start: float) -> dict:
+        """Entry for a call that raised (API or transport error) instead of returning a response."""
+        failed = SimpleNamespace(content=None, latency_ms=(time.perf_counter() - start) * 1000, confidence=None,
+                                 prompt_tokens=0, completion_tokens=0, cost=0.0)
+        entry = self._entry(task, model, tier, prompt, failed, parse)
+        entry["call_error"] = f"{type(error).__name__}: {error}"
+        return entry
+
+    def complete(self, task: str, prompt: str, parse=None, max_tokens: int = 1000, tool: dict = None):
+        """
+        Answer `prompt` with the cheapest model in the task's chain that
+        produces a parseable, confident response. A call that raises (API
+        or transport error) escalates like an unparseable response.
+
+        Args:
+        - task (str): One of TASKS.
+        - prompt (str): The user prompt.
+        - parse: Optional callable turning the response text into a value;
+          raising means the tier failed and the next one is tried. A parser
+          with a `repairs` list (see plans.plan_parser) reports how much it
+          had to fix, which stands in for confidence on tool calls.
+        - tool (dict): Optional function-calling tool the model must call;
+          its arguments (JSON) are the response text.
+
+        Returns:
+        - The parsed value (or the response text without `parse`).
+        """
+        chain = self.policy.chain(task)
+        low_confidence = []
+        last_error = None
+        for tier, model in enumerate(chain):
+            final = tier == len(chain) - 1
+            start = time.perf_counter()
+            try:
+                response = self._call(model, prompt, max_tokens, tool,
+                                      logprobs=self.policy.uses_confidence(task, tier, tool))
+            except Exception as e:
+                entry = self._error_entry(task, model, tier, prompt, parse, e, start)
+                entry["escalated"] = not final
+                self.recorder.record(entry)
+                last_error = e
+                continue
+            entry = self._entry(task, model, tier, prompt, response, parse)
+            try:
+                value = parse(response.content) if parse is not None else response.content
+            except Exception as e:
+                entry.update(parse_error=f"{type(e).__name__}: {e}", escalated=not final)
+                self.recorder.record(entry)
+                last_error = e
+                continue
+
+            repairs = getattr(parse, "repairs", None)
+            if repairs is not None:
+                entry["repairs"] = len(repairs)
+            if not final and self.policy.weak(response, repairs):
+                entry["escalated"] = True
+                self.recorder.record(entry)
+                low_confidence.append((model, value))
+                continue
+
+            self.recorder.record(entry)
+            # Escalations double as accuracy samples for the cheaper tiers
+            for cheap_model, cheap_value in low_confidence:
+                self._compare(task, cheap_model, model, cheap_value, value)
+            if not final and self.policy.shadow_rate and random.random() < self.policy.shadow_rate:
+                self._shadow_check(task, prompt, parse, max_tokens, model, value, tool)
+            return value
+        raise ValueError(f"No model in {', '.join(chain)} produced a valid {task} response: {last_error}")
+
+    def _compare(self, task: str, model: str, reference: str, value, reference_value):
+        self.recorder.record({"kind": "comparison", "task": task, "model": model, "reference": reference,
+                              "agree": same_answer(value, reference_value)})
+
+    def _shadow_check(self, task: str, prompt: str, parse, max_tokens: int, model: str, value, tool: dict = None):
+        reference = self.policy.chain(task)[-1]
+
+        def check():
+            tier = len(self.policy.chain(task)) - 1
+            start = time.perf_counter()
+            try:
+                response = self._call(reference, prompt, max_tokens, tool)
+            except Exception as e:
+                entry = self._error_entry(task, reference, tier, prompt, parse, e, start)
+                entry["shadow"] = True
+                self.recorder.record(entry)
+                return
+            entry = self._entry(task, reference, tier, prompt, response, parse)
+            entry["shadow"] = True
+            try:
+                reference_value = parse(response.content) if parse is not None else response.content
+            except Exception as e:
+                entry["parse_error"] = f"{type(e).__name__}: {e}"
+                self.recorder.record(entry)
+                return
+            self.recorder.record(entry)
+            self._compare(task, model, reference, value, reference_value)
+
+        if self._shadow is None:
+            self._shadow = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-shadow")
+        self._shadow.submit(check)
+
+
+class FakeModel:
+    """
+    OpenAI-compatible client that replays recorded calls, keyed by model
+    and prompt, so routing policies can be tuned offline on real traffic.
+
+    Set LLM_FAKE_RECORDINGS=calls.jsonl to run the operators against it.
+    """
+
+    def __init__(self, records: list, latency_scale: float = 0.0):
+        self.responses = {}
+        for record in records:
+            if record.get("kind") != "comparison" and record.get("response") is not None:
+                self.responses[(record["model"], record["prompt_hash"])] = record
+        self.latency_scale = latency_scale
+        self.chat = SimpleNamespace(completions=self)
+
+    @classmethod
+    def from_jsonl(cls, path: str, latency_scale: float = 0.0) -> "FakeModel":
+        return cls(load_records(path), latency_scale)
+
+    def models(self) -> set:
+        return {model for model, _ in self.responses}
+
+    def create(self, messages, model: str, max_tokens: int = None, logprobs: bool = False, **kwargs):
+        key = (model, prompt_hash(messages[-1]["content"]))
+        record = self.responses.get(key)
+        if record is None:
+            raise LookupError(f"No recorded {model} response for prompt {key[1]}")
+        if self.latency_scale:
+            time.sleep(record["latency_ms"] * self.latency_scale / 1000)
+        confidence = record.get("confidence")
+        token_logprobs = None
+        if confidence and logprobs:
+            token_logprobs = SimpleNamespace(content=[SimpleNamespace(logprob=math.log(confidence))])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=record["response"]), logprobs=token_logprobs)],
+            usage=SimpleNamespace(prompt_tokens=record.get("prompt_tokens", 0),
+                                  completion_tokens=record.get("completion_tokens", 0)),
+            recorded_latency_ms=record.get("latency_ms"),
+        )
+
+
+def evaluate_policy(records: list, policy: TierPolicy) -> dict:
+    """
+    Replay every recorded prompt under `policy` against a FakeModel and
+    score it: total cost and latency, escalation rate, and accuracy against
+    the answer the last model in the chain gave when it was recorded.
+    Prompts without a recorded answer from a model the policy needs are
+    skipped. Logprobs are only recorded where they were requested, so a
+    model that was the last tier when recorded has no confidence to
+    escalate on.
+    """
+    fake = FakeModel(records)
+    prompts = {}
+    for record in records:
+        if record.get("kind") != "comparison" and "prompt" in record:
+            prompts.setdefault((record["task"], record["prompt_hash"]), record)
+
+    totals = {"prompts": 0, "skipped": 0, "cost": 0.0, "latency_ms": 0.0, "escalated": 0,
+              "scored": 0, "correct": 0}
+    for (task, digest), record in prompts.items():
+        chain = policy.chain(task)
+        parse = PARSERS.get(record.get("parser"))
+        if parse is parse_plan:
+            # Count repairs, so plans escalate as they did live
+            parse = plan_parser(None, [])
+        recorder = LLMCallRecorder()
+        gateway = LLMGateway(fake, TierPolicy({task: chain}, policy.min_confidence,
+                                              max_repairs=policy.max_repairs), recorder)
+        try:
+            value = gateway.complete(task, record["prompt"], parse)
+        except ValueError:
+            totals["skipped"] += 1
+            continue
+        # A missing recording shows up as a call error; that prompt cannot be replayed faithfully
+        if any(tier["call_errors"] for tier in recorder.stats.values()):
+            totals["skipped"] += 1
+            continue
+        totals["prompts"] += 1
+        for tier in recorder.stats.values():
+            totals["cost"] += tier["cost"]
+            totals["latency_ms"] += tier["latency_ms"]
+            totals["escalated"] += tier["escalations"]
+
+        reference = fake.responses.get((chain[-1], digest))
+        if reference is not None:
+            try:
+                reference_value = parse(reference["response"]) if parse is not None else reference["response"]
+            except ValueError:
+                continue
+            totals["scored"] += 1
+            totals["correct"] += int(same_answer(value, reference_value))
+    totals["accuracy"] = totals["correct"] / totals["scored"] if totals["scored"] else None
+    totals["mean_latency_ms"] = totals["latency_ms"] / totals["prompts"] if totals["prompts"] else None
+    return totals
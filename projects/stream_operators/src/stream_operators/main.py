@@ -1,15 +1,35 @@
 #!/Users/fredpatton/.pyenv/shims/python
 
 import json
+import math
 import os
-import re
+import threading
 import time
+import urllib.error
+import urllib.request
 
 import typer
 from dotenv import load_dotenv
 from openai import OpenAI
 from swimos import SwimClient
 
+from cache import ResultCache, config_hash
+from codegen import DEFAULT_CANDIDATES, DEFAULT_CONCURRENCY, OPERATOR_TOOL, generate_first_valid
+from downlinks import DownlinkPool, open_status_downlink
+from join import AsOfJoin, joined_field_names, parse_expression, parse_join_input
+from last_values import DEFAULT_IDLE_TIMEOUT, LastValueCache
+from live_config import LOCAL_OPERATOR_ID, ControlListener, LiveConfig, attach, description_changed
+from llm_gateway import FakeModel, LLMCallRecorder, LLMGateway, TierPolicy, parse_json_result
+from operator_server import OperatorServer, serve_control_api
+from operators import SpaceSaving
+from patterns import DEFAULT_MAX_PARTIALS, PatternError, compile_pattern, pattern_prompt
+from plans import PLAN_TOOL, RoutingStats, candidate_symbols, operation_config_for, plan_parser
+from registry import resolve_operator
+from predicates import PredicateError, compile_expression, compile_predicate, predicate_prompt, referenced_params
+from sinks import SINK_HELP, make_sink
+from state_store import KERNELS, ColumnarStateStore, TickBatcher, kernel_for
+from ticks import decode_tick
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -17,97 +37,238 @@ app = typer.Typer()
 host_uri = "wss://stocks-simulated.nstream-demo.io"
 current_exchange_rate = 1.2
 current_alert_threshold = 50.0
-synced = False
+
+DEFAULT_CACHE_SIZE = 4096
+CACHE_SIZE_HELP = "Max cached LLM results for repeated prices (0 disables the cache)"
+TICK_SIZE_HELP = "Quantize prices to this tick size before cache lookup (0 for exact prices)"
+PREDICATE_HELP = "Ask the LLM once for a structured predicate and evaluate it locally per tick"
+PROFILE_HELP = "Microbenchmark generated code and regenerate it if it exceeds the performance budget"
+CODEGEN_ATTEMPTS = 3
+CANDIDATES_HELP = (f"Operator candidates to generate, {DEFAULT_CONCURRENCY} at a time; the first that validates "
+                   f"is adopted and queued ones are cancelled")
+SPECULATIVE_HELP = "Open downlinks for symbols named in the command while the LLM plans"
+MAX_PARTIALS_HELP = "Max concurrent partial matches per symbol; the oldest are dropped beyond it"
+# Local port on which standalone operators accept `reconfigure` (0 disables it)
+OPERATOR_CONTROL_PORT = int(os.environ.get("OPERATOR_CONTROL_PORT", 0))
+
+# Predicate and pattern specs extracted by the LLM, keyed by operation_config hash
+predicate_specs = {}
+pattern_specs = {}
+
+# Downlinks `execute` opens speculatively; None outside `execute`
+downlink_pool = None
 
 # Initialize OpenAI client
 llm_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Per-task model tiers (LLM_<TASK>_MODELS); LLM_FAKE_RECORDINGS replays a call log offline
+llm_gateway = LLMGateway(
+    FakeModel.from_jsonl(os.environ["LLM_FAKE_RECORDINGS"]) if os.environ.get("LLM_FAKE_RECORDINGS") else llm_client,
+    TierPolicy.from_env(),
+    LLMCallRecorder(os.environ.get("LLM_CALL_LOG")))
+routing_stats = RoutingStats()
 swim_client = SwimClient(debug=True)
 swim_client.start()
+# Subscribed status lanes shared by ad-hoc and batch reads
+last_value_cache = LastValueCache(swim_client, host_uri,
+                                  idle_timeout=float(os.environ.get("LAST_VALUE_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)))
 
 
-def print_did_sync():
-    global synced
-    synced = True
+def setup_value_downlink(node_uri: str, callback=None):
+    if downlink_pool is not None:
+        # Inside `execute`: reuse a downlink opened speculatively during planning
+        value_downlink = downlink_pool.acquire(node_uri, callback)
+        downlink_pool.discard_unused()
+        return value_downlink
+    return open_status_downlink(swim_client, host_uri, node_uri, callback)
 
 
-def setup_value_downlink(node_uri: str, callback=None):
-    global swim_client
-    global synced
-    value_downlink = swim_client.downlink_value()
-    value_downlink.set_host_uri(host_uri)
-    value_downlink.set_node_uri(node_uri)
-    value_downlink.set_lane_uri("status")
-    if callback is not None:
-        value_downlink.did_set(callback)
-    value_downlink.did_sync(print_did_sync)
-    value_downlink.open()
-    while not synced:
-        time.sleep(1)
-    return value_downlink
+def open_stream_downlinks(inputs, callback_for) -> list:
+    """
+    Open one downlink per (name, node_uri, lane_uri) input without waiting
+    for them to sync; inside `execute`, speculative downlinks are reused
+    and the unused ones closed.
+    """
+    value_downlinks = []
+    for name, node_uri, lane_uri in inputs:
+        if downlink_pool is not None:
+            value_downlinks.append(downlink_pool.acquire(node_uri, callback_for(name), lane_uri,
+                                                         wait_for_sync=False))
+        else:
+            value_downlinks.append(open_status_downlink(swim_client, host_uri, node_uri, callback_for(name),
+                                                        lane_uri=lane_uri, wait_for_sync=False))
+    if downlink_pool is not None:
+        downlink_pool.discard_unused()
+    return value_downlinks
+
+
+def make_result_cache(cache_size: int, tick_size: float):
+    return ResultCache(cache_size, tick_size) if cache_size > 0 else None
+
+
+def parse_operation_config(operation_config: str):
+    try:
+        return json.loads(operation_config)
+    except json.JSONDecodeError:
+        print("Invalid operation_config. Please provide a valid JSON string.")
+        return None
+
+
+def stream_until_interrupted(node_uri: str, callback, sink):
+    control_listener = None
+    if OPERATOR_CONTROL_PORT and hasattr(callback, "reconfigure"):
+        control_listener = ControlListener(callback, port=OPERATOR_CONTROL_PORT)
+        print(f"Reconfigure while streaming with: main.py reconfigure {LOCAL_OPERATOR_ID} "
+              f"'<operation_config changes>' --port {control_listener.port}")
+    print('Streaming data, press Ctrl+C to stop')
+    value_downlink = setup_value_downlink(node_uri, callback)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        value_downlink.close()
+        sink.close()
+        print('Streaming stopped')
+    finally:
+        if control_listener is not None:
+            control_listener.close()
+    result_cache = getattr(callback, "result_cache", None)
+    if result_cache is not None:
+        print(result_cache.format_stats())
+    matcher = getattr(callback, "matcher", None)
+    if matcher is not None:
+        print(f"Pattern: {json.dumps(matcher.stats())}")
+    if llm_gateway.recorder.stats:
+        print(llm_gateway.recorder.format_summary())
 
 
 @app.command()
 def read_adhoc(symbol: str):
     """Read stock prices for a given symbol (ad-hoc)"""
-    node_uri = f"/stock/{symbol}"
-    value_downlink = setup_value_downlink(node_uri)
-    result = value_downlink.get(symbol)
-    print(f"Ad-hoc read result for {symbol} is: {result['price']}\n")
-    value_downlink.close()
+    if downlink_pool is not None:
+        # Inside `execute`: the downlink opened speculatively becomes the cache's
+        subscription = downlink_pool.release(f"/stock/{symbol}")
+        if subscription is not None and not last_value_cache.adopt(symbol, subscription):
+            subscription.downlink.close()
+    record = last_value_cache.read(symbol)
+    if record is None:
+        print(f"No status for {symbol} within {last_value_cache.sync_timeout:.0f} s\n")
+        raise typer.Abort()
+    tick = decode_tick(record)
+    print(f"Ad-hoc read result for {symbol} is: {tick.price}\n")
     raise typer.Abort()
 
 
-def streaming_read_callback(new_value: dict, _old_value: dict):
-    print(f"Streaming read result is: {new_value['price']}\n")
+@app.command()
+def read_batch(
+        symbols: str,
+        repeat: int = typer.Option(1, help="Read the batch this many times (later reads are served from memory)")):
+    """Read the current status of many symbols at once (comma-separated symbols)"""
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        records = last_value_cache.read_many(symbol_list)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        if attempt == 0:
+            for symbol, record in records.items():
+                tick = decode_tick(record)
+                print(f"{symbol}: price {tick.price}, volume {tick.volume}, timestamp {tick.timestamp}")
+        print(f"Read {len(symbol_list)} symbols in {elapsed_us:.0f} us "
+              f"({elapsed_us / max(len(symbol_list), 1):.1f} us per symbol)")
+    print(last_value_cache.format_stats())
+
+
+def build_read_streaming(symbol: str, sink):
+    def streaming_read_callback(new_value: dict, _old_value: dict):
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        sink.write({
+            "symbol": symbol,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+            "message": f"Streaming read result is: {tick.price}"
+        })
+
+    return streaming_read_callback
 
 
 @app.command()
-def read_streaming(symbol: str):
+def read_streaming(symbol: str, sink: str = typer.Option("console", help=SINK_HELP)):
     """Read stock prices for a given symbol (streaming)"""
+    result_sink = make_sink(sink, swim_client, host_uri)
     node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, build_read_streaming(symbol, result_sink), result_sink)
+
+
+def build_top_movers(sink, capacity: int = 100, top: int = 5):
+    """
+    Track the heaviest symbols by traded volume in one shared Space-Saving
+    summary; returns a factory for the per-symbol downlink callbacks.
+
+    The status lane reports cumulative volume, so each tick adds its
+    difference from the symbol's previous volume; the first tick of a
+    symbol only sets the baseline, and a drop (a session reset) restarts it.
+    """
+    heavy_hitters = SpaceSaving(capacity)
+    last_volumes = {}
+    lock = threading.Lock()
+
+    def callback_for(symbol: str):
+        def top_movers_callback(new_value: dict, _old_value: dict):
+            tick = decode_tick(new_value)
+            if math.isnan(tick.volume):
+                return
+            with lock:
+                previous = last_volumes.get(symbol)
+                last_volumes[symbol] = tick.volume
+                if previous is None:
+                    return
+                traded = tick.volume - previous if tick.volume >= previous else tick.volume
+                if traded > 0:
+                    heavy_hitters.update(symbol, traded)
+                leaders = heavy_hitters.top(top)
+            sink.write({
+                "symbol": symbol,
+                "timestamp": tick.timestamp,
+                "price": tick.price,
+                "result": [[key, count] for key, count, _ in leaders],
+                "message": "Top movers by volume: " + ", ".join(f"{key} {count:.0f}" for key, count, _ in leaders)
+            })
+        return top_movers_callback
+
+    callback_for.heavy_hitters = heavy_hitters
+    return callback_for
+
+
+@app.command()
+def top_movers(
+        symbols: str,
+        top: int = typer.Option(5, help="Number of symbols to report"),
+        capacity: int = typer.Option(100, help="Space-Saving counters; counts overestimate by at most total volume / capacity"),
+        sink: str = typer.Option("console", help=SINK_HELP)):
+    """Report the symbols with the most traded volume (comma-separated symbols)"""
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback_for = build_top_movers(result_sink, capacity, top)
     print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, streaming_read_callback)
+    value_downlinks = open_stream_downlinks(
+        [(symbol, f"/stock/{symbol}", "status") for symbol in (s.strip() for s in symbols.split(",")) if symbol],
+        callback_for)
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        value_downlink.close()
+        for value_downlink in value_downlinks:
+            value_downlink.close()
+        result_sink.close()
         print('Streaming stopped')
 
 
-def generate_llm_code(prompt: str, expect_json: bool = False, max_retries: int = 3, retry_delay: int = 1):
+def generate_llm_code(prompt: str, expect_json: bool = False, max_retries: int = 3, retry_delay: int = 1,
+                      task: str = "codegen", tool: dict = None):
     retries = 0
     while retries < max_retries:
         try:
-            response = llm_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="gpt-4",
-                max_tokens=1000
-            )
-            response_content = response.choices[0].message.content.strip()
-
-            if expect_json:
-                # Use regex to extract JSON object with non-greedy match
-                json_match = re.search(
-                    r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}',
-                    response_content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    try:
-                        result = json.loads(json_str)
-                        return result['result'] if 'result' in result else result
-                    except (json.JSONDecodeError, KeyError) as e:
-                        raise ValueError("Failed to decode JSON from LLM response") from e
-                else:
-                    raise ValueError("No valid JSON found in LLM response")
-            else:
-                return response_content
-
+            return llm_gateway.complete(task, prompt, parse_json_result if expect_json else None, tool=tool)
         except Exception as e:
             retries += 1
             print(f"Error: {e}, retrying... ({retries}/{max_retries})")
@@ -116,128 +277,376 @@ def generate_llm_code(prompt: str, expect_json: bool = False, max_retries: int =
     raise ValueError("Max retries exceeded, failed to get valid response from LLM")
 
 
-@app.command()
-def map_direct(symbol: str, operation_config: str):
-    """Map stock prices to a different unit using LLM (direct invocation)"""
-    global current_operation_config
-
-    # Parse the operation_config JSON string
-    try:
-        current_operation_config = json.loads(operation_config)
-    except json.JSONDecodeError:
-        print("Invalid operation_config. Please provide a valid JSON string.")
+def reuse_spec(specs: dict, operation_config: dict, previous_config: dict = None):
+    """
+    Store the spec of `previous_config` under `operation_config` in `specs`
+    when it has the same description and refers to every changed parameter
+    by name, so a parameter change needs no LLM call.
+    """
+    key = config_hash(operation_config)
+    previous_spec = specs.get(config_hash(previous_config)) if previous_config is not None else None
+    if key in specs or previous_spec is None \
+            or previous_config.get("description") != operation_config.get("description"):
         return
+    parameters = operation_config.get("parameters", {})
+    previous_parameters = previous_config.get("parameters", {})
+    changed = {name for name in {**previous_parameters, **parameters}
+               if previous_parameters.get(name) != parameters.get(name)}
+    if changed <= referenced_params(previous_spec):
+        specs[key] = previous_spec
 
-    node_uri = f"/stock/{symbol}"
-
-    def map_direct_callback(new_value: dict, _old_value: dict):
-        print(new_value)
-        # Extract operation and parameters from operation_config
-        operation_details = current_operation_config
 
+def extract_predicate(operation_config: dict, max_attempts: int = 3, previous_config: dict = None):
+    """
+    Translate an operation_config into a compiled predicate, asking the LLM
+    only when this config has not been seen before (see reuse_spec).
+    """
+    key = config_hash(operation_config)
+    parameters = operation_config.get("parameters", {})
+    reuse_spec(predicate_specs, operation_config, previous_config)
+    if key in predicate_specs:
+        return compile_predicate(predicate_specs[key], parameters)
+
+    description = operation_config.get("description", "Perform a custom filter operation")
+    prompt = predicate_prompt(description, parameters)
+    for attempt in range(1, max_attempts + 1):
+        spec = generate_llm_code(prompt, expect_json=True)
+        try:
+            predicate = compile_predicate(spec, parameters)
+        except PredicateError as e:
+            print(f"Error: invalid predicate {spec}: {e} ({attempt}/{max_attempts})")
+            continue
+        predicate_specs[key] = spec
+        print(f"Predicate for '{description}': {json.dumps(spec)}")
+        return predicate
+    raise ValueError("Failed to extract a valid predicate from LLM")
+
+
+def extract_pattern(operation_config: dict, max_partials: int = DEFAULT_MAX_PARTIALS, max_attempts: int = 3,
+                    previous_config: dict = None):
+    """
+    Translate an operation_config into a compiled event pattern with one LLM
+    call, asking only when this config has not been seen before (see
+    reuse_spec).
+    """
+    key = config_hash(operation_config)
+    parameters = operation_config.get("parameters", {})
+    reuse_spec(pattern_specs, operation_config, previous_config)
+    if key in pattern_specs:
+        return compile_pattern(pattern_specs[key], parameters, max_partials)
+
+    description = operation_config.get("description", "Detect a sequence of price moves")
+    prompt = pattern_prompt(description, parameters)
+    for attempt in range(1, max_attempts + 1):
+        spec = generate_llm_code(prompt, expect_json=True)
+        try:
+            pattern = compile_pattern(spec, parameters, max_partials)
+        except PatternError as e:
+            print(f"Error: invalid pattern {spec}: {e} ({attempt}/{max_attempts})")
+            continue
+        pattern_specs[key] = spec
+        print(f"Pattern for '{description}': {json.dumps(spec)}")
+        return pattern
+    raise ValueError("Failed to extract a valid pattern from LLM")
+
+
+def build_map_direct(symbol: str, operation_config: dict, sink, cache_size: int = DEFAULT_CACHE_SIZE,
+                     tick_size: float = 0.0):
+    result_cache = make_result_cache(cache_size, tick_size)
+    # Cached results are keyed by the live config, so a reconfigured operator never reuses stale ones
+    live = LiveConfig(operation_config, lambda config, previous: config_hash(config))
+
+    def evaluate(price: float, operation_config: dict):
         # Form the prompt dynamically based on operation details
-        operation_description = current_operation_config.get(
+        operation_description = operation_config.get(
             "description",
             "Perform a custom operation")
-        parameters = json.dumps(current_operation_config.get("parameters", {}))
+        parameters = json.dumps(operation_config.get("parameters", {}))
 
         prompt = f"""
         {operation_description}
-        The current stock price is {new_value['price']}.
+        The current stock price is {price}.
         The parameters for this operation are: {parameters}.
         Please perform the operation and return a JSON object with `result` as 
         the only key and storing the result of the operation.
         All other keys will be ignored. Please only provide JSON.
         """
 
-        result = generate_llm_code(prompt, expect_json=True)
-        print(f"Mapped {new_value['price']} to {result}.\n")
+        return generate_llm_code(prompt, expect_json=True, task="direct")
 
-    print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, map_direct_callback)
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        value_downlink.close()
-        print('Streaming stopped')
+    def map_direct_callback(new_value: dict, _old_value: dict):
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        operation_config, config_key = live.current
+        if result_cache is not None:
+            result = result_cache.get_or_compute(config_key, tick.price,
+                                                 lambda: evaluate(tick.price, operation_config))
+        else:
+            result = evaluate(tick.price, operation_config)
+        sink.write({
+            "symbol": symbol,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+            "result": result,
+            "message": f"Mapped {tick.price} to {result}."
+        })
+
+    map_direct_callback.result_cache = result_cache
+    return attach(map_direct_callback, live)
+
+
+def generate_profiled_function(prompt: str, kind: str, params: dict, profile: bool = True,
+                               fix_throw: bool = False, candidates: int = DEFAULT_CANDIDATES):
+    """
+    Generate up to `candidates` operator functions concurrently and adopt the first
+    that loads, satisfies the operator invariants on sample ticks and (with
+    `profile`) stays within the performance budget. Rejection reasons are
+    fed back into the prompt for up to CODEGEN_ATTEMPTS rounds.
 
+    Returns:
+    - tuple: The function and its ProfileReport (None when not profiled).
+    """
+    return generate_first_valid(
+        prompt, kind, params,
+        lambda attempt_prompt: generate_llm_code(attempt_prompt, expect_json=True, tool=OPERATOR_TOOL),
+        candidates=candidates, rounds=CODEGEN_ATTEMPTS, profile=profile, fix_throw=fix_throw)
 
-@app.command()
-def filter_direct(symbol: str, operation_config: str):
-    """Filter stock prices based on a condition using LLM (direct invocation)"""
-    global current_operation_config
 
-    # Parse the operation_config JSON string
-    try:
-        current_operation_config = json.loads(operation_config)
-    except json.JSONDecodeError:
-        print("Invalid operation_config. Please provide a valid JSON string.")
+@app.command()
+def map_direct(
+        symbol: str,
+        operation_config: str,
+        sink: str = typer.Option("console", help=SINK_HELP),
+        cache_size: int = typer.Option(DEFAULT_CACHE_SIZE, help=CACHE_SIZE_HELP),
+        tick_size: float = typer.Option(0.0, help=TICK_SIZE_HELP)):
+    """Map stock prices to a different unit using LLM (direct invocation)"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
         return
 
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_map_direct(symbol, current_operation_config, result_sink, cache_size, tick_size)
     node_uri = f"/stock/{symbol}"
-
-    def filter_direct_callback(new_value: dict, _old_value: dict):
-        print(new_value)
-        # Extract operation and parameters from operation_config
-        operation_details = current_operation_config
-
+    stream_until_interrupted(node_uri, callback, result_sink)
+
+
+def build_filter_direct(symbol: str, operation_config: dict, sink, cache_size: int = DEFAULT_CACHE_SIZE,
+                        tick_size: float = 0.0, predicate: bool = False):
+    if predicate:
+        live = LiveConfig(operation_config, lambda config, previous: extract_predicate(
+            config, previous_config=previous[0] if previous is not None else None))
+
+        def filter_predicate_callback(new_value: dict, _old_value: dict):
+            tick = decode_tick(new_value)
+            if math.isnan(tick.price):
+                return
+            if live.current[1](tick):
+                sink.write({
+                    "symbol": symbol,
+                    "timestamp": tick.timestamp,
+                    "price": tick.price,
+                    "result": True,
+                    "message": f"Price {tick.price} meets the filter criteria."
+                })
+
+        return attach(filter_predicate_callback, live)
+
+    result_cache = make_result_cache(cache_size, tick_size)
+    live = LiveConfig(operation_config, lambda config, previous: config_hash(config))
+
+    def evaluate(price: float, operation_config: dict):
         # Form the prompt dynamically based on operation details
-        operation_description = current_operation_config.get(
+        operation_description = operation_config.get(
             "description",
             "Perform a custom filter operation")
-        parameters = json.dumps(current_operation_config.get("parameters", {}))
+        parameters = json.dumps(operation_config.get("parameters", {}))
 
         prompt = f"""
         {operation_description}
-        The current stock price is {new_value['price']}.
+        The current stock price is {price}.
         The parameters for this operation are: {parameters}.
         Perform the operation and return a JSON object with `result` as the only
         top-level key. It's value the string 'true' or 'false' based on the result of filtering.
         All other keys will be ignored. Please only provide JSON.
         """
 
-        result = generate_llm_code(prompt, expect_json=True)
+        return generate_llm_code(prompt, expect_json=True, task="direct")
+
+    def filter_direct_callback(new_value: dict, _old_value: dict):
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        operation_config, config_key = live.current
+        if result_cache is not None:
+            result = result_cache.get_or_compute(config_key, tick.price,
+                                                 lambda: evaluate(tick.price, operation_config))
+        else:
+            result = evaluate(tick.price, operation_config)
         if result.lower() == 'true':
-            print(f"Price {new_value['price']} meets the filter criteria.\n")
+            sink.write({
+                "symbol": symbol,
+                "timestamp": tick.timestamp,
+                "price": tick.price,
+                "result": True,
+                "message": f"Price {tick.price} meets the filter criteria."
+            })
 
-    print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, filter_direct_callback)
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        value_downlink.close()
-        print('Streaming stopped')
+    filter_direct_callback.result_cache = result_cache
+    return attach(filter_direct_callback, live)
 
 
 @app.command()
-def accumulate_direct(
+def filter_direct(
         symbol: str,
+        operation_config: str,
+        sink: str = typer.Option("console", help=SINK_HELP),
+        cache_size: int = typer.Option(DEFAULT_CACHE_SIZE, help=CACHE_SIZE_HELP),
+        tick_size: float = typer.Option(0.0, help=TICK_SIZE_HELP),
+        predicate: bool = typer.Option(False, help=PREDICATE_HELP)):
+    """Filter stock prices based on a condition using LLM (direct invocation)"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
+        return
+
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_filter_direct(symbol, current_operation_config, result_sink, cache_size, tick_size,
+                                   predicate)
+    node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, callback, result_sink)
+
+
+def build_accumulate_native(symbol: str, streaming_operator: str, operation_config: dict, sink):
+    native_operator = resolve_operator(streaming_operator)
+    if native_operator is None:
+        raise ValueError(f"No native operator for '{streaming_operator}'")
+
+    def bind(config: dict, previous):
+        params = native_operator.bind(config)
+        print(f"Using native {native_operator.name} operator for '{streaming_operator}' with {params}")
+        # The accumulator survives reconfiguration unless its shape depends on what changed
+        epoch = 0
+        if previous is not None:
+            epoch = previous[1][1] + (not native_operator.keeps_state(previous[1][0], params))
+        return params, epoch
+
+    live = LiveConfig(operation_config, bind)
+    acc, acc_epoch = None, 0
+
+    def accumulate_native_callback(new_value: dict, _old_value: dict):
+        nonlocal acc, acc_epoch
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        params, epoch = live.current[1]
+        if epoch != acc_epoch:
+            acc, acc_epoch = None, epoch
+        acc, summary = native_operator.step(acc, tick.price, params)
+        sink.write({
+            "symbol": symbol,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+            "result": summary,
+            "message": f"{symbol} -- {native_operator.name}: {summary}"
+        })
+
+    return attach(accumulate_native_callback, live)
+
+
+def build_accumulate_many(streaming_operator: str, operation_config: dict, sink, max_symbols: int = None,
+                          spill_path: str = None):
+    """
+    Run one native accumulator per symbol over a shared columnar state
+    store; returns a factory for the per-symbol downlink callbacks. Ticks
+    are batched (`callback_for.batcher`) so the store updates vectorized.
+    """
+    kernel = kernel_for(streaming_operator, operation_config)
+    if kernel is None:
+        raise ValueError(f"No columnar operator for '{streaming_operator}'. Expected one of: {', '.join(KERNELS)}")
+    store = ColumnarStateStore(kernel, max_symbols=max_symbols, spill_path=spill_path)
+
+    def write_results(ticks: list, results):
+        for (symbol, tick), result in zip(ticks, results.tolist()):
+            summary = None if math.isnan(result) else result
+            sink.write({
+                "symbol": symbol,
+                "timestamp": tick.timestamp,
+                "price": tick.price,
+                "result": summary,
+                "message": f"{symbol} -- {kernel.name}: {summary}"
+            })
+
+    batcher = TickBatcher(store, write_results)
+
+    def callback_for(symbol: str):
+        def accumulate_many_callback(new_value: dict, _old_value: dict):
+            tick = decode_tick(new_value)
+            if math.isnan(tick.price):
+                return
+            batcher.add(symbol, tick.price, (symbol, tick))
+        return accumulate_many_callback
+
+    callback_for.store = store
+    callback_for.batcher = batcher
+    return callback_for
+
+
+@app.command()
+def accumulate_many(
+        symbols: str,
         streaming_operator: str,
         operation_config: str = typer.Option(
             "{}",
-            help="JSON string with parameters for the operation")):
-    """Accumulate stock prices (like min/max/avg) using LLM (direct invocation)"""
-    global acc
-    acc = {}
+            help="JSON string with parameters for the operation"),
+        max_symbols: int = typer.Option(None, help="Keep at most this many symbols in memory, evicting the idle ones"),
+        spill_path: str = typer.Option(None, help="Directory to spill evicted symbols' state to (memory-mapped)"),
+        sink: str = typer.Option("console", help=SINK_HELP)):
+    """Accumulate stock prices natively for many symbols at once (comma-separated symbols)"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
+        return
 
-    # Parse the operation_config JSON string
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback_for = build_accumulate_many(streaming_operator, current_operation_config, result_sink,
+                                         max_symbols, spill_path)
+    print('Streaming data, press Ctrl+C to stop')
+    value_downlinks = open_stream_downlinks(
+        [(symbol, f"/stock/{symbol}", "status") for symbol in (s.strip() for s in symbols.split(",")) if symbol],
+        callback_for)
     try:
-        current_operation_config = json.loads(operation_config)
-    except json.JSONDecodeError:
-        print("Invalid operation_config. Please provide a valid JSON string.")
-        return
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for value_downlink in value_downlinks:
+            value_downlink.close()
+        callback_for.batcher.close()
+        callback_for.store.flush()
+        result_sink.close()
+        print('Streaming stopped')
+    stats = callback_for.store.stats()
+    print(f"State store: {stats['symbols']} symbols, {stats['bytes']} bytes, "
+          f"{stats['evictions']} evicted, {stats['restores']} restored")
+
+
+def build_accumulate_direct(symbol: str, streaming_operator: str, operation_config: dict, sink):
+    # Known aggregations run natively instead of asking the LLM on every tick
+    if resolve_operator(streaming_operator) is not None:
+        return build_accumulate_native(symbol, streaming_operator, operation_config, sink)
+
+    live = LiveConfig(operation_config, lambda config, previous: json.dumps(config))
+    acc = {}
 
     def accumulate_direct_callback(new_value: dict, _old_value: dict):
-        global acc
-        print(new_value)
+        nonlocal acc
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
 
-        parameters = json.dumps(current_operation_config)
+        parameters = live.current[1]
 
         prompt = f"""
         Perform the {streaming_operator} accumulation operation.
-        The current stock price is {new_value['price']}.
+        The current stock price is {tick.price}.
         The current accumulator state is {acc}.
         The parameters for this operation are: {parameters}.
         If the accumulator is empty, initialize it appropriately for the 
@@ -246,142 +655,170 @@ def accumulate_direct(
         'summary` for the result of the operation and `acc` for the updated 
         accumulator. All other keys will be ignored. Please only provide JSON.
         """
-        response = generate_llm_code(prompt, expect_json=True)
+        response = generate_llm_code(prompt, expect_json=True, task="direct")
 
         acc = response['acc']
         summary = response['summary']
-        print(f"Result for {symbol}: summary: {summary}; acc: {acc}.\n")
+        sink.write({
+            "symbol": symbol,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+            "result": summary,
+            "message": f"Result for {symbol}: summary: {summary}; acc: {acc}."
+        })
 
-    node_uri = f"/stock/{symbol}"
-    print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, accumulate_direct_callback)
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        value_downlink.close()
-        print('Streaming stopped')
+    return attach(accumulate_direct_callback, live)
 
 
 @app.command()
-def map_generate(symbol: str, operation_config: str):
-    """Generate a function to map stock prices to a different unit using LLM"""
-    global current_operation_config
-
-    # Parse the operation_config JSON string
-    try:
-        current_operation_config = json.loads(operation_config)
-    except json.JSONDecodeError:
-        print("Invalid operation_config. Please provide a valid JSON string.")
+def accumulate_direct(
+        symbol: str,
+        streaming_operator: str,
+        operation_config: str = typer.Option(
+            "{}",
+            help="JSON string with parameters for the operation"),
+        sink: str = typer.Option("console", help=SINK_HELP)):
+    """Accumulate stock prices (like min/max/avg) using LLM (direct invocation)"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
         return
 
-    description = current_operation_config.get("description", "Perform a mapping operation")
-    parameters = json.dumps(current_operation_config.get("parameters", {}))
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_accumulate_direct(symbol, streaming_operator, current_operation_config, result_sink)
+    node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, callback, result_sink)
 
-    prompt = f"""
-    Return a JSON result, and only a JSON result that has a single key: `result`. 
-    In this `result` key, store a string that contains a Python function with the 
-    following signature `def func(new_value: float, operation_config: dict):`. 
-    The implementation must apply the exchange rate provided in `operation_config` 
-    to the `new_value`. The parameters for this operation are: {parameters}.
-    Ensure the function is returned as a single line string.
-    """
-    function_code_str = generate_llm_code(prompt, expect_json=True)
 
-    # Evaluate the function code
-    function_code_str = function_code_str.replace("throw", "raise")  # Correct the syntax error
-    local_vars = {}
-    exec(function_code_str, {}, local_vars)
-    func_name = function_code_str.split('(')[0].split()[1]
-    func = local_vars[func_name]
+def build_map_generate(symbol: str, operation_config: dict, sink, profile: bool = True,
+                       candidates: int = DEFAULT_CANDIDATES):
+    def generate(operation_config: dict, previous):
+        # Parameters reach the function on every tick; only a new description needs new code
+        if not description_changed(previous, operation_config):
+            return previous[1]
+        description = operation_config.get("description", "Perform a mapping operation")
+        parameters = json.dumps(operation_config.get("parameters", {}))
 
-    def map_generate_callback(new_value: dict, _old_value: dict):
-        print(new_value)
-        result = func(new_value['price'], current_operation_config['parameters'])
-        print(f"The price {new_value['price']} has been converted to {result}.\n")
+        prompt = f"""
+        Return a JSON result, and only a JSON result that has a single key: `result`. 
+        In this `result` key, store a string that contains a Python function with the 
+        following signature `def func(new_value: float, operation_config: dict):`. 
+        The implementation must apply the exchange rate provided in `operation_config` 
+        to the `new_value`. The parameters for this operation are: {parameters}.
+        Ensure the function is returned as a single line string.
+        """
+        return generate_profiled_function(
+            prompt, "map", operation_config.get("parameters", {}), profile, fix_throw=True, candidates=candidates)
 
-    node_uri = f"/stock/{symbol}"
-    print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, map_generate_callback)
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        value_downlink.close()
-        print('Streaming stopped')
+    live = LiveConfig(operation_config, generate)
 
+    def map_generate_callback(new_value: dict, _old_value: dict):
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        operation_config, (func, _) = live.current
+        result = func(tick.price, operation_config.get('parameters', {}))
+        sink.write({
+            "symbol": symbol,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+            "result": result,
+            "message": f"The price {tick.price} has been converted to {result}."
+        })
+
+    map_generate_callback.profile_report = live.current[1][1]
+    return attach(map_generate_callback, live,
+                  lambda derived: setattr(map_generate_callback, "profile_report", derived[1]))
 
-@app.command()
-def filter_generate(symbol: str, operation_config: str):
-    """Generate a function to filter stock prices based on a condition using LLM"""
-    global current_operation_config
 
-    # Parse the operation_config JSON string
-    try:
-        current_operation_config = json.loads(operation_config)
-    except json.JSONDecodeError:
-        print("Invalid operation_config. Please provide a valid JSON string.")
+@app.command()
+def map_generate(
+        symbol: str,
+        operation_config: str,
+        sink: str = typer.Option("console", help=SINK_HELP),
+        profile: bool = typer.Option(True, help=PROFILE_HELP),
+        candidates: int = typer.Option(DEFAULT_CANDIDATES, help=CANDIDATES_HELP)):
+    """Generate a function to map stock prices to a different unit using LLM"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
         return
 
-    description = current_operation_config.get(
-        "description",
-        "Perform a filter operation")
-    parameters = json.dumps(current_operation_config.get("parameters", {}))
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_map_generate(symbol, current_operation_config, result_sink, profile, candidates)
+    node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, callback, result_sink)
 
-    prompt = f"""
-    Return a JSON result, and only a JSON result that has a single key: `result`. 
-    In this `result` key, store a string that contains a Python function with the 
-    following signature `def func(new_value: float, operation_config: dict):` and the 
-    implementation must be as follows: {description}. Use the parameters provided 
-    in `operation_config` to determine the filtering criteria. The function should 
-    return a string 'true' if the new_value meets the criteria, otherwise 'false'.
-    The parameters for this operation are: {parameters}.
-    Ensure the function is returned as a single line string.
-    """
-    function_code_str = generate_llm_code(prompt, expect_json=True)
 
-    # Evaluate the function code
-    local_vars = {}
-    exec(function_code_str, {}, local_vars)
-    func_name = function_code_str.split('(')[0].split()[1]
-    func = local_vars[func_name]
+def build_filter_generate(symbol: str, operation_config: dict, sink, profile: bool = True,
+                          candidates: int = DEFAULT_CANDIDATES):
+    def generate(operation_config: dict, previous):
+        # Parameters reach the function on every tick; only a new description needs new code
+        if not description_changed(previous, operation_config):
+            return previous[1]
+        description = operation_config.get(
+            "description",
+            "Perform a filter operation")
+        parameters = json.dumps(operation_config.get("parameters", {}))
+
+        prompt = f"""
+        Return a JSON result, and only a JSON result that has a single key: `result`. 
+        In this `result` key, store a string that contains a Python function with the 
+        following signature `def func(new_value: float, operation_config: dict):` and the 
+        implementation must be as follows: {description}. Use the parameters provided 
+        in `operation_config` to determine the filtering criteria. The function should 
+        return a string 'true' if the new_value meets the criteria, otherwise 'false'.
+        The parameters for this operation are: {parameters}.
+        Ensure the function is returned as a single line string.
+        """
+        return generate_profiled_function(
+            prompt, "filter", operation_config.get("parameters", {}), profile, candidates=candidates)
+
+    live = LiveConfig(operation_config, generate)
 
     def filter_generate_callback(new_value: dict, _old_value: dict):
-        print(new_value)
-        result = func(new_value['price'], current_operation_config['parameters'])
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        operation_config, (func, _) = live.current
+        result = func(tick.price, operation_config.get('parameters', {}))
         if result.lower() == 'true':
-            print(f"The price {new_value['price']} has met the filter criteria.\n")
+            sink.write({
+                "symbol": symbol,
+                "timestamp": tick.timestamp,
+                "price": tick.price,
+                "result": True,
+                "message": f"The price {tick.price} has met the filter criteria."
+            })
 
-    node_uri = f"/stock/{symbol}"
-    print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, filter_generate_callback)
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        value_downlink.close()
-        print('Streaming stopped')
+    filter_generate_callback.profile_report = live.current[1][1]
+    return attach(filter_generate_callback, live,
+                  lambda derived: setattr(filter_generate_callback, "profile_report", derived[1]))
 
 
 @app.command()
-def accumulate_generate(
+def filter_generate(
         symbol: str,
-        streaming_operator: str,
-        operation_config: str = typer.Option(
-            "{}",
-            help="JSON string with parameters for the operation")):
-    """Generate a function to accumulate stock prices (min/max/avg) using LLM"""
-    global acc
-    acc = {}
-
-    # Parse the operation_config JSON string
-    try:
-        current_operation_config = json.loads(operation_config)
-    except json.JSONDecodeError:
-        print("Invalid operation_config. Please provide a valid JSON string.")
+        operation_config: str,
+        sink: str = typer.Option("console", help=SINK_HELP),
+        profile: bool = typer.Option(True, help=PROFILE_HELP),
+        candidates: int = typer.Option(DEFAULT_CANDIDATES, help=CANDIDATES_HELP)):
+    """Generate a function to filter stock prices based on a condition using LLM"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
         return
 
-    parameters = json.dumps(current_operation_config)
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_filter_generate(symbol, current_operation_config, result_sink, profile, candidates)
+    node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, callback, result_sink)
+
+
+def build_accumulate_generate(symbol: str, streaming_operator: str, operation_config: dict, sink,
+                              profile: bool = True, candidates: int = DEFAULT_CANDIDATES):
+    # Known aggregations skip codegen entirely
+    if resolve_operator(streaming_operator) is not None:
+        return build_accumulate_native(symbol, streaming_operator, operation_config, sink)
+
+    parameters = json.dumps(operation_config)
 
     prompt = f"""
     Return a JSON result, and only a JSON result. The JSON must have a single 
@@ -394,97 +831,214 @@ def accumulate_generate(
     value arrives. Your function must return a tuple consisting of `acc` followed
     by the result of its calculation. The parameters for this operation are: {parameters}.
     """
-    function_code_str = generate_llm_code(prompt, expect_json=True)
-
-    # Evaluate the function code
-    local_vars = {}
-    exec(function_code_str, {}, local_vars)
-    func_name = function_code_str.split('(')[0].split()[1]
-    func = local_vars[func_name]
+    func, report = generate_profiled_function(prompt, "accumulate", operation_config, profile,
+                                              candidates=candidates)
+    # The code follows streaming_operator, so reconfiguring parameters keeps it and the accumulator
+    live = LiveConfig(operation_config)
+    acc = {}
 
     def accumulate_generate_callback(new_value: dict, _old_value: dict):
-        global acc
-        print(f"accumulate_generate_callback received for {symbol}: {new_value}.\n")
-        acc, summary = func(acc, new_value['price'], current_operation_config)
-        print(f"{symbol} -- summary: {summary}; acc: {acc}")
+        nonlocal acc
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        acc, summary = func(acc, tick.price, live.operation_config)
+        sink.write({
+            "symbol": symbol,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+            "result": summary,
+            "message": f"{symbol} -- summary: {summary}; acc: {acc}"
+        })
+
+    accumulate_generate_callback.profile_report = report
+    return attach(accumulate_generate_callback, live)
+
+
+@app.command()
+def accumulate_generate(
+        symbol: str,
+        streaming_operator: str,
+        operation_config: str = typer.Option(
+            "{}",
+            help="JSON string with parameters for the operation"),
+        sink: str = typer.Option("console", help=SINK_HELP),
+        profile: bool = typer.Option(True, help=PROFILE_HELP),
+        candidates: int = typer.Option(DEFAULT_CANDIDATES, help=CANDIDATES_HELP)):
+    """Generate a function to accumulate stock prices (min/max/avg) using LLM"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
+        return
 
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_accumulate_generate(symbol, streaming_operator, current_operation_config, result_sink,
+                                         profile, candidates)
     node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, callback, result_sink)
+
+
+def build_pattern_detect(symbol: str, operation_config: dict, sink, max_partials: int = DEFAULT_MAX_PARTIALS):
+    live = LiveConfig(operation_config, lambda config, previous: extract_pattern(
+        config, max_partials, previous_config=previous[0] if previous is not None else None))
+    matcher = live.current[1].matcher()
+
+    def pattern_detect_callback(new_value: dict, _old_value: dict):
+        pattern = live.current[1]
+        if matcher.pattern is not pattern:
+            # Partial matches carry over when only parameters changed
+            matcher.set_pattern(pattern)
+        tick = decode_tick(new_value)
+        if math.isnan(tick.price):
+            return
+        match = matcher.update(tick)
+        if match is not None:
+            sink.write({
+                "symbol": symbol,
+                "timestamp": tick.timestamp,
+                "price": tick.price,
+                "result": match,
+                "message": f"Pattern matched over {match['ticks']} ticks ending at {tick.price}."
+            })
+
+    pattern_detect_callback.matcher = matcher
+    return attach(pattern_detect_callback, live)
+
+
+@app.command()
+def pattern_detect(
+        symbol: str,
+        operation_config: str,
+        sink: str = typer.Option("console", help=SINK_HELP),
+        max_partials: int = typer.Option(DEFAULT_MAX_PARTIALS, help=MAX_PARTIALS_HELP)):
+    """Detect a sequence of price events (compiled once by the LLM into a pattern, matched locally)"""
+    current_operation_config = parse_operation_config(operation_config)
+    if current_operation_config is None:
+        return
+
+    result_sink = make_sink(sink, swim_client, host_uri)
+    callback = build_pattern_detect(symbol, current_operation_config, result_sink, max_partials)
+    node_uri = f"/stock/{symbol}"
+    stream_until_interrupted(node_uri, callback, result_sink)
+
+
+# Streaming operators by function name, as dispatched by `execute` and hosted by `serve`
+OPERATOR_BUILDERS = {
+    "read_streaming": build_read_streaming,
+    "map_direct": build_map_direct,
+    "filter_direct": build_filter_direct,
+    "accumulate_native": build_accumulate_native,
+    "accumulate_direct": build_accumulate_direct,
+    "map_generate": build_map_generate,
+    "filter_generate": build_filter_generate,
+    "accumulate_generate": build_accumulate_generate,
+    "pattern_detect": build_pattern_detect,
+}
+
+
+JOIN_INPUTS_HELP = "Comma-separated join inputs: SYMBOL, SYMBOL#lane or name=/node/uri#lane"
+JOIN_EXPRESSION_HELP = "Arithmetic over joined fields (e.g. 'AAAA.price / BBBB.price') fed to the operator as price"
+
+
+def build_join(inputs: list, expression: str, function: str, sink, max_staleness_ms: int = 5000,
+               max_buffer: int = 1024, **options):
+    """
+    Join `inputs` by event time and run an existing operator on the value
+    of `expression` over each joined record.
+
+    Returns the AsOfJoin and the parsed (name, node_uri, lane_uri) inputs;
+    `join.callback_for(name)` feeds one input.
+    """
+    parsed_inputs = [parse_join_input(spec) for spec in inputs]
+    names = [name for name, _, _ in parsed_inputs]
+    value = compile_expression(parse_expression(expression), fields=joined_field_names(names))
+    if function not in OPERATOR_BUILDERS:
+        raise ValueError(f"Unknown function '{function}'. Expected one of: {', '.join(OPERATOR_BUILDERS)}")
+    options = {k: v for k, v in options.items() if v is not None}
+    operator_callback = OPERATOR_BUILDERS[function](symbol=expression, sink=sink, **options)
+
+    def on_joined(record: dict):
+        # The derived value takes the place of the price; joined fields ride along
+        operator_callback({**record, "price": value(record)}, None)
+
+    join = AsOfJoin(names, on_joined, max_staleness_ms, max_buffer)
+    join.result_cache = getattr(operator_callback, "result_cache", None)
+    return join, parsed_inputs
+
+
+@app.command()
+def join_streaming(
+        inputs: str = typer.Argument(..., help=JOIN_INPUTS_HELP),
+        expression: str = typer.Argument(..., help=JOIN_EXPRESSION_HELP),
+        function: str = typer.Option("read_streaming", help="Operator to run on the joined value"),
+        operation_config: str = typer.Option(None, help="JSON string with parameters for the operation"),
+        streaming_operator: str = typer.Option(None, help="Accumulation (for accumulate_* functions)"),
+        max_staleness_ms: int = typer.Option(5000, help="Max event-time gap between joined ticks; "
+                                                        "inputs lagging further are treated as stalled"),
+        max_buffer: int = typer.Option(1024, help="Max buffered ticks per input"),
+        sink: str = typer.Option("console", help=SINK_HELP)):
+    """Join several streams by event time and run an operator on a derived value"""
+    options = {"streaming_operator": streaming_operator}
+    if function != "read_streaming":
+        options["operation_config"] = parse_operation_config(operation_config or "{}")
+        if options["operation_config"] is None:
+            return
+
+    result_sink = make_sink(sink, swim_client, host_uri)
+    join, parsed_inputs = build_join(inputs.split(","), expression, function, result_sink,
+                                     max_staleness_ms, max_buffer, **options)
     print('Streaming data, press Ctrl+C to stop')
-    value_downlink = setup_value_downlink(node_uri, accumulate_generate_callback)
+    value_downlinks = open_stream_downlinks(parsed_inputs, join.callback_for)
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        value_downlink.close()
+        for value_downlink in value_downlinks:
+            value_downlink.close()
+        result_sink.close()
         print('Streaming stopped')
+    print(join.format_stats())
+    if join.result_cache is not None:
+        print(join.result_cache.format_stats())
 
 
-def generate_llm_code_for_execute(
-        prompt: str,
-        max_retries: int = 5,
-        retry_delay: int = 1):
-    retries = 0
-    while retries < max_retries:
-        try:
-            response = llm_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="gpt-4",
-                max_tokens=1000
-            )
-            response_content = response.choices[0].message.content.strip()
-            print(f"response_content: {response_content}")
-
-            # Use regex to extract JSON object with non-greedy match
-            json_match = re.search(
-                r'\{.*\}',
-                # r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}',
-                response_content, re.DOTALL)
-
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    result = json.loads(json_str)
-                    return result  # Directly returning the parsed JSON result
-                except (json.JSONDecodeError, KeyError) as e:
-                    raise ValueError("Failed to decode JSON from LLM response") from e
-            else:
-                raise ValueError("No valid JSON found in LLM response")
-
-        except Exception as e:
-            retries += 1
-            print(f"Error: {e}, retrying... ({retries}/{max_retries})")
-            time.sleep(retry_delay)
+def generate_llm_code_for_execute(prompt: str, command: str = None, repairs: list = None):
+    """
+    Ask the routing model to call the route_command tool with a plan. The
+    arguments are validated against PLAN_SCHEMA and small violations are
+    repaired locally; only an unrepairable answer escalates to the next
+    model in the routing chain.
 
-    raise ValueError("Max retries exceeded, failed to get valid response from LLM")
+    Returns:
+    - dict: The plan (see plans.PLAN_SCHEMA).
+    """
+    repairs = [] if repairs is None else repairs
+    return llm_gateway.complete("routing", prompt, plan_parser(command, repairs), tool=PLAN_TOOL)
 
 
 possible_functions = """
 Possible functions:
-- read_adhoc(symbol: str)
-- read_streaming(symbol: str)
-- map_direct(symbol: str, operation_config: dict)
-- map_generate(symbol: str, operation_config: dict)
-- filter_direct(symbol: str, operation_config: dict)
-- filter_generate(symbol: str, operation_config: dict)
-- accumulate_direct(symbol: str, streaming_operator: str, operation_config: dict)
-- accumulate_generate(symbol: str, streaming_operator: str, operation_config: dict)
+- read_adhoc: the current price of a symbol, once
+- read_streaming: stream the prices of a symbol
+- map_direct, map_generate: transform every price (e.g. apply an exchange rate)
+- filter_direct, filter_generate: pass or alert on prices that match a condition
+- accumulate_direct, accumulate_generate: aggregate prices as they arrive (average, max, stddev, ...)
+- pattern_detect: alert on a sequence of price moves (e.g. three falls in a row followed by a jump)
+- join_streaming: combine several symbols by event time (e.g. the ratio AAAA.price / BBBB.price) and
+  run join_function (read_streaming, a map, filter, accumulate or pattern function) on the combined value
 """
 
 example_scenarios = """
-Examples:
-{"function": "read_adhoc", "symbol": "AAAA"}
-{"function": "read_streaming", "symbol": "AAAA"}
-{"function": "map_direct", "symbol": "AAAA", "operation_config": {"description": "apply exchange rate", "parameters": {"exchange_rate": 35}}}
-{"function": "filter_direct", "symbol": "AAAA", "operation_config": {"description": "alert me if stock price for AAAA goes below 35", "parameters": {"threshold": 35}}}
-{"function": "accumulate_direct", "parameters": { "symbol": "AAAA", "streaming_operator": "average", "operation_config": {"window_size": 5}}}
-{"function": "map_generate", "symbol": "AAAA", "operation_config": {"description": "apply exchange rate", "parameters": {"exchange_rate": 35}}}
-{"function": "filter_generate", "symbol": "AAAA", "operation_config": {"description": "alert me if stock price for AAAA goes below 35", "parameters": {"threshold": 35}}}
-{"function": "accumulate_generate", "parameters": { "symbol": "AAAA", "streaming_operator": "average", "operation_config": {"window_size": 5}}}
+Examples (route_command arguments):
+{"function": "read_adhoc", "symbol": "AAAA", "streaming_operator": null, "description": null, "parameters": {}}
+{"function": "read_streaming", "symbol": "AAAA", "streaming_operator": null, "description": null, "parameters": {}}
+{"function": "map_direct", "symbol": "AAAA", "streaming_operator": null, "description": "apply exchange rate", "parameters": {"exchange_rate": 35}}
+{"function": "filter_direct", "symbol": "AAAA", "streaming_operator": null, "description": "alert me if stock price for AAAA goes below 35", "parameters": {"threshold": 35}}
+{"function": "accumulate_direct", "symbol": "AAAA", "streaming_operator": "average", "description": null, "parameters": {"window_size": 5}}
+{"function": "map_generate", "symbol": "AAAA", "streaming_operator": null, "description": "apply exchange rate", "parameters": {"exchange_rate": 35}}
+{"function": "filter_generate", "symbol": "AAAA", "streaming_operator": null, "description": "alert me if stock price for AAAA goes below 35", "parameters": {"threshold": 35}}
+{"function": "accumulate_generate", "symbol": "AAAA", "streaming_operator": "average", "description": null, "parameters": {"window_size": 5}}
+{"function": "join_streaming", "symbol": null, "symbols": ["AAAA", "BBBB"], "expression": "AAAA.price / BBBB.price", "join_function": "filter_direct", "streaming_operator": null, "description": "alert when the AAAA/BBBB price ratio exceeds 1.1", "parameters": {"threshold": 1.1}}
+{"function": "pattern_detect", "symbol": "AAAA", "streaming_operator": null, "description": "alert when AAAA falls three ticks in a row and then jumps 5% above the last low", "parameters": {"falls": 3, "jump_pct": 5}}
 """
 
 filtering_context = """
@@ -497,14 +1051,13 @@ Keep in mind the context and intent behind the query can also influence the
 interpretation of these keywords.
 """
 
-def invoke_llm_to_process_command(command: str, generate_llm_code_func):
+def invoke_llm_to_process_command(command: str, generate_llm_code_func=generate_llm_code_for_execute,
+                                  repairs: list = None):
     prompt = f"""
-    You are an intelligent assistant that converts natural language commands 
-    into structured code for various functions.
-    You must only return valid JSON. Only valid JSON.
+    You are an intelligent assistant that routes natural language commands 
+    to stream operators.
     Given the command: '{command}', determine which function to execute and 
-    provide the necessary parameters in JSON format and identify the name of 
-    the function in the JSON response using the `function` field.
+    call `route_command` with the plan for it.
     When choosing functions with the suffix "_direct" and "_generate", choose
     the latter whenever the request is asking for code (function, operator, etc).
 
@@ -513,82 +1066,129 @@ def invoke_llm_to_process_command(command: str, generate_llm_code_func):
     {example_scenarios}
 
     {filtering_context}
-
-    Ensure you have included the key "function" in the JSON object.
-    Make sure the JSON you return is valid and parseable.
     """
-    response = generate_llm_code_func(prompt)
+    response = generate_llm_code_func(prompt, command, repairs)
     return response
 
 
 @app.command()
-def execute(command: str, max_retries: int = 5):
+def execute(
+        command: str,
+        max_retries: int = 5,
+        sink: str = typer.Option("console", help=SINK_HELP),
+        speculative: bool = typer.Option(True, "--speculative/--no-speculative", help=SPECULATIVE_HELP)):
     """Execute a command with retry logic"""
-    retries = 0
-
-    while retries < max_retries:
+    global downlink_pool
+    started = time.perf_counter()
+    mode = "speculative" if speculative else "sequential"
+
+    def report_first_result():
+        print(f"Time to first result: {(time.perf_counter() - started) * 1000:.0f} ms ({mode} startup)")
+
+    downlink_pool = DownlinkPool(swim_client, host_uri, on_first_result=report_first_result)
+    if speculative:
+        candidates = candidate_symbols(command)
+        # One downlink per candidate: streaming operators acquire it, and
+        # ad-hoc reads hand it over to the last-value cache
+        for candidate in candidates:
+            downlink_pool.open(f"/stock/{candidate}")
+    try:
+        _execute_with_retries(command, max_retries, sink)
+    finally:
+        downlink_pool.close()
+        downlink_pool = None
+
+
+def _execute_with_retries(command: str, max_retries: int, sink: str):
+    plan = None
+    repairs = []
+    attempts = 0
+    # Each attempt already escalates through the routing models, so a
+    # retry here means no model produced a repairable plan
+    while plan is None and attempts < max_retries:
+        attempts += 1
         try:
-            # Parse the JSON response from the LLM
-            json_response = invoke_llm_to_process_command(
-                command,
-                generate_llm_code_func=generate_llm_code_for_execute)
-            print(f"json_response:\n{json_response}")
-            function_name = json_response.get("function", "map_generate")
-            parameters = json_response.get("parameters")
-
-            # Extract operation_config if present
-            operation_config = None
-
-            if parameters is not None:
-                operation_config = parameters.pop("operation_config", None)
-            else:
-                operation_config = json_response.get("operation_config")
-
-            if operation_config:
-                # operation_config = json.loads(operation_config)
-
-                if not parameters:
-                    parameters = operation_config.get("parameters")
-                    print(f"* parameters: {parameters}")
-
-            if parameters is None and 'symbol' in json_response:
-                parameters = {'symbol': json_response.get('symbol')}
-
-            if not function_name or not parameters:
-                raise ValueError("Invalid response from LLM")
-
-            symbol = None
-            if 'symbol' in parameters:
-                symbol = parameters['symbol']
-            elif 'symbol' in json_response:
-                symbol = json_response.get('symbol')
-
-            # Call the appropriate function with the provided parameters
-            print(f"function_name: {function_name}")
-            if function_name == "read_adhoc":
-                read_adhoc(**parameters)
-            elif function_name == "read_streaming":
-                read_streaming(**parameters)
-            elif function_name == "map_direct":
-                map_direct(symbol, json.dumps(operation_config))
-            elif function_name == "map_generate":
-                map_generate(symbol, json.dumps(operation_config))
-            elif function_name == "filter_direct":
-                filter_direct(symbol, json.dumps(operation_config))
-            elif function_name == "filter_generate":
-                filter_generate(symbol, json.dumps(operation_config))
-            elif function_name == "accumulate_direct":
-                accumulate_direct(symbol, parameters["streaming_operator"], json.dumps(operation_config))
-            elif function_name == "accumulate_generate":
-                accumulate_generate(symbol, parameters["streaming_operator"], json.dumps(operation_config))
-            else:
-                print("Unknown function")
-            break  # Exit loop if successful
+            plan = invoke_llm_to_process_command(command, repairs=repairs)
         except ValueError as e:
-            retries += 1
-            print(f"Error: {e}. Retrying ({retries}/{max_retries})...")
-            if retries >= max_retries:
-                print("Max retries reached. Exiting.")
+            print(f"Error: {e}. Retrying ({attempts}/{max_retries})...")
+    routing_stats.record(attempts, repairs, failed=plan is None)
+    print(routing_stats.format_stats())
+    if plan is None:
+        print("Max retries reached. Exiting.")
+        return
+
+    print(f"plan:\n{json.dumps(plan)}")
+    function_name = plan["function"]
+    symbol = plan["symbol"]
+    operation_config = json.dumps(operation_config_for(plan))
+
+    # Call the appropriate function with the plan; the plan is valid, so a
+    # failing operator is reported rather than routed again
+    print(f"function_name: {function_name}")
+    try:
+        if function_name == "read_adhoc":
+            read_adhoc(symbol)
+        elif function_name == "read_streaming":
+            read_streaming(symbol, sink)
+        elif function_name == "map_direct":
+            map_direct(symbol, operation_config, sink, DEFAULT_CACHE_SIZE, 0.0)
+        elif function_name == "map_generate":
+            map_generate(symbol, operation_config, sink, True, DEFAULT_CANDIDATES)
+        elif function_name == "filter_direct":
+            filter_direct(symbol, operation_config, sink, DEFAULT_CACHE_SIZE, 0.0, False)
+        elif function_name == "filter_generate":
+            filter_generate(symbol, operation_config, sink, True, DEFAULT_CANDIDATES)
+        elif function_name == "accumulate_direct":
+            accumulate_direct(symbol, plan["streaming_operator"], operation_config, sink)
+        elif function_name == "accumulate_generate":
+            accumulate_generate(symbol, plan["streaming_operator"], operation_config, sink, True,
+                                DEFAULT_CANDIDATES)
+        elif function_name == "pattern_detect":
+            pattern_detect(symbol, operation_config, sink, DEFAULT_MAX_PARTIALS)
+        elif function_name == "join_streaming":
+            join_streaming(",".join(plan["symbols"]), plan["expression"], plan["join_function"],
+                           operation_config, plan["streaming_operator"], 5000, 1024, sink)
+    except ValueError as e:
+        print(f"Error: {function_name} failed: {e}")
+
+
+@app.command()
+def reconfigure(
+        operator_id: str = typer.Argument(..., help=f"Operator id on the server, or '{LOCAL_OPERATOR_ID}' for a "
+                                                    "standalone command run with OPERATOR_CONTROL_PORT"),
+        operation_config: str = typer.Argument(..., help="JSON changes to merge into the operation_config "
+                                                         "(e.g. '{\"parameters\": {\"threshold\": 30}}')"),
+        host: str = typer.Option("127.0.0.1", help="Control API host"),
+        port: int = typer.Option(8765, help="Control API port (serve --port or OPERATOR_CONTROL_PORT)")):
+    """Change the parameters of a running operator in place, without reopening its downlink"""
+    changes = parse_operation_config(operation_config)
+    if changes is None:
+        return
+    request = urllib.request.Request(
+        f"http://{host}:{port}/operators/{operator_id}", method="PATCH",
+        data=json.dumps({"operation_config": changes}).encode("utf-8"),
+        headers={"Content-Type": "application/json"})
+    try:
+        # A new description regenerates code before the change applies
+        with urllib.request.urlopen(request, timeout=600) as response:
+            print(json.dumps(json.load(response), indent=2, default=str))
+    except urllib.error.HTTPError as e:
+        print(f"Error: {json.load(e).get('error')}")
+        raise typer.Exit(code=1)
+    except urllib.error.URLError as e:
+        print(f"Error: no operator control API at {host}:{port} ({e.reason})")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def serve(
+        host: str = typer.Option("127.0.0.1", help="Interface for the control API"),
+        port: int = typer.Option(8765, help="Port for the control API"),
+        workers: int = typer.Option(32, help="Worker threads shared by all operator callbacks")):
+    """Host many operators in one long-running process behind a local HTTP control API"""
+    operator_server = OperatorServer(swim_client, host_uri, OPERATOR_BUILDERS, workers=workers,
+                                     last_values=last_value_cache)
+    serve_control_api(operator_server, host, port)
 
 
 if __name__ == "__main__":
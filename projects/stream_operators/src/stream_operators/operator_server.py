@@ -0,0 +1,376 @@
+import inspect
+import itertools
+import json
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from downlinks import open_status_downlink
+from plans import PLAN_SCHEMA, operation_config_for
+from sinks import RingBufferSink, make_sink
+
+
+class SerialDispatcher:
+    """
+    Run an operator's callback on a shared worker pool, one tick at a time
+    and in arrival order, so slow (LLM-bound) operators never block the
+    SwimClient event loop or each other.
+
+    At most `max_pending` ticks are queued; under backpressure the oldest
+    pending ticks are dropped in favour of fresh ones.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, callback, max_pending: int = 64):
+        self.executor = executor
+        self.callback = callback
+        self.ticks = 0
+        self.errors = 0
+        self.dropped = 0
+        self.last_error = None
+        self._pending = deque()
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def __call__(self, new_value, old_value):
+        with self._lock:
+            if len(self._pending) >= self._max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append((new_value, old_value))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.executor.submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._scheduled = False
+                    return
+                new_value, old_value = self._pending.popleft()
+            try:
+                self.callback(new_value, old_value)
+                self.ticks += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+
+
+class HostedOperator:
+    """One operator running inside an OperatorServer."""
+
+    def __init__(self, operator_id: str, request: dict, sink):
+        self.id = operator_id
+        self.request = request
+        self.sink = sink
+        self.status = "starting"
+        self.error = None
+        self.created = time.time()
+        self.dispatcher = None
+        self.downlink = None
+        self.callback = None
+
+    def describe(self) -> dict:
+        description = {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            **self.request,
+        }
+        if self.dispatcher is not None:
+            description.update(ticks=self.dispatcher.ticks, errors=self.dispatcher.errors,
+                               dropped=self.dispatcher.dropped, last_error=self.dispatcher.last_error)
+        result_cache = getattr(self.callback, "result_cache", None)
+        if result_cache is not None:
+            description["cache"] = result_cache.stats()
+        profile_report = getattr(self.callback, "profile_report", None)
+        if profile_report is not None:
+            description["profile"] = profile_report.to_dict()
+        matcher = getattr(self.callback, "matcher", None)
+        if matcher is not None:
+            description["pattern"] = matcher.stats()
+        live_config = getattr(self.callback, "live_config", None)
+        if live_config is not None:
+            description["config_version"] = live_config.version
+        return description
+
+
+class OperatorServer:
+    """
+    Hosts many concurrent operators in one process over a shared SwimClient.
+
+    Operators are created from `builders`, the same name -> builder mapping
+    `execute` dispatches to; each builder returns a downlink callback that
+    owns its own state. A request is either an `execute` plan:
+
+        {"function": "filter_direct", "symbol": "AAAA", "streaming_operator": null,
+         "description": "price above threshold", "parameters": {"threshold": 100}}
+
+    or names the builder's operation_config directly:
+
+        {"function": "filter_direct", "symbol": "AAAA",
+         "operation_config": {...}, "sink": "ring:1000", ...}
+
+    A plan's description and parameters become its operation_config (as in
+    `execute`). Other keys must be builder keyword arguments (e.g.
+    cache_size, profile); plan fields a builder does not take are ignored.
+    """
+
+    def __init__(self, swim_client, host_uri: str, builders: dict, workers: int = 32, last_values=None):
+        self.swim_client = swim_client
+        self.host_uri = host_uri
+        self.builders = builders
+        self.last_values = last_values
+        self.operators = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._starter = ThreadPoolExecutor(max_workers=8, thread_name_prefix="operator-start")
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="operator")
+
+    def _make_sink(self, spec: str):
+        if spec is None:
+            return RingBufferSink()
+        return make_sink(spec, self.swim_client, self.host_uri)
+
+    def submit(self, request: dict) -> dict:
+        """
+        Validate `request` and start the operator in the background; returns
+        immediately with status "starting" (LLM codegen may still be running).
+        """
+        function = request.get("function")
+        if function not in self.builders:
+            raise ValueError(f"Unknown function '{function}'. Expected one of: {', '.join(self.builders)}")
+        if not request.get("symbol"):
+            raise ValueError("Request must include 'symbol'")
+        self._builder_options(request)
+
+        operator_id = f"op-{next(self._ids)}"
+        operator = HostedOperator(operator_id, dict(request), self._make_sink(request.get("sink")))
+        with self._lock:
+            self.operators[operator_id] = operator
+        self._starter.submit(self._start, operator)
+        return operator.describe()
+
+    def _builder_options(self, request: dict) -> dict:
+        """The keyword arguments `request` passes to its builder; raises ValueError for unknown keys."""
+        function = request["function"]
+        options = {k: v for k, v in request.items() if k not in ("function", "sink")}
+        if "operation_config" not in options and ("description" in options or "parameters" in options):
+            options["operation_config"] = operation_config_for({
+                "function": function, "description": options.get("description"),
+                "parameters": options.get("parameters") or {}})
+        if isinstance(options.get("operation_config"), str):
+            options["operation_config"] = json.loads(options["operation_config"])
+
+        signature = inspect.signature(self.builders[function])
+        if any(p.kind == p.VAR_KEYWORD for p in signature.parameters.values()):
+            return options
+        accepted = set(signature.parameters) - {"sink"}
+        unknown = sorted(k for k in options if k not in accepted and k not in PLAN_SCHEMA["properties"])
+        if unknown:
+            raise ValueError(f"Unknown option(s) for {function}: {', '.join(unknown)}. "
+                             f"Expected one of: {', '.join(sorted(accepted))}")
+        return {k: v for k, v in options.items() if k in accepted}
+
+    def _build(self, operator: HostedOperator, request: dict):
+        options = self._builder_options(request)
+        return self.builders[request["function"]](sink=operator.sink, **options)
+
+    def _start(self, operator: HostedOperator):
+        try:
+            operator.callback = self._build(operator, operator.request)
+            operator.dispatcher = SerialDispatcher(self._workers, operator.callback)
+            if operator.status == "stopped":
+                return
+            operator.downlink = open_status_downlink(
+                self.swim_client, self.host_uri, f"/stock/{operator.request['symbol']}",
+                operator.dispatcher, wait_for_sync=False)
+            if operator.status == "stopped":
+                # Stopped while the downlink was opening
+                operator.downlink.close()
+                return
+            operator.status = "running"
+        except Exception as e:
+            operator.status = "failed"
+            operator.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+
+    def get(self, operator_id: str) -> HostedOperator:
+        with self._lock:
+            operator = self.operators.get(operator_id)
+        if operator is None:
+            raise KeyError(operator_id)
+        return operator
+
+    def list(self) -> list:
+        with self._lock:
+            operators = list(self.operators.values())
+        return [operator.describe() for operator in operators]
+
+    def update(self, operator_id: str, changes: dict) -> dict:
+        """
+        Apply `changes` to an operator's request. A change of operation_config
+        alone is merged into the running operator between two ticks (see
+        live_config.merge_config), keeping its downlink and state and
+        regenerating code only for a new description; any other change
+        replaces the operator with a new one.
+        """
+        operator = self.get(operator_id)
+        reconfigure = getattr(operator.callback, "reconfigure", None)
+        if set(changes) == {"operation_config"} and reconfigure is not None and operator.status == "running":
+            operation_config = changes["operation_config"]
+            if isinstance(operation_config, str):
+                operation_config = json.loads(operation_config)
+            operator.request["operation_config"] = reconfigure(operation_config or {})
+            return operator.describe()
+        request = {**operator.request, **changes}
+        if request.get("function") not in self.builders:
+            raise ValueError(f"Unknown function '{request.get('function')}'. "
+                             f"Expected one of: {', '.join(self.builders)}")
+        self._builder_options(request)
+        self.stop(operator_id)
+        replacement = HostedOperator(operator_id, request, self._make_sink(request.get("sink")))
+        with self._lock:
+            self.operators[operator_id] = replacement
+        self._starter.submit(self._start, replacement)
+        return replacement.describe()
+
+    def stop(self, operator_id: str) -> dict:
+        operator = self.get(operator_id)
+        with self._lock:
+            self.operators.pop(operator_id, None)
+        if operator.downlink is not None:
+            operator.downlink.close()
+        operator.sink.close()
+        operator.status = "stopped"
+        return operator.describe()
+
+    def results(self, operator_id: str, limit: int = 100) -> list:
+        operator = self.get(operator_id)
+        if not isinstance(operator.sink, RingBufferSink):
+            raise ValueError(f"Operator {operator_id} does not keep results in memory")
+        return operator.sink.records()[-limit:]
+
+    def read_status(self, symbols: list) -> dict:
+        """Current status of `symbols` from the shared last-value cache."""
+        if self.last_values is None:
+            raise ValueError("This server has no last-value cache")
+        if not symbols:
+            raise ValueError("Pass symbols as ?symbols=AAAA,BBBB")
+        return self.last_values.read_many(symbols)
+
+    def shutdown(self):
+        for operator_id in [operator["id"] for operator in self.list()]:
+            self.stop(operator_id)
+        if self.last_values is not None:
+            self.last_values.close()
+        self._starter.shutdown(wait=False, cancel_futures=True)
+        self._workers.shutdown(wait=False, cancel_futures=True)
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON control API:
+
+        GET    /operators                  list operators
+        POST   /operators                  submit an operator (execute-style plan)
+        GET    /operators/<id>             describe one operator
+        PATCH  /operators/<id>             update an operator's request (operation_config in place)
+        DELETE /operators/<id>             stop an operator
+        GET    /operators/<id>/results     recent results from a ring-buffer sink
+        GET    /status?symbols=AAAA,BBBB   current status of many symbols (last-value cache)
+    """
+
+    server_version = "StreamOperators/0.1"
+    operator_server: OperatorServer = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    def _route(self, method: str):
+        path, _, query = self.path.partition("?")
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        if path.rstrip("/") == "/status":
+            if method != "GET":
+                return self._send(405, {"error": f"{method} not allowed on {path}"})
+            symbols = [s for s in params.get("symbols", "").split(",") if s]
+            try:
+                return self._send(200, self.operator_server.read_status(symbols))
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+        match = re.fullmatch(r"/operators(?:/([^/]+))?(/results)?/?", path)
+        if match is None:
+            return self._send(404, {"error": f"No route for {path}"})
+        operator_id, results = match.groups()
+        server = self.operator_server
+        try:
+            if operator_id is None:
+                if method == "GET":
+                    return self._send(200, server.list())
+                if method == "POST":
+                    return self._send(201, server.submit(self._read_json()))
+            elif results:
+                if method == "GET":
+                    limit = int(params.get("limit", 100))
+                    return self._send(200, server.results(operator_id, limit))
+            elif method == "GET":
+                return self._send(200, server.get(operator_id).describe())
+            elif method == "PATCH":
+                return self._send(200, server.update(operator_id, self._read_json()))
+            elif method == "DELETE":
+                return self._send(200, server.stop(operator_id))
+            return self._send(405, {"error": f"{method} not allowed on {path}"})
+        except KeyError as e:
+            return self._send(404, {"error": f"Unknown operator {e}"})
+        except (ValueError, TypeError) as e:
+            return self._send(400, {"error": str(e)})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+def serve_control_api(operator_server: OperatorServer, host: str = "127.0.0.1", port: int = 8765):
+    """Serve the control API until interrupted, then stop every operator."""
+    handler = type("BoundControlRequestHandler", (ControlRequestHandler,),
+                   {"operator_server": operator_server})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    print(f"Operator server listening on http://{host}:{port}, press Ctrl+C to stop")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopping operators')
+    finally:
+        httpd.server_close()
+        operator_server.shutdown()
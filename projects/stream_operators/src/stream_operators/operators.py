@@ -1,3 +1,11 @@
+import hashlib
+import heapq
+import math
+import random
+from collections import deque
+
+import numpy as np
+
 prompt = """
 Generate a Python function that implements a streaming operator for calculating the 
 {operation} of a sequence of values. The function should take two arguments: 
@@ -32,7 +40,8 @@ def ema(acc, x):
     - tuple: Updated accumulator and the result of the calculation.
     """
     if not acc:  # Initialize the accumulator if it's empty
-        acc = (1, x)
+        mean = x
+        acc = (1, mean)
     else:
         count, mean = acc
         count += 1
@@ -135,3 +144,405 @@ def stddev(acc, x):
     return updated_acc, stddev
 
 
+def windowed_mean(acc, x, window_size):
+    """
+    Calculate the simple moving average in constant time per value.
+
+    Args:
+    - acc (tuple): Accumulator containing the window (deque) and its running sum.
+    - x (float): New value in the sequence.
+    - window_size (int): Size of the moving average window.
+
+    Returns:
+    - tuple: Updated accumulator and the moving average.
+    """
+    if not acc:
+        acc = (deque(), 0.0)
+    window, total = acc
+    window.append(x)
+    total += x
+    # A loop, so a window shrunk by reconfiguration is trimmed at once
+    while len(window) > window_size:
+        total -= window.popleft()
+    return (window, total), total / len(window)
+
+
+def ewma(acc, x, alpha):
+    """
+    Calculate the exponentially weighted moving average.
+
+    Args:
+    - acc (float): Previous average, or None for an empty stream.
+    - x (float): New value in the sequence.
+    - alpha (float): Smoothing factor in (0, 1]; larger reacts faster.
+
+    Returns:
+    - tuple: Updated accumulator and the average.
+    """
+    mean = x if acc is None else acc + alpha * (x - acc)
+    return mean, mean
+
+
+def running_min(acc, x):
+    """
+    Track the minimum of a streaming data set.
+
+    Returns:
+    - tuple: Updated accumulator and the minimum so far.
+    """
+    result = x if acc is None else min(acc, x)
+    return result, result
+
+
+def running_max(acc, x):
+    """
+    Track the maximum of a streaming data set.
+
+    Returns:
+    - tuple: Updated accumulator and the maximum so far.
+    """
+    result = x if acc is None else max(acc, x)
+    return result, result
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Values are kept in a hierarchy of compactors; an item at level h stands
+    for 2**h inputs. Memory is O(k) regardless of stream length, and two
+    sketches with the same k merge into one that summarizes both streams.
+
+    Error bound: with 99% confidence the rank of the value returned for
+    quantile q is within about 2.3 / k**0.97 * n of q * n (k=200: +/-1.3%
+    rank error), independent of the value distribution.
+    """
+
+    def __init__(self, k: int = 200, seed: int = None):
+        self.k = k
+        self.n = 0
+        self.compactors = [[]]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * (2.0 / 3.0) ** depth)), 2)
+
+    def _size(self) -> int:
+        return sum(len(c) for c in self.compactors)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        while self._size() > self._max_size():
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    # Keep every other item (random offset); survivors double in weight
+                    offset = self._rng.randint(0, 1)
+                    odd = len(compactor) % 2
+                    self.compactors[level + 1].extend(compactor[offset + odd::2])
+                    self.compactors[level] = compactor[:odd]
+                    break
+
+    def update(self, x: float):
+        self.n += 1
+        self.compactors[0].append(x)
+        if len(self.compactors[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold `other` into this sketch (in place) and return self."""
+        if other.k != self.k:
+            raise ValueError("Only sketches with the same k can be merged")
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self) -> list:
+        items = [(x, 1 << level) for level, c in enumerate(self.compactors) for x in c]
+        items.sort()
+        return items
+
+    def quantile(self, q: float):
+        """Value at quantile q in [0, 1], or None for an empty sketch."""
+        items = self._weighted()
+        if not items:
+            return None
+        target = q * sum(w for _, w in items)
+        cumulative = 0
+        for x, w in items:
+            cumulative += w
+            if cumulative >= target:
+                return x
+        return items[-1][0]
+
+    def rank(self, x: float) -> float:
+        """Estimated fraction of values <= x."""
+        items = self._weighted()
+        total = sum(w for _, w in items)
+        return sum(w for v, w in items if v <= x) / total if total else 0.0
+
+
+def quantile(acc, x, q, k=200):
+    """
+    Streaming quantile backed by a KLL sketch.
+
+    Args:
+    - acc (KLLSketch): Sketch of the values seen so far, or None.
+    - x (float): New value in the sequence.
+    - q (float): Quantile in [0, 1] (0.5 for the median).
+    - k (int): Sketch size; rank error is about 2.3 / k**0.97.
+
+    Returns:
+    - tuple: Updated sketch and the current estimate.
+    """
+    if acc is None:
+        acc = KLLSketch(k)
+    acc.update(x)
+    return acc, acc.quantile(q)
+
+
+class P2Quantile:
+    """
+    P-squared single-quantile estimator (Jain & Chlamtac 1985).
+
+    Tracks one quantile with five markers: constant memory and O(1) work
+    per value. There is no worst-case guarantee; on smooth distributions
+    the estimate is typically within a few tenths of a percent of the
+    exact quantile after a few thousand values.
+
+    P-squared state is not exactly mergeable; `merge` combines marker
+    heights weighted by count, which is a reasonable approximation for
+    streams drawn from similar distributions.
+    """
+
+    def __init__(self, q: float):
+        self.q = q
+        self.n = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def update(self, x: float):
+        self.n += 1
+        if len(self.heights) < 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return
+
+        h = self.heights
+        if x < h[0]:
+            h[0] = x
+            cell = 0
+        elif x >= h[4]:
+            h[4] = x
+            cell = 3
+        elif x < h[2]:
+            cell = 0 if x < h[1] else 1
+        else:
+            cell = 2 if x < h[3] else 3
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - self.positions[i]
+            if (d >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+                    (d <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = self._linear(i, step)
+                h[i] = candidate
+                self.positions[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self.heights, self.positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i: int, d: int) -> float:
+        h, n = self.heights, self.positions
+        return h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+
+    def value(self):
+        """Current estimate, or None before any value arrives."""
+        if not self.heights:
+            return None
+        if self.n <= 5:
+            ordered = sorted(self.heights)
+            return ordered[min(int(self.q * len(ordered)), len(ordered) - 1)]
+        return self.heights[2]
+
+    def merge(self, other: "P2Quantile") -> "P2Quantile":
+        """Approximate merge: count-weighted average of marker heights."""
+        if other.q != self.q:
+            raise ValueError("Only estimators of the same quantile can be merged")
+        if other.n <= 5:
+            for x in other.heights:
+                self.update(x)
+            return self
+        if self.n <= 5:
+            values = self.heights
+            self.n, self.heights = other.n, list(other.heights)
+            self.positions, self.desired = list(other.positions), list(other.desired)
+            for x in values:
+                self.update(x)
+            return self
+        total = self.n + other.n
+        self.heights = [(a * self.n + b * other.n) / total for a, b in zip(self.heights, other.heights)]
+        self.positions = [a + b for a, b in zip(self.positions, other.positions)]
+        self.desired = [a + b for a, b in zip(self.desired, other.desired)]
+        self.n = total
+        return self
+
+
+def p2_quantile(acc, x, q):
+    """
+    Streaming quantile backed by a P-squared estimator (O(1) time and memory).
+
+    Args:
+    - acc (P2Quantile): Estimator state, or None.
+    - x (float): New value in the sequence.
+    - q (float): Quantile in [0, 1].
+
+    Returns:
+    - tuple: Updated estimator and the current estimate.
+    """
+    if acc is None:
+        acc = P2Quantile(q)
+    acc.update(x)
+    return acc, acc.value()
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters (Metwally, Agrawal, El Abbadi 2005), weighted.
+
+    Keeps at most `capacity` counters. Every key whose true weight exceeds
+    total / capacity is guaranteed to be tracked, and each reported count
+    overestimates the true weight by at most the recorded `error`, itself
+    at most total / capacity. Summaries with equal capacity are mergeable
+    (Agarwal et al. 2012) with the same bound over the combined total.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.total = 0.0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def _push(self, key):
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        # Lazy deletion: skip heap entries whose count is stale
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return key, count
+
+    def update(self, key, weight: float = 1.0):
+        self.total += weight
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0.0
+        else:
+            evicted, floor = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        self._push(key)
+
+    def top(self, n: int = 10) -> list:
+        """The n heaviest keys as (key, estimated_weight, max_overestimate)."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        if other.capacity != self.capacity:
+            raise ValueError("Only summaries with the same capacity can be merged")
+        # A key missing from a full summary may have had up to its minimum count
+        own_floor = min(self.counts.values()) if len(self.counts) >= self.capacity else 0.0
+        other_floor = min(other.counts.values()) if len(other.counts) >= other.capacity else 0.0
+        counts, errors = {}, {}
+        for key in set(self.counts) | set(other.counts):
+            counts[key] = self.counts.get(key, own_floor) + other.counts.get(key, other_floor)
+            errors[key] = self.errors.get(key, own_floor) + other.errors.get(key, other_floor)
+        kept = sorted(counts, key=counts.get, reverse=True)[:self.capacity]
+        self.counts = {key: counts[key] for key in kept}
+        self.errors = {key: errors[key] for key in kept}
+        self.total += other.total
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+        return self
+
+
+class CountMinSketch:
+    """
+    Count-min sketch (Cormode & Muthukrishnan 2005) for per-key weights.
+
+    With width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)), every
+    estimate is >= the true weight and, with probability 1 - delta, at most
+    true + epsilon * total. Hashing uses blake2b so sketches built in other
+    processes or workers with the same dimensions can be merged by adding
+    their tables.
+    """
+
+    # Symbols repeat, so hashed columns are memoized up to this many keys
+    MAX_CACHED_KEYS = 10_000
+
+    def __init__(self, epsilon: float = 0.001, delta: float = 0.01):
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.float64)
+        self.total = 0.0
+        self._columns_by_key = {}
+
+    def _columns(self, key):
+        columns = self._columns_by_key.get(key)
+        if columns is None:
+            digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+            h1 = int.from_bytes(digest[:8], "little")
+            h2 = int.from_bytes(digest[8:], "little") | 1
+            columns = [(h1 + i * h2) % self.width for i in range(self.depth)]
+            if len(self._columns_by_key) < self.MAX_CACHED_KEYS:
+                self._columns_by_key[key] = columns
+        return columns
+
+    def update(self, key, weight: float = 1.0):
+        # Scalar indexing beats fancy indexing at this depth
+        table = self.table
+        for row, column in enumerate(self._columns(key)):
+            table[row, column] += weight
+        self.total += weight
+
+    def estimate(self, key) -> float:
+        table = self.table
+        return float(min(table[row, column] for row, column in enumerate(self._columns(key))))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        if self.table.shape != other.table.shape:
+            raise ValueError("Only sketches with the same width and depth can be merged")
+        self.table += other.table
+        self.total += other.total
+        return self
@@ -0,0 +1,275 @@
+# Complex event patterns: sequences of tick conditions, compiled to an NFA.
+#
+# A pattern spec is plain JSON so an LLM can produce it once per operation_config:
+#
+#     {"steps": [{"name": "fall", "times": 3,
+#                 "where": {"cmp": "<", "left": {"field": "price"}, "right": {"field": "prev.price"}}},
+#                {"name": "jump",
+#                 "where": {"cmp": ">=", "left": {"field": "price"},
+#                           "right": {"op": "*", "args": [{"field": "fall.price"}, 1.05]}}}],
+#      "contiguity": "strict", "within": 10}
+#
+# `where` is a predicate (see predicates.py) over the current tick's fields
+# ("price"), the previous tick on the stream ("prev.price"), the first tick
+# of the match ("first.price") and the last tick an earlier step accepted
+# ("fall.price"). A reference to a step that has not matched yet (or to
+# "prev" on the first tick) is NaN, and a comparison with NaN fails under
+# every operator, "!=" and "not" included (see predicates.py).
+#
+# With "strict" contiguity every step must match the very next tick; with
+# "relaxed", ticks that do not advance a partial match are skipped (each
+# partial match advances on the first tick that fits, it never branches).
+# "within" bounds a match to that many ticks. Partial matches are capped at
+# `max_partials`, oldest dropped first, and a completed match discards the
+# partial matches it overlaps, so per-tick cost is constant per symbol.
+import json
+import math
+import re
+
+from predicates import TICK_FIELD_NAMES, PredicateError, compile_predicate, referenced_fields
+
+CONTIGUITIES = ("strict", "relaxed")
+DEFAULT_MAX_PARTIALS = 32
+MAX_STEP_TIMES = 50
+RESERVED_NAMES = ("prev", "first")
+NAME_PATTERN = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+class PatternError(ValueError):
+    """Raised when a pattern spec is malformed."""
+
+
+class _State:
+    """One NFA state: the step (repetition) a partial match waits for."""
+
+    __slots__ = ("name", "predicate")
+
+    def __init__(self, name: str, predicate):
+        self.name = name
+        self.predicate = predicate
+
+
+class _Partial:
+    __slots__ = ("state", "start", "first", "captures", "events")
+
+    def __init__(self, state: int, start: int, first, captures: dict, events: tuple):
+        self.state = state
+        self.start = start
+        self.first = first
+        self.captures = captures
+        self.events = events
+
+
+class _Scope:
+    """The record a step predicate sees: the tick plus prefixed references."""
+
+    __slots__ = ("refs", "tick", "prev", "partial")
+
+    def __init__(self, refs: dict):
+        self.refs = refs
+        self.tick = None
+        self.prev = None
+        self.partial = None
+
+    def __getitem__(self, name: str):
+        source, field = self.refs[name]
+        if source is None:
+            return self.tick[field]
+        if source == "prev":
+            record = self.prev
+        elif source == "first":
+            record = self.tick if self.partial is None else self.partial.first
+        else:
+            record = None if self.partial is None else self.partial.captures.get(source)
+        return math.nan if record is None else record[field]
+
+
+class Pattern:
+    """A compiled pattern; `matcher()` creates the per-symbol matching state."""
+
+    def __init__(self, spec: dict, states: list, refs: dict, contiguity: str, within: int,
+                 max_partials: int):
+        self.spec = spec
+        self.states = states
+        self.refs = refs
+        self.contiguity = contiguity
+        self.within = within
+        self.max_partials = max_partials
+
+    @property
+    def signature(self) -> tuple:
+        """Step names per state; patterns with equal signatures can share partial matches."""
+        return tuple(state.name for state in self.states)
+
+    def matcher(self) -> "PatternMatcher":
+        return PatternMatcher(self)
+
+
+def compile_pattern(spec: dict, params: dict = None, max_partials: int = DEFAULT_MAX_PARTIALS) -> Pattern:
+    """
+    Compile a pattern spec (see the module comment).
+
+    Args:
+    - spec (dict): The pattern spec.
+    - params (dict): Operation parameters for {"param": name} operands.
+    - max_partials (int): Cap on concurrent partial matches per symbol.
+
+    Returns:
+    - Pattern: The compiled pattern.
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get("steps"), list) or not spec["steps"]:
+        raise PatternError(f"A pattern needs a non-empty 'steps' list: {spec!r}")
+    contiguity = spec.get("contiguity", "strict")
+    if contiguity not in CONTIGUITIES:
+        raise PatternError(f"Unknown contiguity '{contiguity}'. Expected one of: {', '.join(CONTIGUITIES)}")
+
+    states, refs, names = [], {}, []
+    for field in TICK_FIELD_NAMES:
+        refs[field] = (None, field)
+    for index, step in enumerate(spec["steps"]):
+        if not isinstance(step, dict):
+            raise PatternError(f"Invalid step: {step!r}")
+        name = step.get("name", f"step{index + 1}")
+        if not isinstance(name, str) or not NAME_PATTERN.fullmatch(name) or name in RESERVED_NAMES:
+            raise PatternError(f"Invalid step name {name!r}")
+        if name in names:
+            raise PatternError(f"Duplicate step name '{name}'")
+        names.append(name)
+        times = step.get("times", 1)
+        if isinstance(times, bool) or not isinstance(times, int) or not 1 <= times <= MAX_STEP_TIMES:
+            raise PatternError(f"Step '{name}': times must be an integer from 1 to {MAX_STEP_TIMES}")
+
+        # A step may refer to itself: the tick its previous repetition accepted
+        fields = set(TICK_FIELD_NAMES) | {f"{source}.{field}" for source in RESERVED_NAMES + tuple(names)
+                                          for field in TICK_FIELD_NAMES}
+        try:
+            predicate = compile_predicate(step.get("where"), params, fields=fields)
+        except PredicateError as e:
+            raise PatternError(f"Step '{name}': {e}") from e
+        for reference in referenced_fields(step.get("where")):
+            source, _, field = reference.rpartition(".")
+            refs[reference] = (source or None, field)
+        states.extend(_State(name, predicate) for _ in range(times))
+
+    within = spec.get("within")
+    if within is not None and (isinstance(within, bool) or not isinstance(within, int) or within < len(states)):
+        raise PatternError(f"within must be an integer of at least {len(states)} ticks (the pattern length)")
+    return Pattern(spec, states, refs, contiguity, within, max_partials)
+
+
+class PatternMatcher:
+    """
+    Partial matches of one pattern over one stream. `update(tick)` returns
+    a match when the tick completes one, else None.
+    """
+
+    def __init__(self, pattern: Pattern):
+        self.pattern = pattern
+        self.partials = []
+        self.prev = None
+        self.ticks = 0
+        self.matches = 0
+        self.expired = 0
+        self.dropped = 0
+        self.peak_partials = 0
+        self._scope = _Scope(pattern.refs)
+
+    def set_pattern(self, pattern: Pattern):
+        """Switch patterns; partial matches survive if the steps are the same."""
+        if pattern.signature != self.pattern.signature:
+            self.partials = []
+        self.pattern = pattern
+        self._scope = _Scope(pattern.refs)
+
+    def _advance(self, partial, state: _State, tick):
+        captures = dict(partial.captures) if partial is not None else {}
+        captures[state.name] = tick
+        events = (partial.events if partial is not None else ()) + ((state.name, tick),)
+        if partial is None:
+            return _Partial(1, self.ticks, tick, captures, events)
+        return _Partial(partial.state + 1, partial.start, partial.first, captures, events)
+
+    def update(self, tick):
+        pattern = self.pattern
+        states = pattern.states
+        self.ticks += 1
+        scope = self._scope
+        scope.tick = tick
+        scope.prev = self.prev
+        matched = None
+        survivors = []
+        for partial in self.partials:
+            if pattern.within is not None and self.ticks - partial.start >= pattern.within:
+                self.expired += 1
+                continue
+            state = states[partial.state]
+            scope.partial = partial
+            if state.predicate(scope):
+                advanced = self._advance(partial, state, tick)
+                if advanced.state == len(states):
+                    matched = advanced
+                    break
+                survivors.append(advanced)
+            elif pattern.contiguity == "relaxed":
+                survivors.append(partial)
+
+        if matched is None:
+            scope.partial = None
+            if states[0].predicate(scope):
+                started = self._advance(None, states[0], tick)
+                if len(states) == 1:
+                    matched = started
+                else:
+                    survivors.append(started)
+        if matched is not None:
+            # Skip past the match: partial matches overlapping it are discarded
+            survivors = []
+            self.matches += 1
+        elif len(survivors) > pattern.max_partials:
+            self.dropped += len(survivors) - pattern.max_partials
+            survivors = survivors[-pattern.max_partials:]
+        self.partials = survivors
+        self.peak_partials = max(self.peak_partials, len(survivors))
+        self.prev = tick
+        if matched is None:
+            return None
+        return {
+            "start": matched.first["timestamp"],
+            "end": tick["timestamp"],
+            "ticks": self.ticks - matched.start + 1,
+            "events": [{"step": name, "timestamp": event["timestamp"], "price": event["price"]}
+                       for name, event in matched.events],
+        }
+
+    def stats(self) -> dict:
+        return {"ticks": self.ticks, "matches": self.matches, "partials": len(self.partials),
+                "peak_partials": self.peak_partials, "expired": self.expired, "dropped": self.dropped}
+
+
+def pattern_prompt(description: str, parameters: dict) -> str:
+    """Prompt asking the LLM to translate a sequence alert into a pattern spec."""
+    return f"""
+    Translate the following stream alert into a structured event pattern.
+    Alert description: {description}
+    Alert parameters: {json.dumps(parameters)}
+
+    Each tick has numeric fields: {", ".join(TICK_FIELD_NAMES)}.
+    A pattern is {{"steps": [<step>, ...], "contiguity": "strict" | "relaxed", "within": <ticks or null>}}.
+    A step is {{"name": "<lower_case_name>", "times": <repetitions, default 1>, "where": <predicate>}};
+    steps must match in order, "times" consecutive matches for a repeated step.
+    "strict": each step must match the very next tick ("in a row"); "relaxed":
+    unrelated ticks in between are ignored. "within" caps the whole match in ticks.
+    A predicate is one of:
+    - {{"cmp": "<" | "<=" | ">" | ">=" | "==" | "!=", "left": <operand>, "right": <operand>}}
+    - {{"all": [<predicate>, ...]}} for AND, {{"any": [<predicate>, ...]}} for OR
+    - {{"not": <predicate>}}
+    An operand is a number, {{"param": "<parameter name>"}},
+    {{"op": "+" | "-" | "*" | "/", "args": [<operand>, <operand>]}}, or a field:
+    {{"field": "price"}} (current tick), {{"field": "prev.price"}} (previous tick),
+    {{"field": "first.price"}} (first tick of the match) or {{"field": "<step name>.price"}}
+    (the last tick matched by that step).
+    Prefer {{"param": ...}} over copying parameter values into the pattern.
+
+    Return a JSON object with `result` as the only key holding the pattern.
+    Please only provide JSON.
+    """
@@ -0,0 +1,370 @@
+import difflib
+import json
+import re
+from collections import Counter
+
+from join import joined_field_names, parse_expression
+from predicates import PredicateError, compile_expression
+
+# Functions `execute` can route a command to
+FUNCTIONS = (
+    "read_adhoc",
+    "read_streaming",
+    "map_direct",
+    "map_generate",
+    "filter_direct",
+    "filter_generate",
+    "accumulate_direct",
+    "accumulate_generate",
+    "pattern_detect",
+    "join_streaming",
+)
+ACCUMULATE_FUNCTIONS = ("accumulate_direct", "accumulate_generate")
+CONFIGURED_FUNCTIONS = ("map_direct", "map_generate", "filter_direct", "filter_generate",
+                        "pattern_detect") + ACCUMULATE_FUNCTIONS
+JOIN_FUNCTION = "join_streaming"
+# Operators join_streaming can run on the joined value
+JOIN_FUNCTIONS = ("read_streaming",) + CONFIGURED_FUNCTIONS
+
+SYMBOL_PATTERN = re.compile(r"\b[A-Z]{2,5}\b")
+NOT_SYMBOLS = {"API", "AVG", "EMA", "SMA", "MAX", "MIN", "USD", "EUR", "GBP", "JPY", "AND", "OR", "NOT",
+               "THE", "FOR", "JSON", "LLM"}
+
+# The one shape every routing answer takes
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "function": {"type": "string", "enum": list(FUNCTIONS)},
+        "symbol": {"type": ["string", "null"], "description": "Stock symbol, e.g. AAAA (null for join_streaming)"},
+        "streaming_operator": {
+            "type": ["string", "null"],
+            "description": "Accumulation for accumulate_* functions (e.g. average, max, stddev), otherwise null",
+        },
+        "description": {
+            "type": ["string", "null"],
+            "description": "What a map, filter or pattern operation does, in the user's words, otherwise null",
+        },
+        "parameters": {
+            "type": "object",
+            "description": "Numeric or string parameters of the operation (e.g. threshold, exchange_rate, window_size)",
+            "additionalProperties": {"type": ["number", "string", "boolean"]},
+        },
+        "symbols": {
+            "type": ["array", "null"],
+            "items": {"type": "string"},
+            "description": "For join_streaming only: the symbols joined by event time, e.g. [\"AAAA\", \"BBBB\"]",
+        },
+        "expression": {
+            "type": ["string", "null"],
+            "description": "For join_streaming only: arithmetic over joined fields, e.g. \"AAAA.price / BBBB.price\"",
+        },
+        "join_function": {
+            "type": ["string", "null"],
+            "enum": list(JOIN_FUNCTIONS) + [None],
+            "description": "For join_streaming only: the operator run on the expression's value "
+                           "(streaming_operator, description and parameters configure it)",
+        },
+    },
+    "required": ["function", "symbol", "streaming_operator", "description", "parameters"],
+    "additionalProperties": False,
+}
+
+# Function-calling tool the routing model must call with a plan
+PLAN_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "route_command",
+        "description": "Run a stream operator for a natural language command",
+        "parameters": PLAN_SCHEMA,
+    },
+}
+
+
+def candidate_symbols(command: str, max_candidates: int = 4) -> list:
+    """Ticker-like words in `command` (e.g. AAAA), most likely symbol first."""
+    candidates = []
+    for word in SYMBOL_PATTERN.findall(command):
+        if word not in NOT_SYMBOLS and word not in candidates:
+            candidates.append(word)
+    # Four-letter tickers are what the simulated feed uses
+    candidates.sort(key=lambda word: len(word) != 4)
+    return candidates[:max_candidates]
+
+
+class PlanError(ValueError):
+    """A routing answer that violates the plan schema beyond local repair."""
+
+    def __init__(self, errors: list):
+        super().__init__("Invalid plan: " + "; ".join(errors))
+        self.errors = errors
+
+
+def _load(content) -> tuple:
+    """The JSON object in `content` and the repairs needed to read it."""
+    if isinstance(content, dict):
+        return content, []
+    try:
+        return json.loads(content), []
+    except json.JSONDecodeError:
+        pass
+    # Plain-text answers (models without tool support, replayed logs) wrap
+    # the JSON in prose; decode the first object and ignore what follows
+    start = content.find("{")
+    if start < 0:
+        raise PlanError(["no JSON object in response"])
+    try:
+        raw, _ = json.JSONDecoder().raw_decode(content, start)
+    except json.JSONDecodeError as e:
+        raise PlanError([f"malformed JSON: {e}"]) from e
+    return raw, ["extracted JSON from prose"]
+
+
+def _symbol(symbol, errors: list, repairs: list):
+    """`symbol` upper-cased without a "$" prefix; an error is recorded if it is not a ticker."""
+    normalized = symbol.strip().lstrip("$").upper()
+    if not SYMBOL_PATTERN.fullmatch(normalized):
+        errors.append(f"invalid symbol '{symbol}'")
+    elif normalized != symbol:
+        repairs.append(f"symbol '{symbol}' -> '{normalized}'")
+    return normalized
+
+
+def _join_expression(expression, symbols: list, errors: list, repairs: list):
+    """Validate a join expression over `symbols`; bare symbols are read as their price."""
+    if not isinstance(expression, str) or not expression.strip():
+        errors.append(f"{JOIN_FUNCTION} needs an expression")
+        return expression
+    if symbols:
+        bare = re.compile(r"\b(" + "|".join(map(re.escape, symbols)) + r")\b(?!\.)")
+        priced = bare.sub(r"\1.price", expression)
+        if priced != expression:
+            repairs.append("read bare symbols in expression as price")
+            expression = priced
+    try:
+        compile_expression(parse_expression(expression), fields=joined_field_names(symbols))
+    except PredicateError as e:
+        errors.append(f"invalid expression '{expression}': {e}")
+    return expression
+
+
+def _number(value):
+    """`value` as an int or float when it is a numeric string, else unchanged."""
+    if not isinstance(value, str):
+        return value
+    text = value.strip().replace(",", "")
+    try:
+        number = float(text)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and "." not in text else number
+
+
+def repair_plan(raw, command: str = None, repairs: list = None) -> dict:
+    """
+    Bring a routing answer into the PLAN_SCHEMA shape, repairing small
+    violations locally instead of asking the model again:
+    - the legacy nestings ({"parameters": {"symbol", "operation_config"}},
+      {"operation_config": {"description", "parameters"}}, {"result": ...});
+    - operation_config sent as a JSON string;
+    - near-miss function names ("map-direct", "accumulate_generated");
+    - lower-case or "$"-prefixed symbols; numbers sent as strings;
+    - a missing symbol when the command names exactly one (for
+      join_streaming, missing symbols when it names several);
+    - bare symbols in a join expression ("AAAA / BBBB" reads prices);
+    - a missing description (the command itself is used).
+
+    Args:
+    - raw: The decoded answer (dict).
+    - command (str): The routed command, used to fill gaps.
+    - repairs (list): If given, receives a description of every repair.
+
+    Returns:
+    - dict: The plan.
+
+    Raises PlanError listing what could not be repaired.
+    """
+    repairs = [] if repairs is None else repairs
+    errors = []
+    if not isinstance(raw, dict):
+        raise PlanError([f"expected a JSON object, got {type(raw).__name__}"])
+    if set(raw) == {"result"} and isinstance(raw["result"], dict):
+        raw = raw["result"]
+        repairs.append("unwrapped result")
+    raw = dict(raw)
+
+    nested = raw.get("parameters")
+    if isinstance(nested, dict) and ({"symbol", "streaming_operator", "operation_config"} & set(nested)):
+        raw.pop("parameters")
+        for key in ("symbol", "streaming_operator", "operation_config", "description", "parameters"):
+            if key in nested and raw.get(key) is None:
+                raw[key] = nested.pop(key)
+        if nested and "parameters" not in raw:
+            raw["parameters"] = nested
+        repairs.append("flattened nested parameters")
+
+    config = raw.pop("operation_config", None)
+    if isinstance(config, str):
+        try:
+            config = json.loads(config)
+            repairs.append("decoded operation_config string")
+        except json.JSONDecodeError:
+            config = {"description": config}
+            repairs.append("used operation_config string as description")
+    if isinstance(config, dict):
+        config = dict(config)
+        if raw.get("description") is None and "description" in config:
+            raw["description"] = config.pop("description")
+        inner = config.pop("parameters", None)
+        parameters = dict(raw.get("parameters") or {})
+        parameters.update(config)
+        if isinstance(inner, dict):
+            parameters.update(inner)
+        raw["parameters"] = parameters
+    elif config is not None:
+        errors.append(f"operation_config must be an object, got {type(config).__name__}")
+
+    function = raw.get("function")
+    if not isinstance(function, str) or not function.strip():
+        errors.append("missing function")
+    else:
+        name = re.sub(r"[\s\-]+", "_", function.strip().lower())
+        if name not in FUNCTIONS:
+            matches = difflib.get_close_matches(name, FUNCTIONS, n=1, cutoff=0.8)
+            if matches:
+                name = matches[0]
+        if name not in FUNCTIONS:
+            errors.append(f"unknown function '{function}'")
+        elif name != function:
+            repairs.append(f"function '{function}' -> '{name}'")
+        function = name
+
+    parameters = raw.get("parameters") or {}
+    if not isinstance(parameters, dict):
+        errors.append(f"parameters must be an object, got {type(parameters).__name__}")
+        parameters = {}
+    symbol = raw.get("symbol")
+    if symbol is None and "symbol" in parameters:
+        symbol = parameters.pop("symbol")
+        repairs.append("moved symbol out of parameters")
+    symbols = raw.get("symbols")
+    if function == JOIN_FUNCTION:
+        if not isinstance(symbols, list) or len(symbols) < 2:
+            named = candidate_symbols(command) if command else []
+            if len(named) >= 2:
+                symbols = named
+                repairs.append("took symbols from the command")
+        if not isinstance(symbols, list) or len(symbols) < 2 \
+                or not all(isinstance(s, str) and s.strip() for s in symbols):
+            errors.append(f"{JOIN_FUNCTION} needs at least two symbols")
+            symbols = []
+        else:
+            symbols = [_symbol(s, errors, repairs) for s in symbols]
+        symbol = None
+    elif not isinstance(symbol, str) or not symbol.strip():
+        named = candidate_symbols(command) if command else []
+        if len(named) == 1:
+            symbol = named[0]
+            repairs.append("took symbol from the command")
+        else:
+            errors.append("missing symbol")
+    if isinstance(symbol, str):
+        symbol = _symbol(symbol, errors, repairs)
+
+    coerced = {key: _number(value) for key, value in parameters.items()}
+    if coerced != parameters:
+        repairs.append("converted numeric strings")
+    parameters = coerced
+    invalid = [key for key, value in parameters.items()
+               if value is not None and not isinstance(value, (int, float, str, bool))]
+    if invalid:
+        errors.append(f"parameters {', '.join(invalid)} are not scalars")
+
+    # The operator that runs on each value: a join runs `join_function` on the joined value
+    operator_function = function
+    if function == JOIN_FUNCTION:
+        operator_function = raw.get("join_function") or "read_streaming"
+        if operator_function not in JOIN_FUNCTIONS:
+            errors.append(f"unknown join_function '{operator_function}'")
+
+    streaming_operator = raw.get("streaming_operator") or parameters.pop("streaming_operator", None)
+    if operator_function in ACCUMULATE_FUNCTIONS \
+            and not (isinstance(streaming_operator, str) and streaming_operator.strip()):
+        errors.append(f"{operator_function} needs a streaming_operator")
+
+    description = raw.get("description")
+    if operator_function in CONFIGURED_FUNCTIONS and operator_function not in ACCUMULATE_FUNCTIONS \
+            and not description:
+        if command:
+            description = command
+            repairs.append("used the command as description")
+        else:
+            errors.append(f"{operator_function} needs a description")
+
+    if function == JOIN_FUNCTION:
+        expression = _join_expression(raw.get("expression"), symbols, errors, repairs)
+
+    if errors:
+        raise PlanError(errors)
+    plan = {
+        "function": function,
+        "symbol": symbol,
+        "streaming_operator": streaming_operator if operator_function in ACCUMULATE_FUNCTIONS else None,
+        "description": description,
+        "parameters": parameters,
+    }
+    if function == JOIN_FUNCTION:
+        plan.update(symbols=symbols, expression=expression, join_function=operator_function)
+    return plan
+
+
+def parse_plan(content, command: str = None, repairs: list = None) -> dict:
+    """Parse and repair a routing response (tool call arguments or text)."""
+    repairs = [] if repairs is None else repairs
+    raw, loaded_repairs = _load(content)
+    repairs.extend(loaded_repairs)
+    return repair_plan(raw, command, repairs)
+
+
+def plan_parser(command: str, repairs: list):
+    """A gateway parser for routing `command`; repairs it makes are appended to `repairs`."""
+    def parse_plan_response(content) -> dict:
+        del repairs[:]  # Only the accepted response's repairs count
+        return parse_plan(content, command, repairs)
+
+    # Recorded under the name llm_gateway.PARSERS replays it with
+    parse_plan_response.__name__ = "parse_plan"
+    # The gateway escalates heavily repaired plans, as tool calls carry no logprobs
+    parse_plan_response.repairs = repairs
+    return parse_plan_response
+
+
+def operation_config_for(plan: dict) -> dict:
+    """The operation_config the plan's operator builder takes (for a join, the joined operator's)."""
+    function = plan["join_function"] if plan["function"] == JOIN_FUNCTION else plan["function"]
+    # accumulate_native (hosted by the operator server, never routed) takes flat parameters too
+    if function in ACCUMULATE_FUNCTIONS or function == "accumulate_native":
+        return dict(plan["parameters"])
+    return {"description": plan["description"], "parameters": dict(plan["parameters"])}
+
+
+class RoutingStats:
+    """LLM attempts and local repairs per routed command."""
+
+    def __init__(self):
+        self.commands = 0
+        self.attempts = 0
+        self.failures = 0
+        self.repairs = Counter()
+
+    def record(self, attempts: int, repairs: list, failed: bool = False):
+        self.commands += 1
+        self.attempts += attempts
+        self.failures += int(failed)
+        self.repairs.update(re.sub(r" '.*", "", repair) for repair in repairs)
+
+    def format_stats(self) -> str:
+        retries = self.attempts - self.commands
+        repairs = ", ".join(f"{name} x{count}" for name, count in self.repairs.most_common()) or "none"
+        return (f"Routing: {self.commands} command(s), {retries} retries "
+                f"({retries / max(self.commands, 1):.2f} per command), {self.failures} failed; "
+                f"local repairs: {repairs}")
@@ -0,0 +1,195 @@
+# Structured predicate specs and a local evaluator.
+#
+# A spec is plain JSON so an LLM can produce it once per operation_config:
+#
+#     {"cmp": "<", "left": {"field": "price"}, "right": {"param": "threshold"}}
+#     {"all": [<spec>, <spec>]}      # boolean AND
+#     {"any": [<spec>, <spec>]}      # boolean OR
+#     {"not": <spec>}
+#
+# Operands are numbers, {"field": name}, {"param": name} (looked up in the
+# operation parameters), or arithmetic {"op": "+|-|*|/", "args": [a, b, ...]}.
+# Specs compile to plain closures that take a record and return a bool; the
+# same spec also evaluates a dict of NumPy columns to a boolean mask.
+import json
+import math
+import operator
+
+import numpy as np
+
+COMPARATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+# The comparison that holds exactly when another does not (for non-NaN operands)
+NEGATED = {"<": ">=", "<=": ">", ">": "<=", ">=": "<", "==": "!=", "!=": "=="}
+
+
+def _divide(a, b):
+    # Division by zero yields NaN (never matches) instead of raising mid-stream
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(b == 0, np.nan, np.true_divide(a, b))
+    return a / b if b else math.nan
+
+
+ARITHMETIC = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _divide,
+}
+
+TICK_FIELD_NAMES = ("price", "volume", "bid", "ask", "movement", "timestamp")
+
+
+class PredicateError(ValueError):
+    """Raised when a predicate spec is malformed."""
+
+
+def _compile_operand(operand, params: dict, fields):
+    if isinstance(operand, bool):
+        raise PredicateError(f"Boolean is not a valid operand: {operand!r}")
+    if isinstance(operand, (int, float)):
+        value = float(operand)
+        return lambda record: value
+    if not isinstance(operand, dict):
+        raise PredicateError(f"Invalid operand: {operand!r}")
+
+    if "field" in operand:
+        name = operand["field"]
+        if fields is not None and name not in fields:
+            raise PredicateError(f"Unknown field '{name}'")
+        return lambda record: record[name]
+    if "param" in operand:
+        name = operand["param"]
+        if name not in params:
+            raise PredicateError(f"Unknown parameter '{name}'")
+        try:
+            value = float(params[name])
+        except (TypeError, ValueError) as e:
+            raise PredicateError(f"Parameter '{name}' is not numeric") from e
+        return lambda record: value
+    if "op" in operand:
+        op = ARITHMETIC.get(operand["op"])
+        args = operand.get("args", [])
+        if op is None or len(args) < 2:
+            raise PredicateError(f"Invalid arithmetic operand: {operand!r}")
+        compiled = [_compile_operand(arg, params, fields) for arg in args]
+
+        def evaluate(record):
+            result = compiled[0](record)
+            for arg in compiled[1:]:
+                result = op(result, arg(record))
+            return result
+        return evaluate
+    raise PredicateError(f"Invalid operand: {operand!r}")
+
+
+def _compile(spec, params: dict, fields, columnar: bool, negate: bool = False):
+    # `negate` pushes a "not" down to the comparisons (De Morgan), so it
+    # cannot turn a comparison against NaN into a match
+    if not isinstance(spec, dict):
+        raise PredicateError(f"Invalid predicate: {spec!r}")
+
+    if "all" in spec or "any" in spec:
+        key = "all" if "all" in spec else "any"
+        parts = [_compile(part, params, fields, columnar, negate) for part in spec[key]]
+        if not parts:
+            raise PredicateError(f"'{key}' needs at least one predicate")
+        conjunction = (key == "all") != negate
+        if columnar:
+            reduce = np.logical_and.reduce if conjunction else np.logical_or.reduce
+            return lambda record: reduce([part(record) for part in parts])
+        combine = all if conjunction else any
+        return lambda record: combine(part(record) for part in parts)
+    if "not" in spec:
+        return _compile(spec["not"], params, fields, columnar, not negate)
+    if "cmp" in spec:
+        if spec["cmp"] not in COMPARATORS:
+            raise PredicateError(f"Unknown comparison '{spec['cmp']}'")
+        cmp = COMPARATORS[NEGATED[spec["cmp"]] if negate else spec["cmp"]]
+        left = _compile_operand(spec.get("left"), params, fields)
+        right = _compile_operand(spec.get("right"), params, fields)
+        # A NaN operand (an Absent field, a division by zero) fails every
+        # comparison, "!=" and negated ones included, so it never matches
+        if columnar:
+            def compare_columns(record):
+                a, b = left(record), right(record)
+                with np.errstate(invalid="ignore"):
+                    return cmp(a, b) & ~np.isnan(a) & ~np.isnan(b)
+            return compare_columns
+
+        def compare(record):
+            a, b = left(record), right(record)
+            return a == a and b == b and cmp(a, b)
+        return compare
+    raise PredicateError(f"Invalid predicate: {spec!r}")
+
+
+def compile_predicate(spec: dict, params: dict = None, fields=TICK_FIELD_NAMES):
+    """
+    Compile `spec` into `predicate(record) -> bool`, where `record` is
+    anything indexable by field name (a dict or a `Tick`).
+
+    Pass `fields=None` to allow arbitrary field names (e.g. joined records).
+    """
+    return _compile(spec, params or {}, fields, columnar=False)
+
+
+def compile_columnar_predicate(spec: dict, params: dict = None, fields=TICK_FIELD_NAMES):
+    """
+    Compile `spec` into `predicate(columns) -> np.ndarray[bool]`, where
+    `columns` maps field names to equal-length arrays (`TickColumns.columns()`).
+    """
+    return _compile(spec, params or {}, fields, columnar=True)
+
+
+def compile_expression(operand, params: dict = None, fields=None):
+    """Compile a bare operand (e.g. a ratio of two fields) into `value(record)`."""
+    return _compile_operand(operand, params or {}, fields)
+
+
+def _referenced(spec, kind: str) -> set:
+    if isinstance(spec, dict):
+        if kind in spec:
+            return {spec[kind]}
+        return set().union(*(_referenced(value, kind) for value in spec.values()))
+    if isinstance(spec, list):
+        return set().union(*(_referenced(value, kind) for value in spec))
+    return set()
+
+
+def referenced_params(spec) -> set:
+    """Names of the {"param": name} operands anywhere in a spec or operand."""
+    return _referenced(spec, "param")
+
+
+def referenced_fields(spec) -> set:
+    """Names of the {"field": name} operands anywhere in a spec or operand."""
+    return _referenced(spec, "field")
+
+
+def predicate_prompt(description: str, parameters: dict) -> str:
+    """Prompt asking the LLM to translate a filter description into a spec."""
+    return f"""
+    Translate the following stream filter into a structured predicate.
+    Filter description: {description}
+    Filter parameters: {json.dumps(parameters)}
+
+    Each tick has numeric fields: {", ".join(TICK_FIELD_NAMES)}.
+    A predicate is one of:
+    - {{"cmp": "<" | "<=" | ">" | ">=" | "==" | "!=", "left": <operand>, "right": <operand>}}
+    - {{"all": [<predicate>, ...]}} for AND, {{"any": [<predicate>, ...]}} for OR
+    - {{"not": <predicate>}}
+    An operand is a number, {{"field": "<tick field>"}}, {{"param": "<parameter name>"}},
+    or {{"op": "+" | "-" | "*" | "/", "args": [<operand>, <operand>]}}.
+    Prefer {{"param": ...}} over copying parameter values into the predicate.
+
+    Return a JSON object with `result` as the only key holding the predicate.
+    Please only provide JSON.
+    """
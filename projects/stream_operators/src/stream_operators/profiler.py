@@ -0,0 +1,163 @@
+import timeit
+import tracemalloc
+
+from ticks import synthetic_records
+
+
+class ProfileBudget:
+    """
+    Limits a generated operator must stay within to be accepted.
+
+    - max_us_per_call: steady-state time per tick at the largest window.
+    - max_scaling: allowed growth of per-call time from the smallest to the
+      largest window; constant-time operators stay near 1.
+    - max_growth_bytes_per_tick: memory an operator may keep accumulating
+      per tick while the stream runs at a fixed window (a bounded operator
+      stays near 0; keeping every value costs ~30 B per tick).
+    """
+
+    def __init__(self, max_us_per_call: float = 50.0, max_scaling: float = 4.0,
+                 max_growth_bytes_per_tick: float = 8.0):
+        self.max_us_per_call = max_us_per_call
+        self.max_scaling = max_scaling
+        self.max_growth_bytes_per_tick = max_growth_bytes_per_tick
+
+
+class ProfileReport:
+    """Measurements for one operator and the verdict against a budget."""
+
+    def __init__(self, kind: str, budget: ProfileBudget):
+        self.kind = kind
+        self.budget = budget
+        # (window_size, us_per_call, retained_bytes, growth_bytes) per window:
+        # retained while filling the window, growth once it is full
+        self.rows = []
+        self.scaling = 1.0
+        self.reasons = []
+
+    @property
+    def accepted(self) -> bool:
+        return not self.reasons
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "accepted": self.accepted,
+            "scaling": self.scaling,
+            "reasons": self.reasons,
+            "windows": [
+                {"window_size": w, "us_per_call": us, "retained_bytes": retained, "growth_bytes": growth}
+                for w, us, retained, growth in self.rows
+            ],
+        }
+
+    def format(self) -> str:
+        lines = [f"Profile for generated {self.kind} operator: "
+                 f"{'accepted' if self.accepted else 'rejected'}"]
+        for w, us, retained, growth in self.rows:
+            lines.append(f"  window {w:>6}: {us:8.2f} us/call, {retained:>8} B retained, "
+                         f"{growth:>8} B growth")
+        lines.append(f"  scaling (largest/smallest window): {self.scaling:.2f}x")
+        lines.extend(f"  - {reason}" for reason in self.reasons)
+        return "\n".join(lines)
+
+
+def _make_step(func, kind: str, params: dict, window_size: int):
+    """Adapt the generated signatures to one `step(price)` call per tick."""
+    if kind == "accumulate":
+        windowed = {**params, "window_size": window_size}
+        state = {"acc": {}}
+
+        def step(price):
+            state["acc"], _ = func(state["acc"], price, windowed)
+        return step
+
+    def step(price):
+        func(price, params)
+    return step
+
+
+def _retained_bytes(run, prices) -> int:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        run(prices)
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def profile_operator(func, kind: str, params: dict, budget: ProfileBudget = None,
+                     window_sizes=(10, 100, 1000), ticks: int = 2000, repeats: int = 5) -> ProfileReport:
+    """
+    Microbenchmark a generated operator on a synthetic tick stream.
+
+    For each window size the operator is warmed up for `2 * window_size`
+    ticks, with memory traced to measure the state it retains, then timed
+    over `ticks` ticks `repeats` times; the fastest run counts, so
+    scheduling noise does not read as super-constant scaling. A last
+    traced run of `ticks` ticks at the full window detects growth that
+    does not level off.
+
+    Args:
+    - func: The generated function (`func(new_value, params)` for map and
+      filter, `func(acc, new_value, params)` for accumulate).
+    - kind (str): "map", "filter" or "accumulate".
+    - params (dict): Parameters passed to the operator.
+    - budget (ProfileBudget): Limits to accept against.
+
+    Returns:
+    - ProfileReport: Per-window measurements and the verdict.
+    """
+    budget = budget or ProfileBudget()
+    report = ProfileReport(kind, budget)
+    if kind != "accumulate":
+        # Stateless operators have no window; one size is enough
+        window_sizes = window_sizes[:1]
+
+    records = synthetic_records(ticks + 2 * max(window_sizes))
+    prices = [record["price"] for record in records]
+
+    for window_size in window_sizes:
+        step = _make_step(func, kind, params, window_size)
+
+        def run(batch):
+            for price in batch:
+                step(price)
+
+        try:
+            retained = _retained_bytes(run, prices[:2 * window_size])
+            measured = prices[2 * window_size:2 * window_size + ticks]
+            best = min(timeit.repeat(lambda: run(measured), number=1, repeat=repeats))
+            us_per_call = best / len(measured) * 1e6
+            growth = _retained_bytes(run, measured)
+        except Exception as e:
+            report.reasons.append(f"raised {type(e).__name__} at window {window_size}: {e}")
+            return report
+        report.rows.append((window_size, us_per_call, retained, growth))
+
+    smallest, largest = report.rows[0], report.rows[-1]
+    report.scaling = largest[1] / smallest[1] if smallest[1] > 0 else 1.0
+
+    if largest[1] > budget.max_us_per_call:
+        report.reasons.append(f"{largest[1]:.1f} us per call exceeds the "
+                              f"{budget.max_us_per_call:.1f} us budget")
+    if report.scaling > budget.max_scaling:
+        report.reasons.append(f"per-call time grows {report.scaling:.1f}x with window size "
+                              f"(super-constant; limit {budget.max_scaling:.1f}x)")
+    growth_per_tick = max(row[3] for row in report.rows) / ticks
+    if growth_per_tick > budget.max_growth_bytes_per_tick:
+        report.reasons.append(f"memory keeps growing by {growth_per_tick:.1f} B per tick "
+                              f"(limit {budget.max_growth_bytes_per_tick:.1f} B)")
+    return report
+
+
+def rejection_feedback(report: ProfileReport) -> str:
+    """Prompt addendum asking the LLM to fix what the profiler rejected."""
+    reasons = "; ".join(report.reasons)
+    return f"""
+    A previous implementation was rejected by a performance check: {reasons}.
+    Keep the per-call work O(1) with respect to the window size (for example
+    maintain running sums and use collections.deque instead of slicing lists
+    and calling sum() on every value) and do not keep unbounded history.
+    """
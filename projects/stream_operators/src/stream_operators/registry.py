@@ -0,0 +1,202 @@
+import re
+
+import operators
+
+
+class Param:
+    """Schema for one operator parameter, with the names it may arrive under."""
+
+    def __init__(self, name: str, type_, default=None, aliases=(), check=None, doc: str = ""):
+        self.name = name
+        self.type = type_
+        self.default = default
+        self.aliases = (name,) + tuple(aliases)
+        self.check = check
+        self.doc = doc
+
+    def bind(self, config: dict):
+        for alias in self.aliases:
+            if config.get(alias) is not None:
+                try:
+                    value = self.type(config[alias])
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f"Parameter '{self.name}' must be {self.type.__name__}") from e
+                if self.check is not None and not self.check(value):
+                    raise ValueError(f"Invalid value for parameter '{self.name}': {value!r} ({self.doc})")
+                return value
+        return self.default
+
+
+class NativeOperator:
+    """
+    A hand-written accumulator from `operators.py`, exposed under the
+    generated-code signature `step(acc, new_value, params) -> (acc, result)`
+    so it can stand in for LLM codegen. The initial accumulator is None.
+    """
+
+    def __init__(self, name: str, step, aliases=(), params=(), description: str = "", keeps_state=None):
+        self.name = name
+        self.step = step
+        self.aliases = tuple(aliases)
+        self.params = tuple(params)
+        self.description = description
+        self._keeps_state = keeps_state
+
+    def bind(self, operation_config: dict) -> dict:
+        """Resolve this operator's parameters from an accumulate operation_config."""
+        operation_config = operation_config or {}
+        # Accept both {"window_size": 5} and {"parameters": {"window_size": 5}}
+        config = {**operation_config.get("parameters", {}), **operation_config}
+        return {param.name: param.bind(config) for param in self.params}
+
+    def keeps_state(self, old_params: dict, new_params: dict) -> bool:
+        """Whether an accumulator built under `old_params` can keep stepping under `new_params`."""
+        return self._keeps_state is None or self._keeps_state(old_params, new_params)
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "aliases": list(self.aliases),
+            "params": {p.name: {"type": p.type.__name__, "default": p.default, "doc": p.doc}
+                       for p in self.params},
+            "description": self.description,
+        }
+
+
+def _mean_step(acc, x, params):
+    window_size = params["window_size"]
+    if window_size is None:
+        # No window: cumulative mean (what operators.ema computes)
+        return operators.ema(acc, x)
+    return operators.windowed_mean(acc, x, window_size)
+
+
+def _same_mean_kind(old_params, new_params):
+    # Windowed and cumulative means keep different accumulators; window sizes can change
+    return (old_params["window_size"] is None) == (new_params["window_size"] is None)
+
+
+def _ewma_step(acc, x, params):
+    alpha = params["alpha"]
+    if alpha is None:
+        span = params["window_size"] or 10
+        alpha = 2.0 / (span + 1)
+    return operators.ewma(acc, x, alpha)
+
+
+def _quantile_step(q):
+    def step(acc, x, params):
+        target = q if q is not None else params["q"]
+        if params["sketch"] == "kll":
+            return operators.quantile(acc, x, target, params["k"])
+        return operators.p2_quantile(acc, x, target)
+    return step
+
+
+def _same_sketch(old_params, new_params):
+    # A P² marker set tracks one quantile; a KLL sketch answers any quantile
+    return (old_params["sketch"] == new_params["sketch"] and old_params["k"] == new_params["k"]
+            and (new_params["sketch"] == "kll" or old_params.get("q") == new_params.get("q")))
+
+
+def _fraction(value) -> float:
+    # Accept 0.95 as well as 95 (percent)
+    value = float(value)
+    return value / 100.0 if value > 1 else value
+
+
+WINDOW_SIZE = Param("window_size", int, None, aliases=("window", "period", "size", "n"),
+                    check=lambda v: v > 0, doc="positive number of values")
+
+QUANTILE_PARAMS = (
+    Param("sketch", str, "p2", aliases=("method", "algorithm"),
+          check=lambda v: v in ("p2", "kll"),
+          doc="p2 (constant memory, O(1) per value) or kll (mergeable, rank error ~2.3/k**0.97)"),
+    Param("k", int, 200, aliases=("sketch_size",), check=lambda v: v >= 8, doc="KLL size, at least 8"),
+)
+
+REGISTRY = [
+    NativeOperator(
+        "sma", _mean_step,
+        aliases=("avg", "average", "mean", "moving average", "simple moving average",
+                 "rolling average", "rolling mean", "running average", "running mean",
+                 "cumulative average", "windowed average"),
+        params=(WINDOW_SIZE,),
+        description="Mean over the last window_size values, or of all values without a window",
+        keeps_state=_same_mean_kind),
+    NativeOperator(
+        "ema", _ewma_step,
+        aliases=("ewma", "exponential moving average", "exponentially weighted moving average",
+                 "exponential average"),
+        params=(Param("alpha", float, None, aliases=("smoothing",),
+                      check=lambda v: 0 < v <= 1, doc="smoothing factor in (0, 1]"),
+                WINDOW_SIZE),
+        description="Exponentially weighted mean; alpha defaults to 2 / (window_size + 1)"),
+    NativeOperator(
+        "variance", lambda acc, x, params: operators.variance(acc, x),
+        aliases=("var", "sample variance"),
+        description="Sample variance (Welford)"),
+    NativeOperator(
+        "stddev", lambda acc, x, params: operators.stddev(acc, x),
+        aliases=("std", "stdev", "std dev", "standard deviation", "sample standard deviation"),
+        description="Sample standard deviation (Welford)"),
+    NativeOperator(
+        "min", lambda acc, x, params: operators.running_min(acc, x),
+        aliases=("minimum", "lowest", "low", "running min", "running minimum"),
+        description="Minimum so far"),
+    NativeOperator(
+        "max", lambda acc, x, params: operators.running_max(acc, x),
+        aliases=("maximum", "highest", "high", "running max", "running maximum"),
+        description="Maximum so far"),
+    NativeOperator(
+        "median", _quantile_step(0.5),
+        aliases=("running median", "streaming median", "p50", "50th percentile"),
+        params=QUANTILE_PARAMS,
+        description="Approximate median of all values in bounded memory",
+        keeps_state=_same_sketch),
+    NativeOperator(
+        "p95", _quantile_step(0.95),
+        aliases=("95th percentile", "95 percentile", "percentile 95"),
+        params=QUANTILE_PARAMS,
+        description="Approximate 95th percentile of all values in bounded memory",
+        keeps_state=_same_sketch),
+    NativeOperator(
+        "p99", _quantile_step(0.99),
+        aliases=("99th percentile", "99 percentile", "percentile 99"),
+        params=QUANTILE_PARAMS,
+        description="Approximate 99th percentile of all values in bounded memory",
+        keeps_state=_same_sketch),
+    NativeOperator(
+        "quantile", _quantile_step(None),
+        aliases=("percentile", "running quantile", "running percentile", "streaming quantile"),
+        params=(Param("q", _fraction, 0.5, aliases=("quantile", "percentile", "p"),
+                      check=lambda v: 0 <= v <= 1, doc="quantile in [0, 1] or percent"),)
+               + QUANTILE_PARAMS,
+        description="Approximate quantile q of all values in bounded memory",
+        keeps_state=_same_sketch),
+]
+
+_BY_ALIAS = {}
+
+
+def normalize_operator_name(name: str) -> str:
+    """Lower-case, treat -/_ as spaces and collapse whitespace."""
+    return re.sub(r"\s+", " ", re.sub(r"[-_]", " ", name.lower())).strip()
+
+
+def register(native_operator: NativeOperator):
+    if native_operator not in REGISTRY:
+        REGISTRY.append(native_operator)
+    for alias in (native_operator.name,) + native_operator.aliases:
+        _BY_ALIAS[normalize_operator_name(alias)] = native_operator
+
+
+def resolve_operator(streaming_operator: str):
+    """Return the NativeOperator matching `streaming_operator`, or None if it is novel."""
+    if not streaming_operator:
+        return None
+    return _BY_ALIAS.get(normalize_operator_name(streaming_operator))
+
+
+for _native_operator in list(REGISTRY):
+    register(_native_operator)
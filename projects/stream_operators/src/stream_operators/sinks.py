@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+SCALAR_TYPES = (str, int, float, bool)
+
+
+class Sink(ABC):
+    """
+    Destination for operator results. Callbacks hand each result record
+    (a dict) to `write`; sinks decide when and how it is emitted.
+    """
+
+    @abstractmethod
+    def write(self, record: dict):
+        """Accept one result record."""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class BufferedSink(Sink):
+    """
+    Sink that buffers records and emits them in batches from a background
+    thread, so downlink callbacks never block on I/O.
+
+    A batch is flushed when `batch_size` records are pending or every
+    `flush_interval` seconds, whichever comes first. At most `max_pending`
+    records are buffered; if the destination falls behind, the oldest are
+    dropped (and counted in `dropped`) in favour of fresh ones.
+    """
+
+    def __init__(self, batch_size: int = 256, flush_interval: float = 0.5, max_pending: int = 65536):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict):
+        with self._lock:
+            if len(self._buffer) >= self.max_pending:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(record)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, deque()
+        with self._flush_lock:
+            if batch:
+                self._flush_batch(list(batch))
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._close()
+        if self.dropped:
+            print(f"{type(self).__name__}: dropped {self.dropped} results over the "
+                  f"{self.max_pending}-record buffer", flush=True)
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    @abstractmethod
+    def _flush_batch(self, batch: list):
+        """Emit a batch of records, oldest first."""
+
+    def _close(self):
+        pass
+
+
+class JsonlFileSink(BufferedSink):
+    """
+    Append records to a JSON Lines file, rotating it once it exceeds
+    `max_bytes` (path -> path.1 -> ... -> path.`backup_count`).
+
+    With `columnar=True` each flushed batch is written as a single line of
+    the form {"columns": {field: [values...]}}, which is cheaper to write
+    and to load into dataframes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, backup_count: int = 5,
+                 columnar: bool = False, **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.columnar = columnar
+        self._file = open(path, "a", encoding="utf-8")
+        super().__init__(**kwargs)
+
+    def _encode(self, batch: list) -> str:
+        if not self.columnar:
+            return "".join(json.dumps(record, default=str) + "\n" for record in batch)
+        columns = {}
+        for i, record in enumerate(batch):
+            for key, value in record.items():
+                # Pad fields that first appear mid-batch so columns stay aligned
+                columns.setdefault(key, [None] * i).append(value)
+            for key, values in columns.items():
+                if len(values) == i:
+                    values.append(None)
+        return json.dumps({"columns": columns}, default=str) + "\n"
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _flush_batch(self, batch: list):
+        data = self._encode(batch)
+        if self._file.tell() > 0 and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class RingBufferSink(Sink):
+    """Keep the most recent `capacity` records in memory."""
+
+    def __init__(self, capacity: int = 1000):
+        self._records = deque(maxlen=capacity)
+
+    def write(self, record: dict):
+        self._records.append(record)
+
+    def records(self) -> list:
+        """Snapshot of the buffered records, oldest first."""
+        return list(self._records)
+
+
+def _lane_record(record: dict) -> dict:
+    # swimos converts dicts to records field by field and cannot convert
+    # lists or nested objects, so those travel as JSON strings
+    return {key: value if value is None or isinstance(value, SCALAR_TYPES) else json.dumps(value, default=str)
+            for key, value in record.items()}
+
+
+class SwimLaneSink(BufferedSink):
+    """Publish records to a Swim command lane; non-scalar fields are sent as JSON strings."""
+
+    def __init__(self, swim_client, host_uri: str, node_uri: str, lane_uri: str, **kwargs):
+        self.swim_client = swim_client
+        self.host_uri = host_uri
+        self.node_uri = node_uri
+        self.lane_uri = lane_uri
+        super().__init__(**kwargs)
+
+    def _flush_batch(self, batch: list):
+        for record in batch:
+            self.swim_client.command(self.host_uri, self.node_uri, self.lane_uri, _lane_record(record))
+
+
+class ConsoleSink(BufferedSink):
+    """
+    Print records to the terminal, at most `max_per_second` lines per
+    second. Records over the limit are counted and summarized instead of
+    printed, so a fast feed cannot make terminal I/O the bottleneck.
+    """
+
+    def __init__(self, max_per_second: int = 10, **kwargs):
+        self.max_per_second = max_per_second
+        self._window_start = time.monotonic()
+        self._printed = 0
+        self._suppressed = 0
+        kwargs.setdefault("flush_interval", 0.25)
+        super().__init__(**kwargs)
+
+    def _flush_batch(self, batch: list):
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._report_suppressed()
+            self._window_start = now
+            self._printed = 0
+
+        budget = max(self.max_per_second - self._printed, 0)
+        # Over the limit, show the newest records and summarize the older ones
+        shown = batch[len(batch) - budget:] if budget else []
+        lines = [record.get("message") or json.dumps(record, default=str) for record in shown]
+        if lines:
+            print("\n".join(lines), flush=True)
+        self._printed += len(lines)
+        self._suppressed += len(batch) - len(lines)
+
+    def _report_suppressed(self):
+        if self._suppressed:
+            print(f"... {self._suppressed} results not shown (console limited to "
+                  f"{self.max_per_second}/s)", flush=True)
+            self._suppressed = 0
+
+    def _close(self):
+        self._report_suppressed()
+
+
+SINK_HELP = ("Where to send results: console[:max_per_second], jsonl:<path>, "
+             "columnar:<path>, ring[:capacity] or swim:<node_uri>/<lane_uri>")
+
+
+def make_sink(spec: str, swim_client=None, host_uri: str = None) -> Sink:
+    """
+    Build a sink from a command-line spec such as "console:5",
+    "jsonl:results.jsonl", "ring:500" or "swim:/results/AAAA/alerts".
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "console":
+        return ConsoleSink(int(arg)) if arg else ConsoleSink()
+    if kind in ("jsonl", "columnar"):
+        if not arg:
+            raise ValueError(f"Sink '{kind}' requires a file path, e.g. {kind}:results.jsonl")
+        return JsonlFileSink(arg, columnar=kind == "columnar")
+    if kind == "ring":
+        return RingBufferSink(int(arg)) if arg else RingBufferSink()
+    if kind == "swim":
+        node_uri, _, lane_uri = arg.rpartition("/")
+        if not node_uri or not lane_uri or swim_client is None:
+            raise ValueError("Sink 'swim' requires a node and lane, e.g. swim:/results/AAAA/alerts")
+        return SwimLaneSink(swim_client, host_uri, node_uri, lane_uri)
+    raise ValueError(f"Unknown sink '{spec}'. {SINK_HELP}")
@@ -0,0 +1,370 @@
+import os
+import threading
+
+import numpy as np
+
+from registry import resolve_operator
+
+
+class StateKernel:
+    """
+    Vectorized form of a native accumulator.
+
+    `fields` maps each accumulator field to (dtype, shape, initial value);
+    `step(columns, slots, values)` updates the rows at `slots` in place for
+    one value each (slots are unique within a call) and returns the
+    results, NaN where the scalar operator returns None.
+    """
+
+    def __init__(self, name: str, fields: dict, step):
+        self.name = name
+        self.fields = fields
+        self.step = step
+
+
+def _mean_kernel(params: dict) -> StateKernel:
+    window_size = params.get("window_size")
+    if window_size is None:
+        # Cumulative mean, as operators.ema computes it
+        def step(c, slots, x):
+            count = c["count"][slots] + 1
+            mean = c["mean"][slots]
+            mean += (x - mean) / count
+            c["count"][slots] = count
+            c["mean"][slots] = mean
+            return mean
+        return StateKernel("sma", {"count": (np.int64, (), 0), "mean": (np.float64, (), 0.0)}, step)
+
+    def step(c, slots, x):
+        head = c["head"][slots]
+        count = c["count"][slots]
+        evicted = np.where(count >= window_size, c["window"][slots, head], 0.0)
+        total = c["total"][slots] + x - evicted
+        c["window"][slots, head] = x
+        c["head"][slots] = (head + 1) % window_size
+        count = np.minimum(count + 1, window_size)
+        c["count"][slots] = count
+        c["total"][slots] = total
+        return total / count
+    return StateKernel("sma", {"window": (np.float64, (window_size,), 0.0), "head": (np.int64, (), 0),
+                               "count": (np.int64, (), 0), "total": (np.float64, (), 0.0)}, step)
+
+
+def _ewma_kernel(params: dict) -> StateKernel:
+    alpha = params.get("alpha")
+    if alpha is None:
+        alpha = 2.0 / ((params.get("window_size") or 10) + 1)
+
+    def step(c, slots, x):
+        value = c["value"][slots]
+        value = np.where(np.isnan(value), x, value + alpha * (x - value))
+        c["value"][slots] = value
+        return value
+    return StateKernel("ema", {"value": (np.float64, (), np.nan)}, step)
+
+
+def _welford_kernel(name: str, sqrt: bool):
+    def factory(params: dict) -> StateKernel:
+        def step(c, slots, x):
+            n = c["n"][slots] + 1
+            mean = c["mean"][slots]
+            delta = x - mean
+            mean = mean + delta / n
+            m2 = c["m2"][slots] + delta * (x - mean)
+            c["n"][slots], c["mean"][slots], c["m2"][slots] = n, mean, m2
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = np.where(n < 2, np.nan, m2 / (n - 1))
+            return np.sqrt(result) if sqrt else result
+        return StateKernel(name, {"n": (np.int64, (), 0), "mean": (np.float64, (), 0.0),
+                                  "m2": (np.float64, (), 0.0)}, step)
+    return factory
+
+
+def _extreme_kernel(name: str, ufunc, initial: float):
+    def factory(params: dict) -> StateKernel:
+        def step(c, slots, x):
+            value = ufunc(c["value"][slots], x)
+            c["value"][slots] = value
+            return value
+        return StateKernel(name, {"value": (np.float64, (), initial)}, step)
+    return factory
+
+
+# Registry operator name -> kernel factory taking the bound parameters
+KERNELS = {
+    "sma": _mean_kernel,
+    "ema": _ewma_kernel,
+    "variance": _welford_kernel("variance", sqrt=False),
+    "stddev": _welford_kernel("stddev", sqrt=True),
+    "min": _extreme_kernel("min", np.minimum, np.inf),
+    "max": _extreme_kernel("max", np.maximum, -np.inf),
+}
+
+
+def kernel_for(streaming_operator: str, operation_config: dict = None):
+    """The vectorized kernel for a registry operator, or None if it has none."""
+    native_operator = resolve_operator(streaming_operator)
+    if native_operator is None or native_operator.name not in KERNELS:
+        return None
+    return KERNELS[native_operator.name](native_operator.bind(operation_config or {}))
+
+
+def _allocate(fields: dict, capacity: int, path: str = None) -> dict:
+    columns = {}
+    for name, (dtype, shape, initial) in fields.items():
+        if path is None:
+            columns[name] = np.full((capacity,) + shape, initial, dtype=dtype)
+        else:
+            column_path = os.path.join(path, f"{name}.bin")
+            row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+            existing = os.path.getsize(column_path) // row_bytes if os.path.exists(column_path) else 0
+            with open(column_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            column = np.memmap(column_path, dtype=dtype, mode="r+", shape=(capacity,) + shape)
+            column[existing:] = initial
+            columns[name] = column
+    return columns
+
+
+class _SpillFile:
+    """Accumulator rows of evicted symbols, in memory-mapped column files."""
+
+    def __init__(self, fields: dict, path: str, capacity: int = 1024):
+        os.makedirs(path, exist_ok=True)
+        self.fields = fields
+        self.path = path
+        self.capacity = capacity
+        self.rows = {}
+        self.free = []
+        self.columns = _allocate(fields, capacity, path)
+
+    def write(self, keys, columns: dict, slots: np.ndarray):
+        rows = []
+        for key in keys:
+            row = self.rows.get(key)
+            if row is None:
+                row = self.free.pop() if self.free else len(self.rows)
+                self.rows[key] = row
+            rows.append(row)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) and rows.max() >= self.capacity:
+            self.capacity = max(self.capacity * 2, int(rows.max()) + 1)
+            for column in self.columns.values():
+                column.flush()
+            self.columns = _allocate(self.fields, self.capacity, self.path)
+        for name, column in self.columns.items():
+            column[rows] = columns[name][slots]
+
+    def take(self, key) -> dict:
+        """Remove and return the spilled row of `key`, or None."""
+        row = self.rows.pop(key, None)
+        if row is None:
+            return None
+        self.free.append(row)
+        return {name: np.array(column[row]) for name, column in self.columns.items()}
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+
+
+class ColumnarStateStore:
+    """
+    Accumulator state for many symbols in contiguous NumPy columns.
+
+    Each symbol owns one row ("slot") of every field column; a dict maps
+    symbols to slots. `update` applies a batch of ticks across symbols with
+    one vectorized kernel call per occurrence rank (a symbol that appears k
+    times in a batch is updated in k ordered passes), so results match the
+    scalar operator tick for tick.
+
+    With `max_symbols`, the least recently updated symbols are evicted when
+    the store is full; with `spill_path`, their rows are written to
+    memory-mapped files and restored when the symbol returns, otherwise
+    their state restarts empty.
+    """
+
+    def __init__(self, kernel: StateKernel, capacity: int = 1024, max_symbols: int = None,
+                 spill_path: str = None):
+        self.kernel = kernel
+        self.capacity = max(capacity if max_symbols is None else min(capacity, max_symbols), 1)
+        self.max_symbols = max_symbols
+        self.columns = _allocate(kernel.fields, self.capacity)
+        self.last_used = np.zeros(self.capacity, dtype=np.int64)
+        self.slots = {}
+        self.slot_keys = [None] * self.capacity
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.spill = _SpillFile(kernel.fields, spill_path) if spill_path else None
+        self.clock = 0
+        self.evictions = 0
+        self.restores = 0
+        self._lock = threading.Lock()
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        if self.max_symbols is not None:
+            new_capacity = min(new_capacity, self.max_symbols)
+        for name, (dtype, shape, initial) in self.kernel.fields.items():
+            column = np.full((new_capacity,) + shape, initial, dtype=dtype)
+            column[:self.capacity] = self.columns[name]
+            self.columns[name] = column
+        last_used = np.zeros(new_capacity, dtype=np.int64)
+        last_used[:self.capacity] = self.last_used
+        self.last_used = last_used
+        self.slot_keys.extend([None] * (new_capacity - self.capacity))
+        self.free.extend(range(new_capacity - 1, self.capacity - 1, -1))
+        self.capacity = new_capacity
+
+    def _evict(self, count: int, keep: set):
+        occupied = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+        # Never evict a symbol the current batch is about to update
+        candidates = occupied[[self.slot_keys[s] not in keep for s in occupied]]
+        count = min(count, len(candidates))
+        if count == 0:
+            raise ValueError(f"State store is full ({self.max_symbols} symbols) with every symbol in use")
+        victims = candidates[np.argpartition(self.last_used[candidates], count - 1)[:count]]
+        keys = [self.slot_keys[s] for s in victims]
+        if self.spill is not None:
+            self.spill.write(keys, self.columns, victims)
+        for key, slot in zip(keys, victims):
+            del self.slots[key]
+            self.slot_keys[slot] = None
+            for name, (_, _, initial) in self.kernel.fields.items():
+                self.columns[name][slot] = initial
+            self.free.append(int(slot))
+        self.evictions += count
+
+    def _slot(self, key, batch_keys: set) -> int:
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if not self.free:
+            if self.max_symbols is None or self.capacity < self.max_symbols:
+                self._grow()
+            else:
+                # Evict in chunks so a stream of new symbols does not evict one at a time
+                self._evict(max(self.max_symbols // 16, 1), batch_keys)
+        slot = self.free.pop()
+        self.slots[key] = slot
+        self.slot_keys[slot] = key
+        if self.spill is not None:
+            row = self.spill.take(key)
+            if row is not None:
+                for name, value in row.items():
+                    self.columns[name][slot] = value
+                self.restores += 1
+        return slot
+
+    def update(self, keys, values) -> np.ndarray:
+        """
+        Apply one tick per (key, value) pair, in order; returns the results.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        batch_keys = set(keys)
+        if self.max_symbols is not None and len(batch_keys) > self.max_symbols and len(keys) > 1:
+            # More distinct symbols than fit at once: apply the batch in order, in halves
+            half = len(keys) // 2
+            return np.concatenate([self.update(keys[:half], values[:half]),
+                                   self.update(keys[half:], values[half:])])
+        with self._lock:
+            slots = np.fromiter((self._slot(key, batch_keys) for key in keys), dtype=np.int64, count=len(keys))
+            self.clock += 1
+            self.last_used[slots] = self.clock
+
+            results = np.empty(len(values), dtype=np.float64)
+            # Rank of each tick among the batch's ticks for the same slot
+            order = np.argsort(slots, kind="stable")
+            sorted_slots = slots[order]
+            starts = np.r_[0, np.flatnonzero(np.diff(sorted_slots)) + 1]
+            group_start = np.repeat(starts, np.diff(np.r_[starts, len(sorted_slots)]))
+            ranks = np.empty(len(slots), dtype=np.int64)
+            ranks[order] = np.arange(len(slots)) - group_start
+            for rank in range(int(ranks.max()) + 1 if len(ranks) else 0):
+                selected = np.flatnonzero(ranks == rank)
+                results[selected] = self.kernel.step(self.columns, slots[selected], values[selected])
+            return results
+
+    def update_one(self, key, value: float) -> float:
+        """Single-tick update; per-tick callbacks on a hot path should batch through TickBatcher."""
+        return float(self.update([key], [value])[0])
+
+    def get(self, key) -> dict:
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                return None
+            return {name: column[slot].tolist() for name, column in self.columns.items()}
+
+    def memory_bytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values()) + self.last_used.nbytes
+
+    def stats(self) -> dict:
+        return {"symbols": len(self.slots), "capacity": self.capacity, "evictions": self.evictions,
+                "restores": self.restores, "spilled": len(self.spill.rows) if self.spill else 0,
+                "bytes": self.memory_bytes(),
+                "bytes_per_symbol": self.memory_bytes() / self.capacity}
+
+    def flush(self):
+        if self.spill is not None:
+            self.spill.flush()
+
+
+class TickBatcher:
+    """
+    Per-tick updates to a ColumnarStateStore, applied in batches.
+
+    Downlink callbacks `add` a tick and return at once; a background thread
+    applies the pending ticks with one vectorized `store.update` when
+    `batch_size` are pending or every `flush_interval` seconds, whichever
+    comes first, and hands them to `on_results(items, results)` in arrival
+    order. A one-tick `update` costs far more than the scalar operator, so
+    per-tick callbacks go through here rather than `update_one`.
+    """
+
+    def __init__(self, store: ColumnarStateStore, on_results, batch_size: int = 256,
+                 flush_interval: float = 0.05):
+        self.store = store
+        self.on_results = on_results
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self._keys, self._values, self._items = [], [], []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="state-batcher", daemon=True)
+        self._thread.start()
+
+    def add(self, key, value: float, item=None):
+        """Queue one tick of `key`; `item` is passed back with its result."""
+        with self._lock:
+            self._keys.append(key)
+            self._values.append(value)
+            self._items.append(item)
+            pending = len(self._keys)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        # The flush lock keeps batches in order when close() flushes alongside the thread
+        with self._flush_lock:
+            with self._lock:
+                keys, values, items = self._keys, self._values, self._items
+                self._keys, self._values, self._items = [], [], []
+            if keys:
+                results = self.store.update(keys, values)
+                self.batches += 1
+                self.on_results(items, results)
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
@@ -1,22 +1,22 @@
 from swimos import SwimClient
 import time
 
+from last_values import LastValueCache
+
 swim_client = SwimClient(debug=True)
 swim_client.start()
 
 if __name__ == '__main__':
     host_uri = 'wss://stocks-simulated.nstream-demo.io'
-    node_uri = '/stock/AAAA'
+    last_value_cache = LastValueCache(swim_client, host_uri)
 
-    print(node_uri)
-    value_downlink = swim_client.downlink_value()
-    value_downlink.set_host_uri(host_uri)
-    value_downlink.set_node_uri(node_uri)
-    value_downlink.set_lane_uri('status')
-    value_downlink.open()
-    result = value_downlink.get()
-    print(f"result: {result}")
-    time.sleep(5)
-    result = value_downlink.get()
+    print('/stock/AAAA')
+    result = last_value_cache.read('AAAA')
     print(f"result: {result}")
     time.sleep(5)
+    start = time.perf_counter()
+    result = last_value_cache.read('AAAA')
+    print(f"result: {result} ({(time.perf_counter() - start) * 1e6:.1f} us)")
+    print(last_value_cache.format_stats())
+    last_value_cache.close()
+    swim_client.stop()
@@ -0,0 +1,171 @@
+import math
+
+import numpy as np
+
+# Fields of a status-lane record, in the fixed order used by every layout
+TICK_FIELDS = ("timestamp", "price", "volume", "bid", "ask", "movement")
+
+TICK_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("price", np.float64),
+    ("volume", np.float64),
+    ("bid", np.float64),
+    ("ask", np.float64),
+    ("movement", np.float64),
+])
+
+NAN = math.nan
+MISSING_TIMESTAMP = -1
+
+
+class Tick:
+    """
+    Compact, fixed-layout view of a status-lane record.
+
+    Numeric fields that arrive as swimos `_Absent` (or anything else that is
+    not a number) are stored as NaN; a missing timestamp is stored as
+    MISSING_TIMESTAMP.
+    """
+
+    __slots__ = TICK_FIELDS
+
+    def __init__(self, timestamp: int, price: float, volume: float, bid: float, ask: float,
+                 movement: float):
+        self.timestamp = timestamp
+        self.price = price
+        self.volume = volume
+        self.bid = bid
+        self.ask = ask
+        self.movement = movement
+
+    def __getitem__(self, field: str):
+        return getattr(self, field)
+
+    def as_tuple(self) -> tuple:
+        return (self.timestamp, self.price, self.volume, self.bid, self.ask, self.movement)
+
+    def as_dict(self) -> dict:
+        return dict(zip(TICK_FIELDS, self.as_tuple()))
+
+    def __repr__(self):
+        return "Tick(" + ", ".join(f"{f}={getattr(self, f)!r}" for f in TICK_FIELDS) + ")"
+
+
+def _number(value) -> float:
+    # Fast path for the common case; bool is an int subclass but not a price
+    if type(value) is float:
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return NAN
+
+
+def _timestamp(value) -> int:
+    if type(value) is int:
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value == value:
+        return int(value)
+    return MISSING_TIMESTAMP
+
+
+def decode_row(record) -> tuple:
+    """Decode a status-lane record into a plain tuple in TICK_FIELDS order."""
+    if not isinstance(record, dict):
+        return (MISSING_TIMESTAMP, NAN, NAN, NAN, NAN, NAN)
+    get = record.get
+    return (
+        _timestamp(get("timestamp")),
+        _number(get("price")),
+        _number(get("volume")),
+        _number(get("bid")),
+        _number(get("ask")),
+        _number(get("movement")),
+    )
+
+
+def decode_tick(record) -> Tick:
+    """Decode a status-lane record into a Tick."""
+    return Tick(*decode_row(record))
+
+
+class TickColumns:
+    """
+    Growable columnar buffer of ticks backed by one NumPy structured array.
+
+    Rows are written as tuples, so appending a batch never allocates a
+    per-field dict. `columns()` returns zero-copy views of the filled rows.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.empty(max(capacity, 1), dtype=TICK_DTYPE)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, required: int):
+        if required > len(self._data):
+            capacity = len(self._data)
+            while capacity < required:
+                capacity *= 2
+            data = np.empty(capacity, dtype=TICK_DTYPE)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+
+    def append(self, tick: Tick):
+        self._reserve(self.size + 1)
+        self._data[self.size] = tick.as_tuple()
+        self.size += 1
+
+    def append_record(self, record: dict):
+        self._reserve(self.size + 1)
+        self._data[self.size] = decode_row(record)
+        self.size += 1
+
+    def extend_records(self, records: list):
+        """Decode and append a batch of raw status-lane records."""
+        rows = [decode_row(record) for record in records]
+        if not rows:
+            return
+        self._reserve(self.size + len(rows))
+        self._data[self.size:self.size + len(rows)] = np.array(rows, dtype=TICK_DTYPE)
+        self.size += len(rows)
+
+    def records(self):
+        """Structured-array view of the filled rows."""
+        return self._data[:self.size]
+
+    def columns(self) -> dict:
+        data = self.records()
+        return {field: data[field] for field in TICK_FIELDS}
+
+    def clear(self):
+        self.size = 0
+
+
+def synthetic_records(n: int, symbol_seed: int = 0, absent=None) -> list:
+    """
+    Generate `n` raw status-lane records shaped like the simulated feed: a
+    bounded random walk with oscillation, and `volume` replaced by `absent`
+    on every seventh record (pass an Absent-like object to exercise the
+    decoding path).
+    """
+    rng = np.random.default_rng(symbol_seed)
+    steps = rng.normal(0.0, 1.0, n)
+    prices = np.clip(50.0 + np.cumsum(steps) + 10.0 * np.sin(np.arange(n) / 5.0), 0.01, None)
+    volumes = rng.uniform(1e5, 1e7, n)
+    spreads = rng.uniform(0.0, 5.0, n)
+    records = []
+    previous = prices[0]
+    for i in range(n):
+        price = round(float(prices[i]), 2)
+        records.append({
+            "timestamp": 1721672101793 + i * 1000,
+            "price": price,
+            "volume": absent if i % 7 == 6 else float(volumes[i]),
+            "bid": round(price - float(spreads[i]), 2),
+            "ask": round(price + float(spreads[i]), 2),
+            "movement": round(price - previous, 2),
+        })
+        previous = price
+    return records
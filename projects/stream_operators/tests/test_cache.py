@@ -0,0 +1,81 @@
+import pytest
+
+from cache import ResultCache, config_hash, quantize
+
+
+def _counting():
+    calls = []
+
+    def compute():
+        calls.append(None)
+        return len(calls)
+    return compute, calls
+
+
+@pytest.mark.parametrize("price, tick_size, expected", [
+    (100.004, 0.01, 100.0),
+    (100.006, 0.01, 100.01),
+    (101.2, 0.5, 101.0),
+    (101.3, 0.5, 101.5),
+    (100.004, 0.0, 100.004),
+    (100.004, -1.0, 100.004),
+])
+def test_quantize_snaps_to_the_tick_grid(price, tick_size, expected):
+    assert quantize(price, tick_size) == expected
+
+
+def test_prices_in_the_same_tick_bucket_share_an_entry():
+    cache = ResultCache(tick_size=0.01)
+    compute, calls = _counting()
+    assert cache.get_or_compute("cfg", 100.001, compute) == 1
+    assert cache.get_or_compute("cfg", 100.004, compute) == 1
+    assert cache.get_or_compute("cfg", 99.996, compute) == 1
+    assert (cache.hits, cache.misses, len(calls)) == (2, 1, 1)
+
+
+def test_prices_in_neighbouring_buckets_miss():
+    cache = ResultCache(tick_size=0.01)
+    compute, calls = _counting()
+    cache.get_or_compute("cfg", 100.004, compute)
+    assert cache.get_or_compute("cfg", 100.006, compute) == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_without_tick_size_only_exact_prices_hit():
+    cache = ResultCache()
+    compute, calls = _counting()
+    cache.get_or_compute("cfg", 100.001, compute)
+    cache.get_or_compute("cfg", 100.002, compute)
+    cache.get_or_compute("cfg", 100.001, compute)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_entries_are_keyed_by_config():
+    cache = ResultCache(tick_size=0.01)
+    compute, calls = _counting()
+    cache.get_or_compute(config_hash({"threshold": 1}), 100.0, compute)
+    assert cache.get_or_compute(config_hash({"threshold": 2}), 100.0, compute) == 2
+    assert config_hash({"a": 1, "b": 2}) == config_hash({"b": 2, "a": 1})
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_size=2, tick_size=1.0)
+    compute, calls = _counting()
+    cache.get_or_compute("cfg", 1.0, compute)
+    cache.get_or_compute("cfg", 2.0, compute)
+    cache.get_or_compute("cfg", 1.0, compute)
+    cache.get_or_compute("cfg", 3.0, compute)
+    assert cache.evictions == 1
+    # 2.0 was least recently used; 1.0 survives
+    assert cache.get_or_compute("cfg", 1.0, compute) == 1
+    assert cache.get_or_compute("cfg", 2.0, compute) == 4
+
+
+def test_stats_report_hit_rate():
+    cache = ResultCache(tick_size=0.5)
+    compute, calls = _counting()
+    for price in (10.0, 10.1, 10.2, 11.0):
+        cache.get_or_compute("cfg", price, compute)
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 2, 2, 0.5)
+    assert "2 hits / 2 misses" in cache.format_stats()
@@ -0,0 +1,85 @@
+import pytest
+
+from join import AsOfJoin, parse_join_input
+
+
+def _join(**options):
+    records = []
+    join = AsOfJoin(("AAAA", "BBBB"), records.append, **options)
+    feeds = {name: join.callback_for(name) for name in join.names}
+
+    def tick(name: str, timestamp: int, price: float = 10.0):
+        feeds[name]({"timestamp": timestamp, "price": price}, None)
+    return join, tick, records
+
+
+def test_events_wait_for_every_input_then_join_as_of():
+    join, tick, records = _join()
+    tick("AAAA", 1000, 10.0)
+    assert join.stats()["pending"] == 1 and join.watermark() is None
+    tick("BBBB", 1100, 20.0)
+    tick("AAAA", 1200, 11.0)
+    # AAAA@1000 predates every BBBB tick; BBBB@1100 joins the AAAA tick before it
+    assert join.early == 1
+    assert [(r["timestamp"], r["source"], r["AAAA.price"], r["BBBB.price"]) for r in records] == [
+        (1100, "BBBB", 10.0, 20.0)]
+
+
+def test_stalled_input_does_not_hold_the_watermark_and_its_partners_go_stale():
+    join, tick, records = _join(max_staleness_ms=500)
+    tick("AAAA", 1000)
+    tick("BBBB", 1000)
+    assert join.joined == 2
+    tick("AAAA", 3000)
+    # BBBB lags by 2000 ms: stalled, so the watermark moves on without it
+    assert join.watermark() == 3000
+    assert join.stale == 1
+    assert join.stats()["inputs"]["BBBB"]["stalled"]
+
+
+def test_ticks_behind_the_watermark_are_counted_late():
+    join, tick, records = _join(max_staleness_ms=500)
+    tick("AAAA", 1000)
+    tick("BBBB", 1000)
+    tick("AAAA", 3000)
+    tick("BBBB", 2000)
+    assert join.late == 1
+    assert join.stats()["late"] == 1
+    assert "1 late" in join.format_stats()
+
+
+def test_out_of_order_ticks_are_dropped_and_counted():
+    join, tick, records = _join()
+    tick("AAAA", 1000)
+    tick("AAAA", 900)
+    assert join.stats()["inputs"]["AAAA"]["out_of_order"] == 1
+    assert join.stats()["inputs"]["AAAA"]["received"] == 1
+
+
+def test_buffers_are_capped():
+    join, tick, records = _join(max_buffer=3)
+    for timestamp in range(1000, 1005):
+        tick("AAAA", timestamp)
+    stats = join.stats()["inputs"]["AAAA"]
+    assert (stats["buffered"], stats["overflow"], stats["waiting"]) == (3, 2, False)
+    assert join.stats()["inputs"]["BBBB"]["waiting"]
+
+
+def test_ticks_without_timestamp_are_ignored():
+    join, tick, records = _join()
+    join.callback_for("AAAA")({"price": 10.0}, None)
+    assert join.stats()["inputs"]["AAAA"]["received"] == 0
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("AAAA", ("AAAA", "/stock/AAAA", "status")),
+    ("AAAA#history", ("AAAA_history", "/stock/AAAA", "history")),
+    ("fx=/fx/EURUSD#rate", ("fx", "/fx/EURUSD", "rate")),
+])
+def test_parse_join_input(spec, expected):
+    assert parse_join_input(spec) == expected
+
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(ValueError):
+        AsOfJoin(("AAAA", "AAAA"), lambda record: None)
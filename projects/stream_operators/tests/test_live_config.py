@@ -0,0 +1,108 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from live_config import ControlListener, LiveConfig, attach, description_changed, merge_config
+
+CONFIG = {"description": "price above threshold", "parameters": {"threshold": 20, "window": 5}}
+
+
+def _threshold(config, previous):
+    return config["parameters"]["threshold"]
+
+
+@pytest.mark.parametrize("changes, expected", [
+    ({"parameters": {"threshold": 30}},
+     {"description": "price above threshold", "parameters": {"threshold": 30, "window": 5}}),
+    ({"parameters": {"window": None}}, {"description": "price above threshold", "parameters": {"threshold": 20}}),
+    ({"description": None}, {"parameters": {"threshold": 20, "window": 5}}),
+    ({"parameters": 7}, {"description": "price above threshold", "parameters": 7}),
+    ({}, CONFIG),
+])
+def test_merge_config(changes, expected):
+    assert merge_config(CONFIG, changes) == expected
+
+
+def test_merge_config_leaves_the_original_untouched():
+    merge_config(CONFIG, {"parameters": {"threshold": 30}})
+    assert CONFIG["parameters"]["threshold"] == 20
+
+
+def test_description_changed():
+    previous = (CONFIG, None)
+    assert description_changed(None, CONFIG)
+    assert not description_changed(previous, merge_config(CONFIG, {"parameters": {"threshold": 30}}))
+    assert description_changed(previous, merge_config(CONFIG, {"description": "price below threshold"}))
+
+
+def test_readers_keep_the_old_version_until_derive_finishes():
+    deriving, release = threading.Event(), threading.Event()
+
+    def slow_derive(config, previous):
+        if previous is not None:
+            deriving.set()
+            release.wait(5)
+        return _threshold(config, previous)
+
+    live = LiveConfig(CONFIG, slow_derive)
+    worker = threading.Thread(target=live.reconfigure, args=({"parameters": {"threshold": 30}},))
+    worker.start()
+    assert deriving.wait(5)
+    assert live.current == (CONFIG, 20) and live.version == 1
+    release.set()
+    worker.join(5)
+    assert live.current[1] == 30 and live.operation_config["parameters"]["threshold"] == 30
+    assert live.version == 2
+
+
+def test_config_and_derived_part_are_swapped_together():
+    live = LiveConfig(CONFIG, _threshold)
+    stop = threading.Event()
+    torn = []
+
+    def read():
+        while not stop.is_set():
+            config, derived = live.current
+            if config["parameters"]["threshold"] != derived:
+                torn.append((config, derived))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    writers = [threading.Thread(target=lambda offset=offset: [
+        live.reconfigure({"parameters": {"threshold": offset + i}}) for i in range(200)]) for offset in (0, 1000)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert torn == []
+    assert live.version == 401
+
+
+def test_control_listener_patches_the_running_operator():
+    changes = []
+    callback = attach(lambda tick: None, LiveConfig(CONFIG, _threshold), on_change=changes.append)
+    listener = ControlListener(callback)
+    url = f"http://{listener.host}:{listener.port}/operators/local"
+    try:
+        patch = {"operation_config": {"parameters": {"threshold": 30}}}
+        request = urllib.request.Request(url, method="PATCH", data=json.dumps(patch).encode())
+        with urllib.request.urlopen(request) as response:
+            body = json.loads(response.read())
+        assert body["config_version"] == 2
+        assert body["operation_config"]["parameters"] == {"threshold": 30, "window": 5}
+        assert changes == [30]
+
+        request = urllib.request.Request(url, method="PATCH", data=json.dumps({"symbol": "BBBB"}).encode())
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+        assert error.value.code == 400
+        assert callback.live_config.version == 2
+    finally:
+        listener.close()
@@ -0,0 +1,68 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from llm_gateway import LLMCallRecorder, LLMGateway, TierPolicy, parse_json_result
+
+PLAN_TOOL = {"type": "function", "function": {"name": "plan"}}
+
+
+class ScriptedClient:
+    """Answers each model from a script; an exception in the script is raised instead."""
+
+    def __init__(self, answers: dict):
+        self.answers = answers
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, messages, model: str, max_tokens: int = None, **options):
+        self.requests.append((model, options))
+        answer = self.answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        content, confidence = answer
+        logprobs = SimpleNamespace(content=[SimpleNamespace(logprob=math.log(confidence))])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content),
+                                     logprobs=logprobs if options.get("logprobs") else None)],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2))
+
+
+def _gateway(answers: dict, **policy):
+    client = ScriptedClient(answers)
+    recorder = LLMCallRecorder()
+    gateway = LLMGateway(client, TierPolicy({"direct": ("cheap", "strong")}, **policy), recorder)
+    return gateway, client, recorder
+
+
+def test_logprobs_are_requested_only_where_confidence_decides():
+    gateway, client, recorder = _gateway({"cheap": ('{"result": 1}', 0.5), "strong": ('{"result": 2}', 0.5)})
+    assert gateway.complete("direct", "prompt", parse_json_result) == 2
+    assert [options.get("logprobs", False) for _, options in client.requests] == [True, False]
+
+
+@pytest.mark.parametrize("task, tool, min_confidence", [
+    ("direct", None, 0.0),
+    ("routing", PLAN_TOOL, 0.85),
+    ("codegen", None, 0.85),
+])
+def test_logprobs_are_not_requested_without_a_confidence_check(task, tool, min_confidence):
+    policy = TierPolicy({task: ("cheap", "strong")}, min_confidence)
+    assert not policy.uses_confidence(task, 0, tool)
+
+
+def test_failed_call_escalates_to_the_next_tier():
+    gateway, client, recorder = _gateway({"cheap": TimeoutError("read timed out"), "strong": ('{"result": 2}', 0.9)})
+    assert gateway.complete("direct", "prompt", parse_json_result) == 2
+    cheap = recorder.stats[("direct", "cheap")]
+    assert (cheap["calls"], cheap["call_errors"], cheap["escalations"], cheap["cost"]) == (1, 1, 1, 0.0)
+    assert "1 call errors" in recorder.format_summary()
+
+
+def test_failed_final_call_raises():
+    gateway, client, recorder = _gateway({"cheap": ("not json", 0.9), "strong": ConnectionError("reset")})
+    with pytest.raises(ValueError, match="reset"):
+        gateway.complete("direct", "prompt", parse_json_result)
+    strong = recorder.stats[("direct", "strong")]
+    assert (strong["call_errors"], strong["escalations"]) == (1, 0)
@@ -0,0 +1,79 @@
+import pytest
+
+from patterns import PatternError, compile_pattern
+
+FALL = {"name": "fall", "where": {"cmp": "<", "left": {"field": "price"}, "right": {"field": "prev.price"}}}
+JUMP = {"name": "jump", "where": {"cmp": ">", "left": {"field": "price"}, "right": {"param": "high"}}}
+PARAMS = {"high": 100}
+
+
+def _run(spec: dict, prices: list, params: dict = PARAMS) -> list:
+    matcher = compile_pattern(spec, params).matcher()
+    matches = []
+    for timestamp, price in enumerate(prices):
+        match = matcher.update({"timestamp": timestamp, "price": float(price)})
+        if match is not None:
+            matches.append(match)
+    return matches
+
+
+def test_strict_contiguity_needs_consecutive_steps():
+    spec = {"steps": [FALL, JUMP], "contiguity": "strict"}
+    assert [m["events"] for m in _run(spec, [50, 40, 120])] == [
+        [{"step": "fall", "timestamp": 1, "price": 40.0}, {"step": "jump", "timestamp": 2, "price": 120.0}]]
+    # A tick between the fall and the jump breaks the match
+    assert _run(spec, [50, 40, 45, 120]) == []
+
+
+def test_relaxed_contiguity_skips_unrelated_ticks():
+    spec = {"steps": [FALL, JUMP], "contiguity": "relaxed"}
+    matches = _run(spec, [50, 40, 45, 60, 120])
+    assert len(matches) == 1
+    assert (matches[0]["start"], matches[0]["end"], matches[0]["ticks"]) == (1, 4, 4)
+
+
+def test_within_expires_slow_matches():
+    spec = {"steps": [FALL, JUMP], "contiguity": "relaxed", "within": 3}
+    assert len(_run(spec, [50, 40, 45, 120])) == 1
+    assert _run(spec, [50, 40, 45, 60, 120]) == []
+
+
+def test_repeated_step_counts_consecutive_matches():
+    spec = {"steps": [{**FALL, "times": 3}, JUMP], "contiguity": "strict"}
+    assert len(_run(spec, [50, 49, 48, 47, 130])) == 1
+    assert _run(spec, [50, 49, 48, 130]) == []
+
+
+@pytest.mark.parametrize("where", [
+    {"cmp": "!=", "left": {"field": "price"}, "right": {"field": "move.price"}},
+    {"not": {"cmp": "==", "left": {"field": "price"}, "right": {"field": "move.price"}}},
+    {"not": {"cmp": ">=", "left": {"field": "price"}, "right": {"field": "prev.price"}}},
+])
+def test_reference_to_unmatched_tick_never_matches(where):
+    # On its first repetition "move" has not matched a tick yet, and the first tick has no "prev"
+    spec = {"steps": [{"name": "move", "times": 2, "where": where}]}
+    matcher = compile_pattern(spec, PARAMS).matcher()
+    matcher.update({"timestamp": 0, "price": 50.0})
+    assert matcher.partials == []
+
+
+def test_completed_match_discards_overlapping_partials():
+    spec = {"steps": [FALL, FALL | {"name": "again"}], "contiguity": "relaxed"}
+    matcher = compile_pattern(spec, PARAMS).matcher()
+    for timestamp, price in enumerate([50, 40, 30]):
+        matcher.update({"timestamp": timestamp, "price": float(price)})
+    assert matcher.matches == 1
+    assert matcher.partials == []
+
+
+@pytest.mark.parametrize("spec", [
+    {"steps": []},
+    {"steps": [FALL], "contiguity": "sometimes"},
+    {"steps": [FALL, FALL]},
+    {"steps": [{**FALL, "name": "prev"}]},
+    {"steps": [{**FALL, "times": 0}]},
+    {"steps": [FALL, JUMP], "within": 1},
+])
+def test_malformed_patterns_are_rejected(spec):
+    with pytest.raises(PatternError):
+        compile_pattern(spec, PARAMS)
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from plans import PlanError, candidate_symbols, operation_config_for, parse_plan, plan_parser, repair_plan
+
+CANONICAL = {"function": "filter_direct", "symbol": "AAAA", "streaming_operator": None,
+             "description": "price under 20", "parameters": {"threshold": 20}}
+
+
+def test_canonical_plan_needs_no_repair():
+    repairs = []
+    assert parse_plan(json.dumps(CANONICAL), repairs=repairs) == CANONICAL
+    assert repairs == []
+
+
+@pytest.mark.parametrize("raw, repair", [
+    ({"result": CANONICAL}, "unwrapped result"),
+    ({"function": "filter_direct", "parameters": {"symbol": "AAAA", "operation_config": {
+        "description": "price under 20", "parameters": {"threshold": 20}}}}, "flattened nested parameters"),
+    ({**CANONICAL, "description": None, "parameters": {},
+      "operation_config": json.dumps({"description": "price under 20", "parameters": {"threshold": 20}})},
+     "decoded operation_config string"),
+    ({**CANONICAL, "function": "filter-direct"}, "function 'filter-direct' -> 'filter_direct'"),
+    ({**CANONICAL, "symbol": "$aaaa"}, "symbol '$aaaa' -> 'AAAA'"),
+    ({**CANONICAL, "parameters": {"threshold": "20"}}, "converted numeric strings"),
+])
+def test_malformed_plans_are_repaired(raw, repair):
+    repairs = []
+    assert repair_plan(raw, repairs=repairs) == CANONICAL
+    assert repair in repairs
+
+
+def test_prose_around_the_json_is_ignored():
+    repairs = []
+    content = "Here is the plan: " + json.dumps(CANONICAL) + " Let me know!"
+    assert parse_plan(content, repairs=repairs) == CANONICAL
+    assert repairs == ["extracted JSON from prose"]
+
+
+def test_gaps_are_filled_from_the_command():
+    repairs = []
+    plan = repair_plan({"function": "filter_direct", "parameters": {"threshold": 20}},
+                       command="alert when AAAA drops under 20", repairs=repairs)
+    assert (plan["symbol"], plan["description"]) == ("AAAA", "alert when AAAA drops under 20")
+    assert {"took symbol from the command", "used the command as description"} <= set(repairs)
+
+
+def test_join_plan_reads_bare_symbols_as_prices():
+    plan = repair_plan({"function": "join_streaming", "symbol": None, "symbols": ["aaaa", "BBBB"],
+                        "expression": "AAAA / BBBB", "join_function": "read_streaming",
+                        "streaming_operator": None, "description": None, "parameters": {}})
+    assert plan["symbols"] == ["AAAA", "BBBB"]
+    assert plan["expression"] == "AAAA.price / BBBB.price"
+
+
+@pytest.mark.parametrize("raw, error", [
+    ({**CANONICAL, "function": "teleport"}, "unknown function"),
+    ({**CANONICAL, "symbol": None}, "missing symbol"),
+    ({**CANONICAL, "function": "accumulate_direct"}, "needs a streaming_operator"),
+    ({**CANONICAL, "parameters": {"threshold": [1, 2]}}, "not scalars"),
+    ({"function": "join_streaming", "symbols": ["AAAA"], "expression": "AAAA.price"}, "at least two symbols"),
+    ({"function": "join_streaming", "symbols": ["AAAA", "BBBB"], "expression": "CCCC.price"},
+     "invalid expression"),
+])
+def test_unrepairable_plans_raise(raw, error):
+    with pytest.raises(PlanError, match=error):
+        repair_plan(raw)
+
+
+def test_unparseable_answers_raise():
+    with pytest.raises(PlanError, match="no JSON object"):
+        parse_plan("I cannot help with that")
+
+
+def test_plan_parser_reports_the_accepted_answers_repairs():
+    repairs = []
+    parse = plan_parser("flag AAAA under 20", repairs)
+    parse(json.dumps({**CANONICAL, "symbol": "aaaa"}))
+    parse(json.dumps(CANONICAL))
+    assert parse.repairs is repairs and repairs == []
+
+
+def test_operation_config_for_accumulators_is_flat():
+    plan = {"function": "accumulate_direct", "streaming_operator": "average", "description": None,
+            "parameters": {"window_size": 5}}
+    assert operation_config_for(plan) == {"window_size": 5}
+    assert operation_config_for(CANONICAL) == {"description": "price under 20", "parameters": {"threshold": 20}}
+
+
+def test_candidate_symbols_prefer_four_letter_tickers():
+    assert candidate_symbols("convert AAAA to EUR then compare with BB") == ["AAAA", "BB"]
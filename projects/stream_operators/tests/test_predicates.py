@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+import pytest
+
+from predicates import PredicateError, compile_columnar_predicate, compile_predicate
+
+PRICE_ABOVE = {"cmp": ">", "left": {"field": "price"}, "right": {"param": "threshold"}}
+PARAMS = {"threshold": 100}
+
+
+def _columns(prices, volumes=None):
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.ones_like(prices) if volumes is None else np.asarray(volumes, dtype=np.float64)
+    return {"price": prices, "volume": volumes}
+
+
+@pytest.mark.parametrize("spec", [
+    PRICE_ABOVE,
+    {"cmp": "!=", "left": {"field": "price"}, "right": 100},
+    {"not": PRICE_ABOVE},
+    {"not": {"not": PRICE_ABOVE}},
+    {"not": {"all": [PRICE_ABOVE, {"cmp": "<", "left": {"field": "volume"}, "right": 5}]}},
+    {"not": {"any": [PRICE_ABOVE, {"cmp": "==", "left": {"field": "price"}, "right": 0}]}},
+    {"cmp": ">", "left": {"op": "/", "args": [{"field": "volume"}, {"field": "price"}]}, "right": -1},
+])
+def test_absent_price_never_matches(spec):
+    scalar = compile_predicate(spec, PARAMS)
+    columnar = compile_columnar_predicate(spec, PARAMS)
+    assert scalar({"price": math.nan, "volume": 1.0}) is False
+    assert not columnar(_columns([math.nan]))[0]
+
+
+def test_division_by_zero_never_matches():
+    spec = {"not": {"cmp": "<", "left": {"op": "/", "args": [{"field": "volume"}, {"field": "price"}]},
+                    "right": 1}}
+    assert compile_predicate(spec)({"price": 0.0, "volume": 1.0}) is False
+    assert not compile_columnar_predicate(spec)(_columns([0.0]))[0]
+
+
+@pytest.mark.parametrize("spec", [
+    PRICE_ABOVE,
+    {"not": PRICE_ABOVE},
+    {"cmp": "!=", "left": {"field": "price"}, "right": 100},
+    {"not": {"all": [PRICE_ABOVE, {"cmp": "<", "left": {"field": "volume"}, "right": 5}]}},
+    {"any": [{"cmp": "<=", "left": {"field": "price"}, "right": 50}, {"not": PRICE_ABOVE}]},
+])
+def test_columnar_agrees_with_scalar(spec):
+    prices = [20.0, 50.0, 99.9, 100.0, 100.1, 250.0]
+    volumes = [1.0, 9.0, 4.0, 5.0, 2.0, 7.0]
+    scalar = compile_predicate(spec, PARAMS)
+    expected = [scalar({"price": p, "volume": v}) for p, v in zip(prices, volumes)]
+    assert compile_columnar_predicate(spec, PARAMS)(_columns(prices, volumes)).tolist() == expected
+
+
+def test_negation_matches_the_complement_for_present_values():
+    scalar = compile_predicate({"not": PRICE_ABOVE}, PARAMS)
+    assert [scalar({"price": p}) for p in (99.0, 100.0, 101.0)] == [True, True, False]
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"cmp": "~", "left": 1, "right": 2}, "Unknown comparison"),
+    ({"cmp": "<", "left": {"field": "bogus"}, "right": 1}, "Unknown field"),
+    ({"cmp": "<", "left": {"param": "missing"}, "right": 1}, "Unknown parameter"),
+    ({"all": []}, "at least one"),
+    ({"cmp": "<", "left": True, "right": 1}, "Boolean"),
+])
+def test_malformed_specs_are_rejected(spec, message):
+    with pytest.raises(PredicateError, match=message):
+        compile_predicate(spec, PARAMS)
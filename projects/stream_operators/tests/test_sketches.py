@@ -0,0 +1,110 @@
+import random
+
+import numpy as np
+import pytest
+
+from operators import CountMinSketch, KLLSketch, P2Quantile, SpaceSaving
+
+VALUES = 50_000
+SEED = 7
+
+
+@pytest.fixture(scope="module")
+def prices():
+    rng = random.Random(SEED)
+    return [rng.lognormvariate(3.5, 0.4) for _ in range(VALUES)]
+
+
+@pytest.fixture(scope="module")
+def weighted_keys():
+    """Zipf-distributed symbols, each with a traded volume, and their exact totals."""
+    rng = random.Random(SEED)
+    symbols = [f"S{i:04d}" for i in range(2000)]
+    keys = rng.choices(symbols, weights=[1.0 / (rank + 1) ** 1.2 for rank in range(len(symbols))], k=VALUES)
+    volumes = [rng.randint(1, 100) for _ in range(VALUES)]
+    totals = {}
+    for key, volume in zip(keys, volumes):
+        totals[key] = totals.get(key, 0) + volume
+    return list(zip(keys, volumes)), totals
+
+
+def rank_error(exact, estimate, q):
+    return abs(np.searchsorted(exact, estimate, side="right") / len(exact) - q)
+
+
+@pytest.mark.parametrize("q", [0.01, 0.25, 0.5, 0.75, 0.95, 0.99])
+def test_kll_rank_error_within_bound(prices, q):
+    k = 200
+    exact = np.sort(prices)
+    whole = KLLSketch(k, seed=SEED)
+    parts = [KLLSketch(k, seed=SEED + i) for i in range(4)]
+    for i, x in enumerate(prices):
+        whole.update(x)
+        parts[i % 4].update(x)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+
+    bound = 2.3 / k ** 0.97
+    assert rank_error(exact, whole.quantile(q), q) <= bound
+    assert rank_error(exact, merged.quantile(q), q) <= bound
+
+
+def test_kll_keeps_bounded_state(prices):
+    sketch = KLLSketch(200, seed=SEED)
+    for x in prices:
+        sketch.update(x)
+    # Compactor capacities sum to under 3k; level 0 may be one buffer over between compactions
+    assert sketch._size() <= 4 * sketch.k
+
+
+@pytest.mark.parametrize("q", [0.5, 0.95, 0.99])
+def test_p2_quantile_close_to_exact(prices, q):
+    exact = np.sort(prices)
+    estimator = P2Quantile(q)
+    for x in prices:
+        estimator.update(x)
+    assert rank_error(exact, estimator.value(), q) <= 0.01
+
+
+def test_space_saving_bounds_hold_after_merge(weighted_keys):
+    stream, totals = weighted_keys
+    capacity = 100
+    summaries = [SpaceSaving(capacity) for _ in range(4)]
+    for i, (key, volume) in enumerate(stream):
+        summaries[i % 4].update(key, volume)
+    merged = summaries[0]
+    for summary in summaries[1:]:
+        merged.merge(summary)
+
+    bound = sum(totals.values()) / capacity
+    for key, count, error in merged.top(capacity):
+        assert count - error <= totals[key] <= count
+        assert error <= bound
+    heavy = [key for key, weight in totals.items() if weight > bound]
+    assert heavy and all(key in merged.counts for key in heavy)
+
+
+def test_space_saving_exact_below_capacity():
+    summary = SpaceSaving(10)
+    for key, weight in [("A", 5), ("B", 3), ("A", 2), ("C", 1)]:
+        summary.update(key, weight)
+    assert summary.top(3) == [("A", 7, 0.0), ("B", 3, 0.0), ("C", 1, 0.0)]
+
+
+def test_count_min_overestimates_within_bound(weighted_keys):
+    stream, totals = weighted_keys
+    epsilon = 0.001
+    sketch = CountMinSketch(epsilon=epsilon, delta=0.01)
+    halves = [CountMinSketch(epsilon=epsilon, delta=0.01) for _ in range(2)]
+    for i, (key, volume) in enumerate(stream):
+        sketch.update(key, volume)
+        halves[i % 2].update(key, volume)
+    merged = halves[0].merge(halves[1])
+
+    total = sum(totals.values())
+    overshoot = [sketch.estimate(key) - weight for key, weight in totals.items()]
+    assert min(overshoot) >= 0
+    # The bound holds with probability 1 - delta per key
+    assert sum(1 for e in overshoot if e > epsilon * total) <= 0.01 * len(totals)
+    assert all(merged.estimate(key) == sketch.estimate(key) for key in totals)
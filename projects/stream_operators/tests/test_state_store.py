@@ -0,0 +1,41 @@
+import random
+import threading
+
+import numpy as np
+
+from registry import resolve_operator
+from state_store import ColumnarStateStore, TickBatcher, kernel_for
+
+CONFIG = {"window_size": 5}
+
+
+def _ticks(count: int = 5000):
+    rng = random.Random(3)
+    return [(f"S{rng.randrange(50):02d}", rng.uniform(10.0, 20.0)) for _ in range(count)]
+
+
+def test_batched_ticks_match_scalar_operator():
+    ticks = _ticks()
+    native_operator = resolve_operator("sma")
+    params = native_operator.bind(CONFIG)
+    accumulators, expected = {}, []
+    for key, x in ticks:
+        accumulators[key], result = native_operator.step(accumulators.get(key), x, params)
+        expected.append(np.nan if result is None else result)
+
+    delivered_items, delivered_results = [], []
+    lock = threading.Lock()
+
+    def on_results(items, results):
+        with lock:
+            delivered_items.extend(items)
+            delivered_results.extend(results.tolist())
+
+    batcher = TickBatcher(ColumnarStateStore(kernel_for("sma", CONFIG), capacity=8), on_results,
+                          batch_size=64, flush_interval=0.01)
+    for index, (key, x) in enumerate(ticks):
+        batcher.add(key, x, index)
+    batcher.close()
+
+    assert delivered_items == list(range(len(ticks)))
+    assert np.allclose(delivered_results, expected, equal_nan=True)
@@ -1,6 +1,12 @@
 from openai import OpenAI
-from llama_index.core import Document, VectorStoreIndex
+from llama_index.core import Document
 import json
+import os
+from itertools import islice
+
+import numpy as np
+
+from matrix_vector_store import MatrixVectorStore
 
 # Initialize OpenAI API with your key
 llm_client = OpenAI()
@@ -90,66 +96,151 @@ static_data = {
 }
 
 
-# Function to create a document for each static data entry, with relationships
-def create_documents(data):
-    documents = []
+# Compact separators keep document text (and embedding input) small
+COMPACT = (",", ":")
+
+
+# Stream state records from a JSON Lines catalog (one state per line), so a
+# catalog of any size is read one state at a time
+def iter_catalog_states(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# A JSON Lines catalog named by NLQ_CATALOG_PATH replaces the sample data above
+CATALOG_PATH = os.environ.get("NLQ_CATALOG_PATH")
+
 
-    for state in data["states"]:
-        # Create a document for each state
+def catalog_states():
+    return iter_catalog_states(CATALOG_PATH) if CATALOG_PATH else iter(static_data["states"])
+
+
+# Lazily yield one document per state, agency, route and vehicle
+def iter_documents(data):
+    states = data["states"] if isinstance(data, dict) else data
+
+    for state in states:
         state_json = json.dumps({
             "State": state["name"],
             "Code": state["code"],
             "BoundingBox": state["bounding_box"],
             "Agencies": [agency["id"] for agency in state["agencies"]]
-        }, indent=4)
-
-        state_doc = Document(text=state_json, metadata={"type": "state", "code": state["code"]})
-        documents.append(state_doc)
+        }, separators=COMPACT)
+        yield Document(text=state_json, metadata={"type": "state", "code": state["code"]})
 
         for agency in state["agencies"]:
-            # Create a document for each agency within the state
+            # Routes and vehicles get their own documents; the agency only
+            # carries counts so its size does not grow with the fleet
             agency_json = json.dumps({
                 "Agency": agency["name"],
                 "ID": agency["id"],
                 "BoundingBox": agency["bounding_box"],
                 "State": state["name"],
-                "Routes": [route["tag"] for route in agency["routes"]],
-                "Vehicles": [vehicle["id"] for vehicle in agency["vehicles"]]
-            }, indent=4)
+                "RouteCount": len(agency["routes"]),
+                "VehicleCount": len(agency["vehicles"])
+            }, separators=COMPACT)
+            yield Document(text=agency_json,
+                           metadata={"type": "agency", "id": agency["id"], "state": state["name"],
+                                     "code": state["code"]})
+
+            for route in agency["routes"]:
+                route_json = json.dumps({
+                    "Route": route["name"],
+                    "Tag": route["tag"],
+                    "Agency": agency["id"],
+                    "State": state["name"]
+                }, separators=COMPACT)
+                yield Document(text=route_json,
+                               metadata={"type": "route", "id": route["tag"], "agency": agency["id"],
+                                         "state": state["name"], "code": state["code"]})
+
+            for vehicle in agency["vehicles"]:
+                vehicle_json = json.dumps({
+                    "Vehicle": vehicle["id"],
+                    "Route": vehicle["route"],
+                    "Agency": agency["id"],
+                    "State": state["name"]
+                }, separators=COMPACT)
+                yield Document(text=vehicle_json,
+                               metadata={"type": "vehicle", "id": vehicle["id"], "agency": agency["id"],
+                                         "state": state["name"], "code": state["code"]})
+
 
-            agency_doc = Document(text=agency_json,
-                                  metadata={"type": "agency", "id": agency["id"], "state": state["name"]})
-            documents.append(agency_doc)
+# Group an iterable into lists of at most `size` items
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
-    return documents
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+EMBEDDING_BATCH_SIZE = 256
+# Memory-mapped embedding matrix; its metadata and texts are saved next to it
+INDEX_PATH = os.environ.get("NLQ_INDEX_PATH", "nlq-catalog.f32")
 
-# Initialize a vector store
-documents = create_documents(static_data)
 
-# Build the index using the documents
-index = VectorStoreIndex.from_documents(documents)
-query_engine = index.as_query_engine()
+def embed_texts(texts):
+    response = llm_client.embeddings.create(model=EMBEDDING_MODEL, input=list(texts))
+    return np.array([item.embedding for item in response.data], dtype=np.float32)
 
-# Query function to demonstrate usage
-def query_static_data(query):
-    results = query_engine.query(query)
-    return results
+
+# Embed documents in fixed-size batches, once, into a memory-mapped matrix
+# store: embeddings live in the mapped file rather than in Python objects,
+# and only one batch of documents is built at a time. A rebuild overwrites
+# the previous index instead of appending to it
+def build_index(documents, batch_size=EMBEDDING_BATCH_SIZE, mmap_path=INDEX_PATH):
+    store = MatrixVectorStore(EMBEDDING_DIM, capacity=batch_size, mmap_path=mmap_path, overwrite=True)
+    for batch in batched(documents, batch_size):
+        store.add_documents(batch, embed_texts(doc.text for doc in batch))
+    store.save()
+    return store
+
+
+# One store both answers questions and routes bursts of them in one batched search
+vector_store = build_index(iter_documents(catalog_states()))
+
+
+# Route many user questions at once: one embedding call, one matrix multiply
+def route_queries(queries, k=3, filters=None):
+    indices, scores = vector_store.search(embed_texts(queries), k=k, filters=filters)
+    return vector_store.results(indices, scores)
+
+
+# Answer a question from the catalog documents most similar to it
+def query_static_data(query, k=5, filters=None):
+    context = "\n".join(text for _, _, text in route_queries([query], k=k, filters=filters)[0])
+    response = llm_client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "Answer using only the transit catalog entries provided."},
+            {"role": "user", "content": f"Catalog entries:\n{context}\n\nQuestion: {query}"},
+        ],
+        max_tokens=500
+    )
+    return response.choices[0].message.content.strip()
 
 
 # Example query: "What are the agencies in Northern California?"
 query_result = query_static_data("What are the agencies in Northern California?")
 print(query_result)
 
+# Example batched routing restricted to route documents
+for matches in route_queries(["Which agency runs Route A?", "Where does the Red Line run?"],
+                             filters={"type": "route"}):
+    print([(meta["agency"], meta["id"]) for _, meta, _ in matches])
+
 
 # Query function to retrieve context from LlamaIndex
 def query_static_data_combined(query):
     # Retrieve context from Northern and Southern California
-    result_n_ca = query_engine.query("What are the agencies in Northern California?")
-    result_s_ca = query_engine.query("What are the agencies in Southern California?")
+    result_n_ca = query_static_data("What are the agencies in Northern California?")
+    result_s_ca = query_static_data("What are the agencies in Southern California?")
 
-    # Combine the results (assuming 'result_n_ca' and 'result_s_ca' contain lists of results)
-    return result_n_ca.response + result_s_ca.response  # Assuming result_n_ca and result_s_ca are lists
+    # Combine the two answers into one context
+    return result_n_ca + "\n" + result_s_ca
 
 
 # Example user query
@@ -0,0 +1,302 @@
+import json
+import os
+import time
+
+import numpy as np
+
+
+# Metadata fields that get a precomputed boolean mask per distinct value
+MASK_FIELDS = ("type", "state", "code")
+
+
+class MatrixVectorStore:
+    """
+    In-memory vector store that keeps every embedding in one contiguous
+    float32 matrix (optionally memory-mapped) and answers batched top-k
+    queries with a single matrix multiply plus argpartition.
+
+    Rows are L2-normalized on insert, so scores are cosine similarities.
+    A memory-mapped store is persisted with `save()` and reopened with
+    `MatrixVectorStore.load(mmap_path)`; pass `overwrite=True` to rebuild
+    it from scratch instead of appending to what was saved.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024, mmap_path: str = None,
+                 mask_fields=MASK_FIELDS, overwrite: bool = False):
+        if overwrite and mmap_path is not None:
+            for path in (mmap_path, mmap_path + ".json"):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.dim = dim
+        self.mmap_path = mmap_path
+        self.mask_fields = tuple(mask_fields)
+        self.size = 0
+        self.texts = []
+        self.metadata = []
+        self._matrix = self._allocate(max(capacity, 1))
+        # field -> value -> list of row ids; materialized into masks lazily
+        self._rows_by_value = {field: {} for field in self.mask_fields}
+        self._masks = None
+        if mmap_path is not None and os.path.exists(self._sidecar_path):
+            self._restore()
+
+    @classmethod
+    def load(cls, mmap_path: str, mask_fields=MASK_FIELDS) -> "MatrixVectorStore":
+        """Reopen a store written by `save()`."""
+        with open(mmap_path + ".json") as f:
+            dim = json.load(f)["dim"]
+        # The file keeps its length; it grows again on the next add past it
+        return cls(dim, capacity=1, mmap_path=mmap_path, mask_fields=mask_fields)
+
+    @property
+    def _sidecar_path(self) -> str:
+        return self.mmap_path + ".json"
+
+    def save(self):
+        """Flush the memory-mapped matrix and write texts and metadata next to it."""
+        if self.mmap_path is None:
+            raise ValueError("Only memory-mapped stores can be saved")
+        self._matrix.flush()
+        with open(self._sidecar_path, "w") as f:
+            json.dump({"dim": self.dim, "size": self.size, "texts": self.texts,
+                       "metadata": self.metadata}, f)
+
+    def _restore(self):
+        with open(self._sidecar_path) as f:
+            saved = json.load(f)
+        if saved["dim"] != self.dim:
+            raise ValueError(f"{self.mmap_path} holds {saved['dim']}-dimensional embeddings, not {self.dim}")
+        if saved["size"] > self.capacity:
+            raise ValueError(f"{self.mmap_path} is shorter than its {saved['size']} saved rows")
+        self.size = saved["size"]
+        self.texts = saved["texts"]
+        self.metadata = saved["metadata"]
+        self._index_rows(0, self.metadata)
+
+    def _allocate(self, capacity: int):
+        if self.mmap_path is None:
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self.size:
+                matrix[:self.size] = self._matrix[:self.size]
+            return matrix
+
+        nbytes = capacity * self.dim * np.dtype(np.float32).itemsize
+        if self.size:
+            # Grow the backing file in place and remap it with the new shape
+            self._matrix.flush()
+            with open(self.mmap_path, "r+b") as f:
+                f.truncate(nbytes)
+            return np.memmap(self.mmap_path, dtype=np.float32, mode="r+",
+                             shape=(capacity, self.dim))
+        if os.path.exists(self.mmap_path):
+            # Reopen an existing file without truncating it; grow it if needed
+            rows = os.path.getsize(self.mmap_path) // (self.dim * np.dtype(np.float32).itemsize)
+            if rows < capacity:
+                with open(self.mmap_path, "r+b") as f:
+                    f.truncate(nbytes)
+                rows = capacity
+            return np.memmap(self.mmap_path, dtype=np.float32, mode="r+",
+                             shape=(rows, self.dim))
+        return np.memmap(self.mmap_path, dtype=np.float32, mode="w+",
+                         shape=(capacity, self.dim))
+
+    @property
+    def capacity(self) -> int:
+        return self._matrix.shape[0]
+
+    @property
+    def matrix(self):
+        """View of the populated rows of the embedding matrix."""
+        return self._matrix[:self.size]
+
+    def add(self, embeddings, metadata: list, texts: list = None):
+        """
+        Append a batch of embeddings with their metadata.
+
+        Args:
+        - embeddings (array-like): Shape (n, dim) embeddings.
+        - metadata (list): One metadata dict per embedding.
+        - texts (list): Optional source text per embedding.
+
+        Returns:
+        - range: Row ids assigned to the batch.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of shape (n, {self.dim})")
+        if len(metadata) != len(embeddings):
+            raise ValueError("metadata must have one entry per embedding")
+
+        n = len(embeddings)
+        required = self.size + n
+        if required > self.capacity:
+            capacity = self.capacity
+            while capacity < required:
+                capacity *= 2
+            self._matrix = self._allocate(capacity)
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix[self.size:required] = embeddings / norms
+
+        self._index_rows(self.size, metadata)
+        self.metadata.extend(metadata)
+        self.texts.extend(texts if texts is not None else [None] * n)
+
+        rows = range(self.size, required)
+        self.size = required
+        self._masks = None
+        return rows
+
+    def _index_rows(self, start: int, metadata: list):
+        for offset, meta in enumerate(metadata):
+            row = start + offset
+            for field in self.mask_fields:
+                if field in meta:
+                    self._rows_by_value[field].setdefault(meta[field], []).append(row)
+
+    def add_documents(self, documents: list, embeddings):
+        """Append llama_index-style documents (with `.text` and `.metadata`)."""
+        return self.add(embeddings,
+                        [doc.metadata for doc in documents],
+                        [doc.text for doc in documents])
+
+    def _build_masks(self):
+        masks = {}
+        for field, values in self._rows_by_value.items():
+            masks[field] = {}
+            for value, rows in values.items():
+                mask = np.zeros(self.size, dtype=bool)
+                mask[rows] = True
+                masks[field][value] = mask
+        self._masks = masks
+
+    def mask_for(self, filters: dict):
+        """
+        Combine precomputed masks for `filters`: fields are AND-ed, and a list
+        of values for one field is OR-ed. Returns None when unfiltered.
+        """
+        if not filters:
+            return None
+        if self._masks is None:
+            self._build_masks()
+
+        combined = np.ones(self.size, dtype=bool)
+        for field, wanted in filters.items():
+            if field not in self._masks:
+                raise KeyError(f"No precomputed mask for metadata field '{field}'")
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            field_mask = np.zeros(self.size, dtype=bool)
+            for value in values:
+                mask = self._masks[field].get(value)
+                if mask is not None:
+                    field_mask |= mask
+            combined &= field_mask
+        return combined
+
+    def search(self, queries, k: int = 5, filters: dict = None, query_batch: int = 1024):
+        """
+        Batched top-k cosine similarity search.
+
+        Args:
+        - queries (array-like): Shape (q, dim) or (dim,) query embeddings.
+        - k (int): Number of neighbours per query.
+        - filters (dict): Metadata filters, e.g. {"type": "agency"}.
+        - query_batch (int): Queries scored per matrix multiply, bounding the
+          (query_batch, size) score buffer.
+
+        Returns:
+        - tuple: (indices, scores), each of shape (q, k) sorted by descending
+          score. Slots with no eligible document hold -1 and -inf.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        q = len(queries)
+        indices = np.full((q, k), -1, dtype=np.int64)
+        scores = np.full((q, k), -np.inf, dtype=np.float32)
+        if self.size == 0 or k <= 0:
+            return indices, scores
+
+        mask = self.mask_for(filters)
+        kk = min(k, self.size)
+        matrix = self.matrix
+
+        for start in range(0, q, query_batch):
+            stop = min(start + query_batch, q)
+            batch_scores = queries[start:stop] @ matrix.T
+            if mask is not None:
+                batch_scores[:, ~mask] = -np.inf
+
+            if kk < self.size:
+                top = np.argpartition(-batch_scores, kk - 1, axis=1)[:, :kk]
+            else:
+                top = np.broadcast_to(np.arange(self.size), (stop - start, self.size))
+            top_scores = np.take_along_axis(batch_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            empty = np.isneginf(top_scores)
+            top = np.where(empty, -1, top)
+            indices[start:stop, :kk] = top
+            scores[start:stop, :kk] = top_scores
+
+        return indices, scores
+
+    def results(self, indices, scores) -> list:
+        """Resolve `search` output into per-query lists of (score, metadata, text)."""
+        return [
+            [(float(score), self.metadata[row], self.texts[row])
+             for row, score in zip(row_ids, row_scores) if row >= 0]
+            for row_ids, row_scores in zip(indices, scores)
+        ]
+
+
+def benchmark(store: MatrixVectorStore, queries, k: int = 5, filters: dict = None,
+              repeats: int = 5) -> dict:
+    """
+    Measure batched query throughput of `store`.
+
+    Returns:
+    - dict: Best-of-`repeats` wall time and queries per second.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    store.search(queries[:1], k=k, filters=filters)  # warm masks and caches
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        store.search(queries, k=k, filters=filters)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "documents": store.size,
+        "queries": len(queries),
+        "k": k,
+        "filters": filters,
+        "seconds": best,
+        "qps": len(queries) / best,
+    }
+
+
+if __name__ == "__main__":
+    # Synthetic benchmark: a catalog of tens of thousands of entity documents
+    # routed against a burst of hundreds of questions.
+    rng = np.random.default_rng(0)
+    dim, n_docs, n_queries = 1536, 50_000, 500
+    types = np.array(["state", "agency", "route", "vehicle"])
+
+    store = MatrixVectorStore(dim, capacity=n_docs)
+    for start in range(0, n_docs, 5_000):
+        batch = rng.standard_normal((5_000, dim), dtype=np.float32)
+        metadata = [{"type": str(types[i % len(types)]), "state": f"S{i % 50}"}
+                    for i in range(start, start + len(batch))]
+        store.add(batch, metadata)
+
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+    for filters in (None, {"type": "agency"}, {"type": "vehicle", "state": ["S1", "S2"]}):
+        report = benchmark(store, queries, k=10, filters=filters)
+        print(f"{report['documents']} docs, {report['queries']} queries, "
+              f"filters={report['filters']}: {report['seconds'] * 1000:.1f} ms, "
+              f"{report['qps']:.0f} queries/s")